@@ -10,6 +10,8 @@ from django import forms
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.views.generic import TemplateView
 from .models import WhatsAppTemplate
+from apps.customers.models import CustomerSegment
+from apps.customers import segments
 from django.contrib.auth.forms import PasswordChangeForm
 from django.contrib.auth import update_session_auth_hash
 from django.urls import reverse
@@ -72,6 +74,10 @@ class WhatsAppTemplatesView(LoginRequiredMixin, TemplateView):
         context['sale_message'] = WhatsAppTemplate.get_content('SALE_MESSAGE', '')
         context['alert_out'] = WhatsAppTemplate.get_content('ALERT_OUT_OF_STOCK', '')
         context['alert_low'] = WhatsAppTemplate.get_content('ALERT_LOW_STOCK', '')
+        context['segment_messages'] = [
+            (segments.template_key(segment), segment.label, segments.message(segment))
+            for segment in CustomerSegment.Segment
+        ]
         return context
     
     def post(self, request):
@@ -79,6 +85,10 @@ class WhatsAppTemplatesView(LoginRequiredMixin, TemplateView):
         WhatsAppTemplate.objects.update_or_create(key='SALE_MESSAGE', defaults={'content': data.get('sale_message','')})
         WhatsAppTemplate.objects.update_or_create(key='ALERT_OUT_OF_STOCK', defaults={'content': data.get('alert_out','')})
         WhatsAppTemplate.objects.update_or_create(key='ALERT_LOW_STOCK', defaults={'content': data.get('alert_low','')})
+        for segment in CustomerSegment.Segment:
+            key = segments.template_key(segment)
+            if key in data:
+                WhatsAppTemplate.objects.update_or_create(key=key, defaults={'content': data.get(key, '')})
         from django.shortcuts import redirect
         return redirect('accounts:whatsapp_templates')
 
@@ -4,7 +4,8 @@ API Serializers
 from rest_framework import serializers
 from apps.products.models import Product, Category
 from apps.sales.models import Sale, SaleItem
-from apps.customers.models import Customer
+from apps.customers.models import Customer, CustomerSegment
+from apps.customers import segments
 from apps.suppliers.models import Supplier
 
 
@@ -18,7 +19,7 @@ class ProductSerializer(serializers.ModelSerializer):
     category_name = serializers.CharField(source='category.name', read_only=True)
     supplier_name = serializers.CharField(source='supplier.name', read_only=True)
     is_low_stock = serializers.BooleanField(read_only=True)
-    available_stock = serializers.IntegerField(source='available_stock', read_only=True)
+    available_stock = serializers.IntegerField(read_only=True)
     
     class Meta:
         model = Product
@@ -30,23 +31,43 @@ class ProductSerializer(serializers.ModelSerializer):
 
 
 class CustomerSerializer(serializers.ModelSerializer):
+    revenue = serializers.DecimalField(source='stats.revenue', max_digits=14, decimal_places=2, read_only=True)
+    sale_count = serializers.IntegerField(source='stats.sale_count', read_only=True)
+    last_purchase_at = serializers.DateTimeField(source='stats.last_purchase_at', read_only=True)
+    reserved_quantity = serializers.IntegerField(source='stats.reserved_quantity', read_only=True)
+
     class Meta:
         model = Customer
-        fields = ['id', 'dni', 'name', 'phone', 'email', 'address', 'is_active', 'created_at']
+        fields = ['id', 'dni', 'name', 'phone', 'email', 'address', 'is_active', 'created_at',
+                  'revenue', 'sale_count', 'last_purchase_at', 'reserved_quantity']
+
+
+class CustomerSegmentSerializer(serializers.ModelSerializer):
+    """A customer of a campaign segment; needs the segment's `template` in the context"""
+    id = serializers.IntegerField(source='customer_id', read_only=True)
+    name = serializers.CharField(source='customer.name', read_only=True)
+    phone = serializers.CharField(source='customer.phone', read_only=True)
+    whatsapp_url = serializers.SerializerMethodField()
+
+    class Meta:
+        model = CustomerSegment
+        fields = ['id', 'name', 'phone', 'segment', 'recency_days', 'frequency', 'monetary',
+                  'r_score', 'f_score', 'm_score', 'refreshed_at', 'whatsapp_url']
+
+    def get_whatsapp_url(self, obj):
+        return segments.whatsapp_url(self.context['template'], obj.customer)
 
 
 class SupplierSerializer(serializers.ModelSerializer):
     class Meta:
         model = Supplier
-        fields = ['id', 'name', 'ruc', 'phone', 'email', 'address', 'is_active', 'created_at']
+        fields = ['id', 'name', 'ruc', 'phone', 'email', 'address', 'lead_time_days', 'is_active', 'created_at']
 
 
 class SaleItemSerializer(serializers.ModelSerializer):
-    product_name = serializers.CharField(source='product.name', read_only=True)
-    
     class Meta:
         model = SaleItem
-        fields = ['id', 'product', 'product_name', 'quantity', 'unit_price', 'subtotal']
+        fields = ['id', 'product', 'product_code', 'product_name', 'quantity', 'unit_price', 'subtotal']
 
 
 class SaleSerializer(serializers.ModelSerializer):
@@ -57,6 +78,6 @@ class SaleSerializer(serializers.ModelSerializer):
     class Meta:
         model = Sale
         fields = ['id', 'code', 'customer', 'customer_name', 'seller', 'seller_name',
-                  'subtotal', 'discount', 'tax', 'total', 'payment_method', 'status',
+                  'subtotal', 'discount', 'tax', 'total', 'item_count', 'payment_method', 'status',
                   'items', 'created_at']
         read_only_fields = ['code', 'seller', 'created_at']
@@ -16,6 +16,14 @@ router.register(r'suppliers', views.SupplierViewSet)
 router.register(r'sales', views.SaleViewSet)
 
 urlpatterns = [
+    # Before the router, whose customers/<pk>/ would match these
+    path('customers/segments/', views.CustomerSegmentsView.as_view(), name='customer_segments'),
+    path('customers/segments/<str:segment>/', views.SegmentCampaignView.as_view(), name='segment_campaign'),
     path('', include(router.urls)),
     path('auth/token/', obtain_auth_token, name='api_token_auth'),
+    path('catalog/sync/', views.CatalogSyncView.as_view(), name='catalog_sync'),
+    path('catalog/bundle/', views.CatalogBundleView.as_view(), name='catalog_bundle'),
+    path('purchases/receive/', views.ReceivePurchaseView.as_view(), name='receive_purchase'),
+    path('purchases/<int:pk>/confirm/', views.ConfirmPurchaseView.as_view(), name='confirm_purchase'),
+    path('inventory/valuation/', views.InventoryValuationView.as_view(), name='inventory_valuation'),
 ]
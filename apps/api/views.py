@@ -1,19 +1,34 @@
 """
 API Views
 """
-from rest_framework import viewsets, filters
+from rest_framework import viewsets, filters, generics
+from rest_framework.views import APIView
+from rest_framework.response import Response
+from django.http import HttpResponse, Http404
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.authentication import TokenAuthentication, SessionAuthentication
 from apps.products.models import Product, Category
+from apps.products import catalog, search
 from apps.sales.models import Sale
-from apps.customers.models import Customer
+from apps.purchases.services import receive_purchase, confirm_purchase, ReceivingError
+from apps.reports import valuation
+from apps.customers.models import Customer, CustomerSegment
+from apps.customers import segments
 from apps.suppliers.models import Supplier
 from .serializers import (
     ProductSerializer, CategorySerializer, SaleSerializer,
-    CustomerSerializer, SupplierSerializer
+    CustomerSerializer, SupplierSerializer, CustomerSegmentSerializer
 )
 
 
+class ProductSearchFilter(filters.SearchFilter):
+    """`?search=` through the indexed product search instead of icontains"""
+
+    def filter_queryset(self, request, queryset, view):
+        query = request.query_params.get(self.search_param, '')
+        return search.search(queryset, query) if query.strip() else queryset
+
+
 class CategoryViewSet(viewsets.ModelViewSet):
     queryset = Category.objects.all()
     serializer_class = CategorySerializer
@@ -29,20 +44,20 @@ class ProductViewSet(viewsets.ModelViewSet):
     serializer_class = ProductSerializer
     authentication_classes = [TokenAuthentication, SessionAuthentication]
     permission_classes = [IsAuthenticated]
-    filter_backends = [filters.SearchFilter, filters.OrderingFilter]
+    filter_backends = [ProductSearchFilter, filters.OrderingFilter]
     search_fields = ['name', 'code', 'category__name']
     ordering_fields = ['name', 'sale_price', 'stock', 'created_at']
     filterset_fields = ['category', 'supplier']
 
 
 class CustomerViewSet(viewsets.ModelViewSet):
-    queryset = Customer.objects.filter(is_active=True)
+    queryset = Customer.objects.filter(is_active=True).select_related('stats')
     serializer_class = CustomerSerializer
     authentication_classes = [TokenAuthentication, SessionAuthentication]
     permission_classes = [IsAuthenticated]
     filter_backends = [filters.SearchFilter, filters.OrderingFilter]
     search_fields = ['name', 'dni', 'phone']
-    ordering_fields = ['name', 'created_at']
+    ordering_fields = ['name', 'created_at', 'stats__revenue', 'stats__sale_count', 'stats__last_purchase_at']
 
 
 class SupplierViewSet(viewsets.ModelViewSet):
@@ -64,3 +79,134 @@ class SaleViewSet(viewsets.ReadOnlyModelViewSet):
     search_fields = ['code', 'customer__name']
     ordering_fields = ['created_at', 'total']
     filterset_fields = ['status', 'payment_method']
+
+
+class CatalogSyncView(APIView):
+    """
+    Catalog snapshot and deltas for POS terminals.
+
+    GET without `cursor` starts a full snapshot; GET with the `cursor` from
+    the previous response returns only what changed. Keep requesting while
+    `has_more` is true.
+    """
+    authentication_classes = [TokenAuthentication, SessionAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        try:
+            limit = min(int(request.query_params.get('limit', 0)) or 0, 5000) or None
+            return Response(catalog.changes(request.query_params.get('cursor'), limit))
+        except (ValueError, catalog.InvalidCursor):
+            return Response({'error': 'Cursor o límite inválido'}, status=400)
+
+
+class CatalogBundleView(APIView):
+    """
+    Gzipped catalog bundle with a prefix search index for the POS.
+
+    The ETag is the catalog version, so an unchanged catalog costs one
+    conditional request and a 304.
+    """
+    authentication_classes = [TokenAuthentication, SessionAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        version, body = catalog.bundle()
+        etag = f'"{version}"'
+        if request.headers.get('If-None-Match') == etag:
+            response = HttpResponse(status=304)
+        else:
+            response = HttpResponse(body, content_type='application/json')
+            response['Content-Encoding'] = 'gzip'
+        response['ETag'] = etag
+        response['Cache-Control'] = 'private, no-cache'
+        return response
+
+
+class ReceivePurchaseView(APIView):
+    """
+    Register and receive a supplier invoice in one request:
+    {supplier_id, invoice_number, notes, items: [{product_id, quantity, unit_price}]}.
+    """
+    authentication_classes = [TokenAuthentication, SessionAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        try:
+            purchase = receive_purchase(request.user, request.data)
+        except ReceivingError as e:
+            return Response({'error': str(e)}, status=400)
+        return Response({'id': purchase.id, 'code': purchase.code, 'total': f'{purchase.total:.2f}'}, status=201)
+
+
+class ConfirmPurchaseView(APIView):
+    """Receive a draft purchase (e.g. a suggested order) with all its lines"""
+    authentication_classes = [TokenAuthentication, SessionAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, pk):
+        try:
+            purchase = confirm_purchase(pk, request.user)
+        except ReceivingError as e:
+            return Response({'error': str(e)}, status=400)
+        return Response({'id': purchase.id, 'code': purchase.code, 'total': f'{purchase.total:.2f}'})
+
+
+class InventoryValuationView(APIView):
+    """Current stock and its value at average cost, by category and supplier"""
+    authentication_classes = [TokenAuthentication, SessionAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        def rows(groups):
+            return [
+                {'name': g['name'], 'units': g['total_units'], 'value': f"{g['total_value']:.2f}"}
+                for g in groups
+            ]
+
+        totals = valuation.totals()
+        return Response({
+            'units': totals['units'] or 0,
+            'value': f"{totals['value'] or 0:.2f}",
+            'categories': rows(valuation.by_category()),
+            'suppliers': rows(valuation.by_supplier()),
+        })
+
+
+class CustomerSegmentsView(APIView):
+    """RFM segments: customers and amount per segment; POST recomputes them"""
+    authentication_classes = [TokenAuthentication, SessionAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        return Response(self.payload())
+
+    def post(self, request):
+        segments.refresh()
+        return Response(self.payload())
+
+    def payload(self):
+        summary = segments.summary()
+        return {
+            'refreshed_at': summary['refreshed_at'],
+            'segments': [{**row, 'amount': f"{row['amount']:.2f}"} for row in summary['segments']],
+        }
+
+
+class SegmentCampaignView(generics.ListAPIView):
+    """Customers of one segment, highest amount first, each with a WhatsApp link from the segment's template"""
+    serializer_class = CustomerSegmentSerializer
+    authentication_classes = [TokenAuthentication, SessionAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def get_segment(self):
+        segment = self.kwargs['segment'].upper()
+        if segment not in CustomerSegment.Segment.values:
+            raise Http404('Segmento no encontrado')
+        return segment
+
+    def get_queryset(self):
+        return segments.campaign(self.get_segment())
+
+    def get_serializer_context(self):
+        return {**super().get_serializer_context(), 'template': segments.message(self.get_segment())}
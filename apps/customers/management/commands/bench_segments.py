@@ -0,0 +1,84 @@
+"""
+Management command to benchmark the RFM segmentation refresh
+"""
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from datetime import timedelta
+import numpy as np
+import time
+from apps.customers import segments
+from apps.customers.models import Customer
+from apps.reports.dates import business_date
+from apps.reports.models import DailyCustomerSales
+
+
+class Command(BaseCommand):
+    help = 'Time load(), score() and save() of a segment refresh over synthetic sales (default: 500k sales, up to 50k customers, 730 days; data is rolled back)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sales', type=int, default=500000)
+        parser.add_argument('--customers', type=int, default=50000)
+        parser.add_argument('--days', type=int, default=730)
+        parser.add_argument('--runs', type=int, default=3)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            rollups = self.create_fixtures(options['sales'], options['customers'], options['days'])
+            timings = {'load': [], 'score': [], 'save': [], 'refresh': []}
+            for _ in range(options['runs']):
+                start = time.perf_counter()
+                data = segments.load(history_days=options['days'])
+                loaded = time.perf_counter()
+                result = segments.score(data)
+                scored = time.perf_counter()
+                saved_count = segments.save(data, result)
+                done = time.perf_counter()
+                timings['load'].append(loaded - start)
+                timings['score'].append(scored - loaded)
+                timings['save'].append(done - scored)
+                timings['refresh'].append(done - start)
+
+            self.stdout.write(f"{options['sales']} sales, {rollups} daily rows, {saved_count} customers, {options['days']} days")
+            labels, counts = np.unique(result['segment'], return_counts=True)
+            self.stdout.write(', '.join(f'{label}: {count}' for label, count in zip(labels, counts)))
+            for step, values in timings.items():
+                self.stdout.write(f'{step:>8}: best {min(values) * 1000:.0f} ms, median {sorted(values)[len(values) // 2] * 1000:.0f} ms')
+            self.stdout.write(self.style.SUCCESS(f"✓ refresh: {min(timings['refresh']):.2f} s best"))
+            transaction.set_rollback(True)
+
+    def create_fixtures(self, sales, customers, days):
+        """Customers and their daily rollups for `sales` synthetic sales; returns the number of rollup rows"""
+        rng = np.random.default_rng(7)
+        # Skewed like real shops: a few customers make most of the purchases
+        customer = np.minimum(rng.zipf(1.3, sales), customers) - 1
+        day = rng.integers(0, days, sales)
+        amount = rng.gamma(2, 60, sales)
+
+        Customer.objects.bulk_create([
+            Customer(dni=f'B{n:09d}', name=f'Cliente benchmark {n}') for n in range(customers)
+        ], batch_size=2000)
+        ids = np.array(
+            Customer.objects.filter(dni__startswith='B', name__startswith='Cliente benchmark ')
+            .order_by('dni').values_list('pk', flat=True)
+        )
+
+        # One rollup row per (customer, day)
+        pair = customer.astype(np.int64) * days + day
+        pairs, inverse = np.unique(pair, return_inverse=True)
+        counts = np.bincount(inverse)
+        revenue = np.bincount(inverse, weights=amount)
+        today = business_date()
+        rows = [
+            (str(today - timedelta(days=days - 1 - int(p % days))), int(ids[p // days]), int(c), f'{r:.2f}')
+            for p, c, r in zip(pairs.tolist(), counts.tolist(), revenue.tolist())
+        ]
+        db = connections[DEFAULT_DB_ALIAS]
+        quote = db.ops.quote_name
+        fields = [DailyCustomerSales._meta.get_field(f) for f in ('date', 'customer', 'sale_count', 'revenue')]
+        with db.cursor() as cursor:
+            cursor.executemany(
+                f"INSERT INTO {quote(DailyCustomerSales._meta.db_table)} "
+                f"({', '.join(quote(f.column) for f in fields)}) VALUES (%s, %s, %s, %s)",
+                rows,
+            )
+        return len(rows)
@@ -0,0 +1,16 @@
+"""
+Management command to rebuild the customer figures from sales and reservations
+"""
+from django.core.management.base import BaseCommand
+from apps.customers import stats
+
+
+class Command(BaseCommand):
+    help = 'Recompute every customer revenue, sale count, purchase dates and reserved units'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Rows written per batch')
+
+    def handle(self, *args, **options):
+        count = stats.rebuild(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'✓ Customer figures rebuilt for {count} customers'))
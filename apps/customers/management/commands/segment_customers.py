@@ -0,0 +1,29 @@
+"""
+Management command to compute the RFM segment of every customer
+"""
+from django.core.management.base import BaseCommand
+import time
+from apps.customers import segments
+
+
+class Command(BaseCommand):
+    help = 'Score recency, frequency and monetary value of every customer and store their segments'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, help='Days of sales history (default: SEGMENT_HISTORY_DAYS)')
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        data = segments.load(history_days=options['days'])
+        loaded = time.perf_counter()
+        result = segments.score(data)
+        scored = time.perf_counter()
+        count = segments.save(data, result)
+        saved = time.perf_counter()
+
+        for row in segments.summary()['segments']:
+            self.stdout.write(f"{row['label']:<20} {row['customers']:>8} clientes  S/ {row['amount']:,.2f}")
+        self.stdout.write(self.style.SUCCESS(
+            f'✓ {count} customers segmented '
+            f'(load {loaded - start:.2f} s, score {(scored - loaded) * 1000:.0f} ms, save {saved - scored:.2f} s)'
+        ))
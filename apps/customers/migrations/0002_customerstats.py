@@ -0,0 +1,63 @@
+# Generated by Django 5.0.1 on 2026-10-18 03:44
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Max, Min, Sum
+
+
+def fill_stats(apps, schema_editor):
+    Customer = apps.get_model('customers', 'Customer')
+    CustomerStats = apps.get_model('customers', 'CustomerStats')
+    Sale = apps.get_model('sales', 'Sale')
+    Reservation = apps.get_model('sales', 'Reservation')
+    figures = {
+        row['customer_id']: row
+        for row in Sale.objects.filter(status='COMPLETED', customer__isnull=False).values('customer_id').annotate(
+            revenue=Sum('total'), sale_count=Count('id'),
+            first_purchase_at=Min('created_at'), last_purchase_at=Max('created_at'),
+        )
+    }
+    reserved = dict(
+        Reservation.objects.filter(status='RESERVED', customer__isnull=False).values('customer_id').annotate(
+            units=Sum('quantity')
+        ).values_list('customer_id', 'units')
+    )
+    CustomerStats.objects.bulk_create([
+        CustomerStats(
+            customer_id=pk,
+            revenue=figures.get(pk, {}).get('revenue', 0),
+            sale_count=figures.get(pk, {}).get('sale_count', 0),
+            first_purchase_at=figures.get(pk, {}).get('first_purchase_at'),
+            last_purchase_at=figures.get(pk, {}).get('last_purchase_at'),
+            reserved_quantity=reserved.get(pk, 0),
+        )
+        for pk in Customer.objects.values_list('pk', flat=True)
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customers', '0001_initial'),
+        ('sales', '0007_alter_saleitem_unit_cost'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CustomerStats',
+            fields=[
+                ('customer', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='customers.customer', verbose_name='Cliente')),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='Total comprado')),
+                ('sale_count', models.IntegerField(default=0, verbose_name='Compras')),
+                ('first_purchase_at', models.DateTimeField(blank=True, null=True, verbose_name='Primera compra')),
+                ('last_purchase_at', models.DateTimeField(blank=True, null=True, verbose_name='Última compra')),
+                ('reserved_quantity', models.IntegerField(default=0, verbose_name='Unidades reservadas')),
+            ],
+            options={
+                'verbose_name': 'Estadísticas de cliente',
+                'verbose_name_plural': 'Estadísticas de clientes',
+                'indexes': [models.Index(fields=['-revenue'], name='customerstats_revenue'), models.Index(fields=['-sale_count'], name='customerstats_sale_count'), models.Index(fields=['last_purchase_at'], name='customerstats_last_purchase')],
+            },
+        ),
+        migrations.RunPython(fill_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.0.1 on 2026-10-18 03:46
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customers', '0002_customerstats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CustomerSegment',
+            fields=[
+                ('customer', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='segment', serialize=False, to='customers.customer', verbose_name='Cliente')),
+                ('recency_days', models.IntegerField(verbose_name='Días desde la última compra')),
+                ('frequency', models.IntegerField(verbose_name='Compras')),
+                ('monetary', models.DecimalField(decimal_places=2, max_digits=14, verbose_name='Monto')),
+                ('r_score', models.PositiveSmallIntegerField(verbose_name='R')),
+                ('f_score', models.PositiveSmallIntegerField(verbose_name='F')),
+                ('m_score', models.PositiveSmallIntegerField(verbose_name='M')),
+                ('segment', models.CharField(choices=[('CHAMPIONS', 'Campeones'), ('LOYAL', 'Leales'), ('NEW', 'Nuevos'), ('POTENTIAL', 'Potenciales'), ('AT_RISK', 'En riesgo'), ('NEEDS_ATTENTION', 'Requieren atención'), ('LOST', 'Perdidos')], max_length=20, verbose_name='Segmento')),
+                ('refreshed_at', models.DateTimeField(verbose_name='Calculado')),
+            ],
+            options={
+                'verbose_name': 'Segmento de cliente',
+                'verbose_name_plural': 'Segmentos de clientes',
+                'indexes': [models.Index(fields=['segment', '-monetary'], name='customersegment_segment')],
+            },
+        ),
+    ]
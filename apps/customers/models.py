@@ -63,9 +63,136 @@ class Customer(models.Model):
     def __str__(self):
         return f"{self.name} - DNI: {self.dni}"
     
+    def save(self, *args, **kwargs):
+        adding = self._state.adding
+        super().save(*args, **kwargs)
+        if adding:
+            CustomerStats.objects.get_or_create(customer=self)
+    
     @property
     def total_purchases(self):
-        """Calculate total purchases amount"""
-        return self.sales.filter(status='COMPLETED').aggregate(
-            total=models.Sum('total')
-        )['total'] or 0
+        """Lifetime amount of completed sales (kept in CustomerStats)"""
+        try:
+            return self.stats.revenue
+        except CustomerStats.DoesNotExist:
+            return 0
+
+
+class CustomerStats(models.Model):
+    """
+    Lifetime figures of a customer, updated as sales and reservations
+    happen (see apps.customers.stats)
+    """
+    
+    customer = models.OneToOneField(
+        Customer,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats',
+        verbose_name='Cliente'
+    )
+    
+    revenue = models.DecimalField(
+        max_digits=14,
+        decimal_places=2,
+        default=0,
+        verbose_name='Total comprado'
+    )
+    
+    sale_count = models.IntegerField(
+        default=0,
+        verbose_name='Compras'
+    )
+    
+    first_purchase_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name='Primera compra'
+    )
+    
+    last_purchase_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name='Última compra'
+    )
+    
+    reserved_quantity = models.IntegerField(
+        default=0,
+        verbose_name='Unidades reservadas'
+    )
+    
+    class Meta:
+        verbose_name = 'Estadísticas de cliente'
+        verbose_name_plural = 'Estadísticas de clientes'
+        indexes = [
+            # Customer list orderings and the "inactive" filter
+            models.Index(fields=['-revenue'], name='customerstats_revenue'),
+            models.Index(fields=['-sale_count'], name='customerstats_sale_count'),
+            models.Index(fields=['last_purchase_at'], name='customerstats_last_purchase'),
+        ]
+    
+    def __str__(self):
+        return f"{self.customer_id} - {self.sale_count} compras, S/ {self.revenue}"
+
+
+class CustomerSegment(models.Model):
+    """
+    RFM score and segment of a customer, written by the segmentation job
+    (apps.customers.segments)
+    """
+    
+    class Segment(models.TextChoices):
+        CHAMPIONS = 'CHAMPIONS', 'Campeones'
+        LOYAL = 'LOYAL', 'Leales'
+        NEW = 'NEW', 'Nuevos'
+        POTENTIAL = 'POTENTIAL', 'Potenciales'
+        AT_RISK = 'AT_RISK', 'En riesgo'
+        NEEDS_ATTENTION = 'NEEDS_ATTENTION', 'Requieren atención'
+        LOST = 'LOST', 'Perdidos'
+    
+    customer = models.OneToOneField(
+        Customer,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='segment',
+        verbose_name='Cliente'
+    )
+    
+    recency_days = models.IntegerField(
+        verbose_name='Días desde la última compra'
+    )
+    
+    frequency = models.IntegerField(
+        verbose_name='Compras'
+    )
+    
+    monetary = models.DecimalField(
+        max_digits=14,
+        decimal_places=2,
+        verbose_name='Monto'
+    )
+    
+    r_score = models.PositiveSmallIntegerField(verbose_name='R')
+    f_score = models.PositiveSmallIntegerField(verbose_name='F')
+    m_score = models.PositiveSmallIntegerField(verbose_name='M')
+    
+    segment = models.CharField(
+        max_length=20,
+        choices=Segment.choices,
+        verbose_name='Segmento'
+    )
+    
+    refreshed_at = models.DateTimeField(
+        verbose_name='Calculado'
+    )
+    
+    class Meta:
+        verbose_name = 'Segmento de cliente'
+        verbose_name_plural = 'Segmentos de clientes'
+        indexes = [
+            # Campaign lists: one segment, best customers first
+            models.Index(fields=['segment', '-monetary'], name='customersegment_segment'),
+        ]
+    
+    def __str__(self):
+        return f"{self.customer_id} - {self.get_segment_display()} ({self.r_score}{self.f_score}{self.m_score})"
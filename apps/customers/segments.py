@@ -0,0 +1,189 @@
+"""
+RFM customer segmentation
+
+`load` reads every customer's purchases over the history window with one
+GROUP BY query on the DailyCustomerSales rollups (cancelled sales are
+already out of them) into NumPy arrays: sales count, amount and last day
+with a purchase. `score` then computes for every customer in one
+vectorized pass:
+
+- recency (days since the last purchase), frequency (number of sales) and
+  monetary value (amount bought);
+- a 1-5 score for each by quintile, customers tied on a value sharing the
+  score;
+- a segment from the recency score and the average of the frequency and
+  monetary scores (see SEGMENT_RULES).
+
+`save` replaces the CustomerSegment table with the result, stamped with
+the refresh time, and `campaign` lists a segment's customers for a
+WhatsApp campaign with the segment's template.
+"""
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.db.models import Count, Max, Sum
+from django.utils import timezone
+from datetime import timedelta
+from decimal import Decimal
+from urllib.parse import quote
+import numpy as np
+from .models import CustomerSegment
+
+Segment = CustomerSegment.Segment
+
+# (segment, condition on the recency score r, the frequency score f and
+# fm, the average of the frequency and monetary scores); first match wins
+SEGMENT_RULES = (
+    (Segment.CHAMPIONS, lambda r, f, fm: (r >= 4) & (fm >= 4)),
+    (Segment.LOYAL, lambda r, f, fm: (r >= 3) & (fm >= 3)),
+    (Segment.NEW, lambda r, f, fm: (r >= 4) & (f <= 2)),
+    (Segment.POTENTIAL, lambda r, f, fm: r >= 3),
+    (Segment.AT_RISK, lambda r, f, fm: fm >= 3),
+    (Segment.LOST, lambda r, f, fm: r == 1),
+)
+DEFAULT_SEGMENT = Segment.NEEDS_ATTENTION
+
+# WhatsApp message per segment (WhatsAppTemplate key SEGMENT_<segment>)
+DEFAULT_MESSAGES = {
+    Segment.CHAMPIONS: 'Hola {{name}}, gracias por ser uno de nuestros mejores clientes. Tenemos novedades para usted en Kelvin Repuestos.',
+    Segment.LOYAL: 'Hola {{name}}, gracias por su preferencia. Consulte nuestras ofertas de la semana en Kelvin Repuestos.',
+    Segment.NEW: 'Hola {{name}}, gracias por su primera compra en Kelvin Repuestos. Estamos para ayudarle.',
+    Segment.POTENTIAL: 'Hola {{name}}, tenemos repuestos y ofertas que le pueden interesar en Kelvin Repuestos.',
+    Segment.AT_RISK: 'Hola {{name}}, hace tiempo no nos visita. Tenemos ofertas especiales para usted en Kelvin Repuestos.',
+    Segment.NEEDS_ATTENTION: 'Hola {{name}}, ¿necesita algún repuesto? Consulte stock y precios en Kelvin Repuestos.',
+    Segment.LOST: 'Hola {{name}}, le extrañamos en Kelvin Repuestos. Vuelva y aproveche nuestras ofertas.',
+}
+
+
+def template_key(segment):
+    return f'SEGMENT_{segment}'
+
+
+def load(today=None, history_days=None):
+    """Sales count, amount and last purchase day of every customer over the last `history_days` days, as arrays"""
+    from apps.reports.dates import business_date, date_range
+    from apps.reports.models import DailyCustomerSales
+
+    today = today or business_date()
+    history_days = history_days or settings.SEGMENT_HISTORY_DAYS
+    start = today - timedelta(days=history_days - 1)
+
+    rows = list(DailyCustomerSales.objects.filter(
+        date_range(start, today, 'date'), sale_count__gt=0
+    ).values('customer_id').annotate(
+        sales=Sum('sale_count'), amount=Sum('revenue'), last=Max('date')
+    ).order_by('customer_id').values_list('customer_id', 'sales', 'amount', 'last'))
+    columns = list(zip(*rows)) or [()] * 4
+
+    return {
+        'today': today,
+        'history_days': history_days,
+        'ids': np.array(columns[0], dtype=np.int64),
+        'frequency': np.array(columns[1], dtype=np.int64),
+        'monetary': np.array(columns[2], dtype=np.float64),
+        'recency': np.array([(today - day).days for day in columns[3]], dtype=np.int64),
+    }
+
+
+def _quintiles(values):
+    """
+    Score 1-5 by quintile of each value's percentile rank, higher values
+    scoring higher. Ties take the middle of their ranks, so a value shared
+    by many customers scores by where the group sits, not its bottom.
+    """
+    ordered = np.sort(values)
+    rank = np.searchsorted(ordered, values, side='left') + np.searchsorted(ordered, values, side='right')
+    return np.clip(np.ceil(rank / (2 * max(len(values), 1)) * 5), 1, 5).astype(np.int64)
+
+
+def score(data):
+    """RFM scores and segment of every customer in `data`, as arrays"""
+    r = _quintiles(-data['recency'])
+    f = _quintiles(data['frequency'])
+    m = _quintiles(data['monetary'])
+    fm = (f + m + 1) // 2
+    segment = np.select(
+        [condition(r, f, fm) for _, condition in SEGMENT_RULES],
+        [str(s) for s, _ in SEGMENT_RULES],
+        default=str(DEFAULT_SEGMENT),
+    )
+    return {'r': r, 'f': f, 'm': m, 'segment': segment}
+
+
+def save(data, result, now=None):
+    """
+    Replace the stored segments with `result`; returns the number of
+    customers. The rows go out as one executemany: bulk_create's per-field
+    compilation would cost more than scoring everyone.
+    """
+    now = now or timezone.now()
+    cent = Decimal('0.01')
+    db = connections[DEFAULT_DB_ALIAS]
+    fields = ['customer', 'recency_days', 'frequency', 'monetary', 'r_score', 'f_score', 'm_score', 'segment', 'refreshed_at']
+    columns = [CustomerSegment._meta.get_field(field) for field in fields]
+    refreshed_at = columns[-1].get_db_prep_save(now, db)
+    rows = [
+        (pk, recency, frequency, str(Decimal(monetary).quantize(cent)), r, f, m, segment, refreshed_at)
+        for pk, recency, frequency, monetary, r, f, m, segment in zip(
+            data['ids'].tolist(), data['recency'].tolist(), data['frequency'].tolist(),
+            data['monetary'].tolist(), result['r'].tolist(), result['f'].tolist(), result['m'].tolist(),
+            result['segment'].tolist(),
+        )
+    ]
+    quote = db.ops.quote_name
+    with transaction.atomic():
+        CustomerSegment.objects.all().delete()
+        with db.cursor() as cursor:
+            cursor.executemany(
+                f"INSERT INTO {quote(CustomerSegment._meta.db_table)} "
+                f"({', '.join(quote(c.column) for c in columns)}) VALUES ({', '.join(['%s'] * len(columns))})",
+                rows,
+            )
+    return len(rows)
+
+
+def refresh(today=None, history_days=None):
+    """Recompute and store every customer's segment; returns the number of customers"""
+    data = load(today, history_days)
+    return save(data, score(data))
+
+
+def summary():
+    """Customers and amount per segment and the time of the last refresh"""
+    rows = {
+        row['segment']: row
+        for row in CustomerSegment.objects.values('segment').annotate(
+            customers=Count('customer_id'), amount=Sum('monetary'), refreshed_at=Max('refreshed_at')
+        )
+    }
+    segments = []
+    for segment in Segment:
+        row = rows.get(segment.value, {})
+        segments.append({
+            'segment': segment.value,
+            'label': segment.label,
+            'customers': row.get('customers', 0),
+            'amount': row.get('amount') or Decimal(0),
+        })
+    refreshed = [row['refreshed_at'] for row in rows.values()]
+    return {'refreshed_at': max(refreshed) if refreshed else None, 'segments': segments}
+
+
+def message(segment):
+    """The segment's WhatsApp template"""
+    from apps.accounts.models import WhatsAppTemplate
+    return WhatsAppTemplate.get_content(template_key(segment), DEFAULT_MESSAGES[Segment(segment)])
+
+
+def whatsapp_url(template, customer):
+    text = quote(template.replace('{{name}}', customer.name))
+    phone = ''.join(ch for ch in customer.phone if ch.isdigit())
+    if phone:
+        return f"https://wa.me/{phone}?text={text}"
+    return f"https://wa.me/?text={text}"
+
+
+def campaign(segment):
+    """Active customers of `segment`, highest amount first"""
+    return CustomerSegment.objects.filter(
+        segment=segment, customer__is_active=True
+    ).select_related('customer').order_by('-monetary', 'customer_id')
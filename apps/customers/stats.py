@@ -0,0 +1,128 @@
+"""
+Customer figures maintained as sales and reservations happen
+
+CustomerStats holds each customer's lifetime revenue, number of sales,
+first and last purchase and the units held in open reservations. Checkout,
+cancellation and reservation changes adjust it with one UPDATE in their own
+transaction, so the customer list, detail and all-time rankings sort and
+filter on indexed columns instead of aggregating the sales table.
+
+`rebuild` recomputes the rows from the sales and reservations (the
+rebuild_customer_stats command).
+"""
+from django.db import transaction
+from django.db.models import Case, Count, F, IntegerField, Max, Min, Sum, Value, When
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
+from datetime import timedelta
+from .models import Customer, CustomerStats
+
+INACTIVE_DAYS = 90
+
+
+def sale_completed(sale, reservations_used=0):
+    """
+    Count a completed sale in its customer's figures, along with the
+    reserved units it took. Called once the sale and the reservations are
+    written, so a missing row is rebuilt with both already in.
+    """
+    if not sale.customer_id:
+        return
+    updated = CustomerStats.objects.filter(customer_id=sale.customer_id).update(
+        revenue=F('revenue') + sale.total,
+        reserved_quantity=F('reserved_quantity') - reservations_used,
+        sale_count=F('sale_count') + 1,
+        first_purchase_at=Coalesce(F('first_purchase_at'), Value(sale.created_at)),
+        last_purchase_at=Greatest(Coalesce(F('last_purchase_at'), Value(sale.created_at)), Value(sale.created_at)),
+    )
+    if not updated:
+        rebuild([sale.customer_id])
+
+
+def sale_cancelled(sale):
+    """Take a cancelled sale out of its customer's figures"""
+    if not sale.customer_id:
+        return
+    stats = CustomerStats.objects.select_for_update().filter(customer_id=sale.customer_id).first()
+    if stats is None or sale.created_at in (stats.first_purchase_at, stats.last_purchase_at):
+        # The first or last purchase is gone: read the dates back from the sales
+        rebuild([sale.customer_id])
+        return
+    CustomerStats.objects.filter(pk=stats.pk).update(
+        revenue=F('revenue') - sale.total,
+        sale_count=F('sale_count') - 1,
+    )
+
+
+def reservations_changed(deltas):
+    """Add {customer_id: units} to the customers' open reservation quantity with one UPDATE"""
+    deltas = {customer_id: delta for customer_id, delta in deltas.items() if customer_id and delta}
+    if not deltas:
+        return
+    present = set(CustomerStats.objects.filter(customer_id__in=list(deltas)).values_list('customer_id', flat=True))
+    if present:
+        CustomerStats.objects.filter(customer_id__in=present).update(reserved_quantity=Case(
+            *[When(customer_id=customer_id, then=F('reserved_quantity') + deltas[customer_id]) for customer_id in present],
+            default=F('reserved_quantity'),
+            output_field=IntegerField(),
+        ))
+    missing = set(deltas) - present
+    if missing:
+        rebuild(sorted(missing))
+
+
+def top_customers(queryset):
+    """Customers who bought, highest lifetime revenue first"""
+    return queryset.filter(stats__revenue__gt=0).order_by('-stats__revenue', 'name')
+
+
+def frequent_customers(queryset):
+    """Customers who bought, most sales first"""
+    return queryset.filter(stats__sale_count__gt=0).order_by('-stats__sale_count', 'name')
+
+
+def inactive_customers(queryset, days=INACTIVE_DAYS):
+    """Customers who bought before but not in the last `days` days, most recently lapsed first"""
+    cutoff = timezone.now() - timedelta(days=days)
+    return queryset.filter(stats__last_purchase_at__lt=cutoff).order_by('-stats__last_purchase_at', 'name')
+
+
+@transaction.atomic
+def rebuild(customer_ids=None, batch_size=1000):
+    """Recompute the figures of `customer_ids` (every customer by default) from scratch"""
+    from apps.sales.models import Sale, Reservation
+
+    customers = Customer.objects.all()
+    sales = Sale.objects.filter(status=Sale.Status.COMPLETED, customer__isnull=False)
+    reservations = Reservation.objects.filter(status=Reservation.Status.RESERVED, customer__isnull=False)
+    if customer_ids is not None:
+        customers = customers.filter(pk__in=customer_ids)
+        sales = sales.filter(customer_id__in=customer_ids)
+        reservations = reservations.filter(customer_id__in=customer_ids)
+
+    figures = {
+        row['customer_id']: row
+        for row in sales.values('customer_id').annotate(
+            revenue=Sum('total'), sale_count=Count('id'),
+            first_purchase_at=Min('created_at'), last_purchase_at=Max('created_at'),
+        )
+    }
+    reserved = dict(reservations.values('customer_id').annotate(units=Sum('quantity')).values_list('customer_id', 'units'))
+
+    rows = []
+    for pk in customers.values_list('pk', flat=True).iterator(chunk_size=batch_size):
+        row = figures.get(pk, {})
+        rows.append(CustomerStats(
+            customer_id=pk,
+            revenue=row.get('revenue', 0),
+            sale_count=row.get('sale_count', 0),
+            first_purchase_at=row.get('first_purchase_at'),
+            last_purchase_at=row.get('last_purchase_at'),
+            reserved_quantity=reserved.get(pk, 0),
+        ))
+    stale = CustomerStats.objects.all()
+    if customer_ids is not None:
+        stale = stale.filter(customer_id__in=customer_ids)
+    stale.delete()
+    CustomerStats.objects.bulk_create(rows, batch_size=batch_size)
+    return len(rows)
@@ -5,6 +5,14 @@ from django.contrib.auth.mixins import LoginRequiredMixin
 from django.views.generic import ListView, CreateView, UpdateView, DetailView, DeleteView
 from django.urls import reverse_lazy
 from .models import Customer
+from . import stats
+
+# Sorted and filtered on the indexed CustomerStats columns
+CUSTOMER_FILTERS = {
+    'top': stats.top_customers,
+    'frequent': stats.frequent_customers,
+    'inactive': stats.inactive_customers,
+}
 
 
 class CustomerListView(LoginRequiredMixin, ListView):
@@ -14,11 +22,21 @@ class CustomerListView(LoginRequiredMixin, ListView):
     paginate_by = 20
     
     def get_queryset(self):
-        queryset = Customer.objects.filter(is_active=True)
+        queryset = Customer.objects.filter(is_active=True).select_related('stats')
         search = self.request.GET.get('search')
         if search:
             queryset = queryset.filter(name__icontains=search) | queryset.filter(dni__icontains=search)
+        segment = self.request.GET.get('segment')
+        if segment in CUSTOMER_FILTERS:
+            return CUSTOMER_FILTERS[segment](queryset)
         return queryset.order_by('name')
+    
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        segment = self.request.GET.get('segment')
+        context['segment'] = segment if segment in CUSTOMER_FILTERS else ''
+        context['inactive_days'] = stats.INACTIVE_DAYS
+        return context
 
 
 class CustomerCreateView(LoginRequiredMixin, CreateView):
@@ -32,6 +50,7 @@ class CustomerDetailView(LoginRequiredMixin, DetailView):
     model = Customer
     template_name = 'customers/customer_detail.html'
     context_object_name = 'customer'
+    queryset = Customer.objects.select_related('stats')
 
 
 class CustomerUpdateView(LoginRequiredMixin, UpdateView):
@@ -5,3 +5,18 @@ class ProductsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.products'
     verbose_name = 'Productos y Categorías'
+
+    def ready(self):
+        from django.db.models.signals import post_migrate
+        post_migrate.connect(_install_search_index, sender=self)
+
+
+def _install_search_index(using, **kwargs):
+    # SQLite drops the FTS triggers whenever a migration rebuilds the product table
+    from django.db import connections
+    from .search import install
+    connection = connections[using]
+    with connection.cursor() as cursor:
+        columns = [c.name for c in connection.introspection.get_table_description(cursor, 'products_product')]
+    if 'search_text' in columns:
+        install(connection)
@@ -0,0 +1,162 @@
+"""
+Catalog sync for POS terminals
+
+A terminal downloads the catalog once and then asks only for products that
+changed after its cursor. Every write to price, stock, reserved stock or
+is_active touches Product.updated_at (queryset updates set it explicitly),
+so one indexed range scan on (updated_at, id) finds all changes.
+
+Cursors are keyset positions "<updated_at ISO>|<id>". Rows are stamped when
+their UPDATE runs, not when the transaction commits, so the cursor handed
+out at the end of a sync is moved back by CATALOG_SYNC_OVERLAP_SECONDS and
+the next poll re-reads that window; clients upsert by id, so repeats are
+harmless.
+
+The POS starts from a bundle: the same rows plus a precomputed search index,
+gzipped once per catalog version and kept in memory, so terminals search
+locally and only download it again after the catalog changes.
+"""
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db.models import Q, Max, Count
+from django.utils import timezone
+from datetime import datetime, timedelta, timezone as dt_timezone
+from .models import Product, Category
+from .search import tokenize
+import gzip
+import hashlib
+import json
+import threading
+
+FIELDS = ['id', 'code', 'name', 'category', 'price', 'stock', 'reserved', 'image']
+
+_COLUMNS = ('id', 'code', 'name', 'category_id', 'sale_price', 'stock', 'reserved_stock', 'image', 'is_active', 'updated_at')
+
+
+# Index keys are token prefixes of at most this many characters
+PREFIX_LENGTH = 3
+
+_bundle = None
+_bundle_lock = threading.Lock()
+
+
+class InvalidCursor(ValueError):
+    """The cursor is not one this endpoint produced"""
+
+
+def encode_cursor(updated_at, pk):
+    return f'{updated_at.isoformat()}|{pk}'
+
+
+def decode_cursor(cursor):
+    try:
+        stamp, pk = cursor.rsplit('|', 1)
+        updated_at = datetime.fromisoformat(stamp)
+        pk = int(pk)
+    except (ValueError, AttributeError):
+        raise InvalidCursor(cursor)
+    if timezone.is_naive(updated_at):
+        updated_at = timezone.make_aware(updated_at, dt_timezone.utc)
+    return updated_at, pk
+
+
+def _row(values):
+    pk, code, name, category_id, price, stock, reserved, image = values[:8]
+    return [pk, code, name, category_id, str(price), stock, reserved, default_storage.url(image) if image else None]
+
+
+def changes(cursor=None, limit=None):
+    """
+    One page of the catalog.
+
+    Without a cursor this is the start of a full snapshot (active products
+    only). With a cursor it returns products changed after it, and inactive
+    ones as tombstones in `removed`.
+    """
+    limit = limit or settings.CATALOG_SYNC_PAGE_SIZE
+    queryset = Product.objects.order_by('updated_at', 'id')
+    if cursor:
+        updated_at, pk = decode_cursor(cursor)
+        queryset = queryset.filter(Q(updated_at__gt=updated_at) | Q(updated_at=updated_at, id__gt=pk))
+    else:
+        queryset = queryset.filter(is_active=True)
+
+    rows = list(queryset.values_list(*_COLUMNS)[:limit + 1])
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    if rows:
+        last = rows[-1]
+        updated_at, pk = last[-1], last[0]
+        if not has_more:
+            # End of this sync: step back so rows stamped before a slow commit are read again
+            updated_at, pk = updated_at - timedelta(seconds=settings.CATALOG_SYNC_OVERLAP_SECONDS), 0
+        next_cursor = encode_cursor(updated_at, pk)
+    elif cursor:
+        next_cursor = cursor
+    else:
+        next_cursor = encode_cursor(timezone.now() - timedelta(seconds=settings.CATALOG_SYNC_OVERLAP_SECONDS), 0)
+
+    return {
+        'snapshot': not cursor,
+        'fields': FIELDS,
+        'products': [_row(r) for r in rows if r[8]],
+        'removed': [r[0] for r in rows if not r[8]],
+        'categories': dict(Category.objects.values_list('id', 'name')),
+        'cursor': next_cursor,
+        'has_more': has_more,
+    }
+
+
+def version():
+    """
+    Cheap fingerprint of the catalog: latest product change, product count
+    and the category names. Any price, stock or status change moves
+    updated_at; renaming a category moves its products' too.
+    """
+    products = Product.objects.aggregate(updated=Max('updated_at'), count=Count('id'))
+    categories = list(Category.objects.order_by('id').values_list('id', 'name'))
+    raw = f"{products['updated']}|{products['count']}|{categories}"
+    return hashlib.sha1(raw.encode()).hexdigest()[:16]
+
+
+def _build(current_version):
+    categories = dict(Category.objects.values_list('id', 'name'))
+    rows = list(Product.objects.filter(is_active=True).order_by('id').values_list(*_COLUMNS))
+    products = [_row(r) for r in rows]
+
+    # prefix -> positions in `products`, from name, code and category tokens
+    index = {}
+    for position, r in enumerate(rows):
+        text = f'{r[2]} {r[1]} {categories.get(r[3], "")}'
+        for prefix in {t[:PREFIX_LENGTH] for t in tokenize(text)}:
+            index.setdefault(prefix, []).append(position)
+
+    latest = max((r[-1] for r in rows), default=timezone.now())
+    cursor = encode_cursor(latest - timedelta(seconds=settings.CATALOG_SYNC_OVERLAP_SECONDS), 0)
+    payload = {
+        'version': current_version,
+        'cursor': cursor,
+        'fields': FIELDS,
+        'products': products,
+        'categories': categories,
+        'prefix_length': PREFIX_LENGTH,
+        'index': index,
+    }
+    raw = json.dumps(payload, separators=(',', ':'), ensure_ascii=False).encode()
+    return current_version, gzip.compress(raw, compresslevel=6)
+
+
+def bundle():
+    """(version, gzipped JSON) for the current catalog, rebuilt only when the version changes"""
+    global _bundle
+    current = version()
+    cached = _bundle
+    if cached and cached[0] == current:
+        return cached
+    with _bundle_lock:
+        # Another request may have built it while we waited
+        if _bundle and _bundle[0] == current:
+            return _bundle
+        _bundle = _build(current)
+        return _bundle
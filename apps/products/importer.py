@@ -0,0 +1,472 @@
+"""
+Bulk product import from CSV or XLSX
+
+Rows are streamed (csv reader over the file, openpyxl in read-only mode)
+and written in chunks: one query finds which codes already exist, new
+products get their codes from a single block allocation, and the chunk's
+inserts and updates each go out as one executemany. Categories and
+suppliers are resolved from maps loaded once, so memory and queries per
+chunk stay constant whatever the file size.
+
+Rows are matched by code. A row without a code, or with a code that does
+not exist yet, creates a product; otherwise only the columns present in
+the file are updated. Stock is only set on new products: changes to
+existing stock go through purchases and the kardex.
+
+A bad row is reported with its line number and skipped; the rest of the
+file is still imported. Categories named in the file are only created for
+rows that are written, and when a chunk hits a constraint its rows are
+retried one by one so only the offending rows fail.
+"""
+from django.db import DEFAULT_DB_ALIAS, connections, transaction, IntegrityError
+from django.utils import timezone
+from datetime import date, datetime
+from decimal import Decimal, InvalidOperation
+from typing import NamedTuple
+import csv
+import io
+from .models import Product, Category
+from .search import normalize, search_text
+
+CHUNK_SIZE = 1000
+MAX_ERRORS = 500
+
+# Accepted header spellings (compared without accents, case or spaces)
+COLUMNS = {
+    'code': ('codigo', 'code', 'sku'),
+    'name': ('nombre', 'name', 'producto'),
+    'category': ('categoria', 'category'),
+    'supplier': ('proveedor', 'supplier', 'ruc'),
+    'presentation': ('presentacion', 'presentation'),
+    'description': ('descripcion', 'description'),
+    'purchase_price': ('precio_compra', 'purchase_price', 'costo'),
+    'sale_price': ('precio_venta', 'sale_price', 'precio'),
+    'stock': ('stock',),
+    'min_stock': ('stock_minimo', 'min_stock'),
+    'expiration_date': ('vencimiento', 'fecha_vencimiento', 'expiration_date'),
+    'is_active': ('activo', 'is_active'),
+}
+REQUIRED_NEW = ('name', 'category', 'supplier', 'purchase_price', 'sale_price')
+ATTRIBUTES = {'category': 'category_id', 'supplier': 'supplier_id'}
+# Columns an import may change on existing products
+UPDATABLE = (
+    'name', 'category_id', 'supplier_id', 'presentation', 'description', 'purchase_price',
+    'sale_price', 'min_stock', 'expiration_date', 'is_active',
+)
+TRUE_VALUES = {'1', 'si', 'true', 'x', 'yes', 'verdadero'}
+FALSE_VALUES = {'0', 'no', 'false', 'falso'}
+
+
+class InvalidFile(Exception):
+    """The file itself cannot be imported (format or headers)"""
+
+
+class RowError(Exception):
+    """One row cannot be imported; it is reported and skipped"""
+
+
+class NewCategory(NamedTuple):
+    """A category the file names but the database lacks, created on flush"""
+    key: str
+    name: str
+
+
+class ImportResult:
+    """Counters and the first MAX_ERRORS row errors of an import"""
+
+    def __init__(self):
+        self.created = 0
+        self.updated = 0
+        self.unchanged = 0
+        self.error_count = 0
+        self.errors = []
+        self.categories_created = 0
+
+    def error(self, line, message):
+        self.error_count += 1
+        if len(self.errors) < MAX_ERRORS:
+            self.errors.append((line, message))
+
+    @property
+    def total(self):
+        return self.created + self.updated + self.unchanged + self.error_count
+
+
+def _key(header):
+    return '_'.join(normalize(str(header or '')).split())
+
+
+def _header_map(headers):
+    aliases = {alias: field for field, names in COLUMNS.items() for alias in names}
+    mapping = {}
+    for index, header in enumerate(headers):
+        field = aliases.get(_key(header))
+        if field and field not in mapping:
+            mapping[field] = index
+    if 'code' not in mapping and 'name' not in mapping:
+        raise InvalidFile('El archivo debe tener una columna "codigo" o "nombre"')
+    return mapping
+
+
+def read_rows(file, filename):
+    """Yield the header row and then every data row of a CSV or XLSX file, as lists"""
+    if filename.lower().endswith('.xlsx'):
+        from openpyxl import load_workbook
+        try:
+            workbook = load_workbook(file, read_only=True, data_only=True)
+        except Exception:
+            raise InvalidFile('El archivo XLSX no es válido')
+        try:
+            for row in workbook.worksheets[0].iter_rows(values_only=True):
+                yield list(row)
+        finally:
+            workbook.close()
+    elif filename.lower().endswith('.csv'):
+        text = io.TextIOWrapper(file, encoding='utf-8-sig', newline='')
+        sample = text.read(4096)
+        text.seek(0)
+        try:
+            dialect = csv.Sniffer().sniff(sample, delimiters=',;\t')
+        except csv.Error:
+            dialect = csv.excel
+        try:
+            yield from csv.reader(text, dialect)
+        finally:
+            text.detach()
+    else:
+        raise InvalidFile('Formato no soportado: use CSV o XLSX')
+
+
+def _text(value):
+    if value is None:
+        return ''
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value).strip()
+
+
+def _decimal(value, label):
+    text = _text(value).replace('S/', '').replace(' ', '')
+    if ',' in text and '.' not in text:
+        text = text.replace(',', '.')
+    try:
+        number = Decimal(text)
+    except InvalidOperation:
+        raise RowError(f'{label} inválido: "{_text(value)}"')
+    if number < 0 or number >= Decimal('1e8'):
+        raise RowError(f'{label} fuera de rango: {number}')
+    return number.quantize(Decimal('0.01'))
+
+
+def _integer(value, label):
+    try:
+        number = Decimal(_text(value) or '0')
+    except InvalidOperation:
+        raise RowError(f'{label} inválido: "{_text(value)}"')
+    if not number.is_finite():
+        raise RowError(f'{label} inválido: "{_text(value)}"')
+    if number < 0:
+        raise RowError(f'{label} no puede ser negativo')
+    if number != number.to_integral_value():
+        raise RowError(f'{label} debe ser un número entero: {number}')
+    return int(number)
+
+
+def _date(value):
+    if value in (None, ''):
+        return None
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    text = _text(value)
+    for fmt in ('%Y-%m-%d', '%d/%m/%Y', '%d-%m-%Y'):
+        try:
+            return datetime.strptime(text, fmt).date()
+        except ValueError:
+            pass
+    raise RowError(f'Fecha de vencimiento inválida: "{text}"')
+
+
+def _boolean(value):
+    text = normalize(_text(value))
+    if isinstance(value, bool):
+        return value
+    if text in TRUE_VALUES:
+        return True
+    if text in FALSE_VALUES:
+        return False
+    raise RowError(f'Valor de "activo" inválido: "{_text(value)}"')
+
+
+class Importer:
+    """Turns rows into chunked upserts; see the module docstring"""
+
+    def __init__(self, default_supplier=None, create_categories=True, chunk_size=CHUNK_SIZE):
+        from apps.suppliers.models import Supplier
+
+        self.result = ImportResult()
+        self.chunk_size = chunk_size
+        self.create_categories = create_categories
+        self.categories = {}
+        self.category_names = {}
+        for pk, name in Category.objects.values_list('id', 'name'):
+            self.categories[normalize(name).strip()] = pk
+            self.category_names[pk] = name
+        self.suppliers = {}
+        for pk, name, ruc in Supplier.objects.values_list('id', 'name', 'ruc'):
+            self.suppliers.setdefault(normalize(name).strip(), pk)
+            self.suppliers[ruc] = pk
+        self.default_supplier = None
+        if default_supplier:
+            self.default_supplier = self._supplier(default_supplier)
+
+    def _category(self, value):
+        key = normalize(_text(value)).strip()
+        if not key:
+            raise RowError('Categoría vacía')
+        if key not in self.categories:
+            if not self.create_categories:
+                raise RowError(f'Categoría no encontrada: "{_text(value)}"')
+            return NewCategory(key, _text(value)[:100])
+        return self.categories[key]
+
+    def _create_categories(self, rows):
+        """
+        Create the new categories named by (product, NewCategory) rows in the
+        caller's transaction and point the products at them. Returns
+        {key: (category, created)}, remembered once the transaction commits.
+        """
+        categories = {}
+        for product, new in rows:
+            if new.key not in self.categories and new.key not in categories:
+                categories[new.key] = Category.objects.get_or_create(name=new.name)
+            product.category_id = self.categories[new.key] if new.key in self.categories else categories[new.key][0].pk
+        return categories
+
+    def _remember_categories(self, categories):
+        for key, (category, created) in categories.items():
+            self.result.categories_created += created
+            self.categories[key] = category.pk
+            self.category_names[category.pk] = category.name
+
+    def _supplier(self, value):
+        text = _text(value)
+        pk = self.suppliers.get(text) or self.suppliers.get(normalize(text).strip())
+        if pk is None:
+            raise RowError(f'Proveedor no encontrado: "{text}"')
+        return pk
+
+    def _parse(self, row, columns):
+        """{field: value} for the columns present in the row"""
+        def cell(field):
+            index = columns[field]
+            return row[index] if index < len(row) else None
+
+        values = {}
+        for field in columns:
+            raw = cell(field)
+            if field == 'code':
+                values[field] = _text(raw)[:20] or None
+            elif field == 'name':
+                values[field] = _text(raw)[:200] or None
+            elif field == 'presentation':
+                values[field] = _text(raw)[:50] or None
+            elif field == 'description':
+                values[field] = _text(raw) or None
+            elif field == 'category':
+                values[field] = self._category(raw) if _text(raw) else None
+            elif field == 'supplier':
+                values[field] = self._supplier(raw) if _text(raw) else None
+            elif field == 'purchase_price':
+                values[field] = _decimal(raw, 'Precio de compra') if _text(raw) else None
+            elif field == 'sale_price':
+                values[field] = _decimal(raw, 'Precio de venta') if _text(raw) else None
+            elif field == 'stock':
+                values[field] = _integer(raw, 'Stock')
+            elif field == 'min_stock':
+                values[field] = _integer(raw, 'Stock mínimo') if _text(raw) else None
+            elif field == 'expiration_date':
+                values[field] = _date(raw)
+            elif field == 'is_active':
+                values[field] = _boolean(raw) if _text(raw) else None
+        if values.get('supplier') is None and self.default_supplier:
+            values['supplier'] = self.default_supplier
+        # Blank optional cells keep the current value
+        return {field: value for field, value in values.items() if value is not None}
+
+    def run(self, rows):
+        rows = iter(rows)
+        try:
+            headers = next(rows)
+        except StopIteration:
+            raise InvalidFile('El archivo está vacío')
+        columns = _header_map(headers)
+
+        chunk = []
+        codes = set()
+        for line, row in enumerate(rows, start=2):
+            if not any(_text(value) for value in row):
+                continue
+            try:
+                values = self._parse(row, columns)
+            except RowError as e:
+                self.result.error(line, str(e))
+                continue
+            code = values.get('code')
+            if code and code in codes:
+                # The same code twice: write the first before reading the second
+                self._flush(chunk)
+                chunk, codes = [], set()
+            chunk.append((line, values))
+            if code:
+                codes.add(code)
+            if len(chunk) >= self.chunk_size:
+                self._flush(chunk)
+                chunk, codes = [], set()
+        self._flush(chunk)
+
+        if self.result.created or self.result.updated:
+            from apps.reports import kpis
+            kpis.bump(kpis.STOCK)
+        return self.result
+
+    def _flush(self, chunk):
+        from apps.reports import valuation
+
+        if not chunk:
+            return
+        existing = {
+            row['code']: row
+            for row in Product.objects.filter(
+                code__in=[values['code'] for _, values in chunk if values.get('code')]
+            ).values('id', 'code', 'stock', 'average_cost', *UPDATABLE)
+        }
+        now = timezone.now()
+        to_create, to_update, update_fields = [], [], set()
+        moved = {}
+        for line, values in chunk:
+            values = {ATTRIBUTES.get(field, field): value for field, value in values.items()}
+            current = existing.get(values.get('code'))
+            if current is None:
+                missing = [field for field in REQUIRED_NEW if ATTRIBUTES.get(field, field) not in values]
+                if missing:
+                    labels = ', '.join(str(Product._meta.get_field(field).verbose_name).lower() for field in missing)
+                    self.result.error(line, f'Producto nuevo sin: {labels}')
+                    continue
+                product = Product(**values)
+                product.average_cost = product.purchase_price
+                to_create.append((line, product))
+                moved[line] = None
+            else:
+                values.pop('stock', None)
+                pk = current.pop('id')
+                changed = [field for field, value in values.items() if field != 'code' and current[field] != value]
+                if not changed:
+                    self.result.unchanged += 1
+                    continue
+                # Every row is written with the same columns: start from the
+                # current values so blank cells keep them
+                update_fields.update(changed)
+                product = Product(pk=pk, **{**current, **values}, updated_at=now)
+                to_update.append((line, product))
+                if {'category_id', 'supplier_id'} & set(changed):
+                    # The stock's value moves to its new category / supplier
+                    moved[line] = (current['category_id'], current['supplier_id'], current['stock'], current['average_cost'])
+
+        new_codes = iter(Product.generate_codes(sum(1 for _, p in to_create if not p.code)))
+        for _, product in to_create:
+            if not product.code:
+                product.code = next(new_codes)
+        new_categories = {
+            line: product.category_id for line, product in to_create + to_update
+            if isinstance(product.category_id, NewCategory)
+        }
+
+        fields = sorted(update_fields | {'search_text', 'updated_at'})
+
+        def write(created, updated):
+            rows = created + updated
+            with transaction.atomic():
+                # Rolled back with the rows if they fail
+                categories = self._create_categories(
+                    (product, new_categories[line]) for line, product in rows if line in new_categories
+                )
+                names = {category.pk: category.name for category, _ in categories.values()}
+                for _, product in rows:
+                    product.search_text = search_text(
+                        product.name, product.code,
+                        names.get(product.category_id) or self.category_names.get(product.category_id, '')
+                    )
+                _insert([p for _, p in created])
+                _update([p for _, p in updated], fields)
+                valuation.changed([_value_move(moved[line], p) for line, p in rows if line in moved])
+            self._remember_categories(categories)
+            self.result.created += len(created)
+            self.result.updated += len(updated)
+
+        try:
+            write(to_create, to_update)
+        except IntegrityError:
+            # Find the offending rows: write each one in its own savepoint
+            rows = [([row], []) for row in to_create] + [([], [row]) for row in to_update]
+            for created, updated in rows:
+                try:
+                    write(created, updated)
+                except IntegrityError as e:
+                    self.result.error((created + updated)[0][0], f'No se pudo guardar: {e}')
+
+
+def _value_move(before, product):
+    """(before, after) valuation state of a written product; `before` is None for new ones"""
+    stock, cost = before[2:] if before else (product.stock, product.average_cost)
+    return before, (product.category_id, product.supplier_id, stock, cost)
+
+
+def _insert(products):
+    """
+    INSERT the products with one parameterized statement run through
+    executemany. bulk_create compiles every batch (under 50 rows on SQLite,
+    which caps query parameters) field by field, which costs far more in
+    Python than the writes themselves.
+    """
+    columns = [field for field in Product._meta.concrete_fields if not field.primary_key]
+    for field in columns:
+        if getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False):
+            # Fill created_at / updated_at like Model.save does
+            for product in products:
+                field.pre_save(product, True)
+    _execute(products, columns, lambda table, quote: (
+        f"INSERT INTO {table} ({', '.join(quote(c.column) for c in columns)}) "
+        f"VALUES ({', '.join(['%s'] * len(columns))})"
+    ))
+
+
+def _update(products, fields):
+    """UPDATE `fields` of each product by primary key, like _insert"""
+    columns = [Product._meta.get_field(field) for field in fields]
+    _execute(products, columns, lambda table, quote: (
+        f"UPDATE {table} SET {', '.join(f'{quote(c.column)} = %s' for c in columns)} "
+        f"WHERE {quote(Product._meta.pk.column)} = %s"
+    ), with_pk=True)
+
+
+def _execute(products, columns, sql, with_pk=False):
+    if not products:
+        return
+    # The real connection, not the thread-local proxy: this runs per cell
+    db = connections[DEFAULT_DB_ALIAS]
+    prepare = [(column.attname, column.get_db_prep_save) for column in columns]
+    rows = []
+    for product in products:
+        row = [prep(getattr(product, attname), db) for attname, prep in prepare]
+        if with_pk:
+            row.append(product.pk)
+        rows.append(row)
+    with db.cursor() as cursor:
+        cursor.executemany(sql(db.ops.quote_name(Product._meta.db_table), db.ops.quote_name), rows)
+
+
+def import_file(file, filename, **options):
+    """Import a CSV or XLSX file object; returns an ImportResult"""
+    return Importer(**options).run(read_rows(file, filename))
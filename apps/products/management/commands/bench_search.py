@@ -0,0 +1,87 @@
+"""
+Management command to benchmark product search
+"""
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Q
+from apps.products.models import Category, Product
+from apps.products import search
+from apps.suppliers.models import Supplier
+from decimal import Decimal
+import random
+import statistics
+import time
+
+WORDS = [
+    'Fertilizante', 'Urea', 'Semilla', 'Maíz', 'Arroz', 'Híbrido', 'Fungicida', 'Herbicida',
+    'Mochila', 'Fumigadora', 'Manguera', 'Válvula', 'Aspersor', 'Tijera', 'Podadora', 'Rastrillo',
+    'Lámpara', 'Bomba', 'Riego', 'Goteo', 'Abono', 'Orgánico', 'Foliar', 'Potásico', 'Nitrato',
+]
+CATEGORIES = ['Fertilizantes', 'Semillas', 'Herramientas', 'Riego', 'Agroquímicos', 'Equipos']
+
+
+class Command(BaseCommand):
+    help = 'Compare icontains and indexed product search at 1k, 10k and 100k products (data is rolled back)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='1000,10000,100000', help='Catalog sizes, comma separated')
+        parser.add_argument('--runs', type=int, default=20, help='Searches per query')
+
+    def handle(self, *args, **options):
+        sizes = sorted(int(s) for s in options['sizes'].split(',') if s.strip())
+        queries = ['lampara', 'semilla arroz', 'fumig', 'BS-000500', 'bomba riego goteo']
+        self.stdout.write(f'Database: {connection.vendor}')
+
+        with transaction.atomic():
+            categories = [Category.objects.create(name=f'__bench_search__ {name}') for name in CATEGORIES]
+            supplier = Supplier.objects.create(name='Bench', ruc='00000000002', phone='000000000', address='-')
+            rng = random.Random(7)
+            created = 0
+
+            self.stdout.write(f"{'products':>9} {'query':<20} {'icontains ms':>13} {'indexed ms':>11} {'hits':>6}")
+            for size in sizes:
+                self.create_products(rng, categories, supplier, created, size)
+                created = size
+                base = Product.objects.filter(category__in=categories, is_active=True)
+                for query in queries:
+                    legacy = lambda: list(self.legacy(base, query)[:20])
+                    indexed = lambda: list(search.search(base, query)[:20])
+                    hits = search.search(base, query).count()
+                    self.stdout.write(
+                        f'{size:>9} {query:<20} {self.p50(legacy, options["runs"]):>13.2f} '
+                        f'{self.p50(indexed, options["runs"]):>11.2f} {hits:>6}'
+                    )
+            transaction.set_rollback(True)
+
+    def legacy(self, queryset, query):
+        """The previous ProductListView search"""
+        return queryset.filter(
+            Q(name__icontains=query) | Q(code__icontains=query) | Q(category__name__icontains=query)
+        ).order_by('-created_at')
+
+    def p50(self, run, runs):
+        run()  # warm up
+        timings = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            run()
+            timings.append((time.perf_counter() - start) * 1000)
+        return statistics.median(timings)
+
+    def create_products(self, rng, categories, supplier, start, end):
+        products = []
+        for i in range(start, end):
+            category = rng.choice(categories)
+            product = Product(
+                code=f'BS-{i:06d}',
+                name=' '.join(rng.sample(WORDS, 3)) + f' {rng.randint(1, 50)}kg',
+                category=category,
+                presentation='Unidad',
+                purchase_price=Decimal('5.00'),
+                sale_price=Decimal('8.00'),
+                stock=10,
+                supplier=supplier,
+            )
+            product.search_text = product.build_search_text()
+            products.append(product)
+        Product.objects.bulk_create(products, batch_size=2000)
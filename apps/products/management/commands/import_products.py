@@ -0,0 +1,41 @@
+"""
+Management command to import products from a CSV or XLSX file
+"""
+from django.core.management.base import BaseCommand, CommandError
+import time
+from apps.products import importer
+
+
+class Command(BaseCommand):
+    help = 'Create or update products from a CSV/XLSX file, matched by code (see apps.products.importer)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV or XLSX file')
+        parser.add_argument('--supplier', help='Supplier (RUC or name) for rows without one')
+        parser.add_argument('--no-create-categories', action='store_true',
+                            help='Reject rows whose category does not exist instead of creating it')
+        parser.add_argument('--chunk-size', type=int, default=importer.CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        try:
+            with open(options['path'], 'rb') as file:
+                result = importer.import_file(
+                    file, options['path'],
+                    default_supplier=options['supplier'],
+                    create_categories=not options['no_create_categories'],
+                    chunk_size=options['chunk_size'],
+                )
+        except OSError as e:
+            raise CommandError(f'Cannot read {options["path"]}: {e}')
+        except (importer.InvalidFile, importer.RowError) as e:
+            raise CommandError(str(e))
+
+        for line, message in result.errors:
+            self.stdout.write(self.style.WARNING(f'  line {line}: {message}'))
+        if result.error_count > len(result.errors):
+            self.stdout.write(self.style.WARNING(f'  ... {result.error_count - len(result.errors)} more errors'))
+        self.stdout.write(self.style.SUCCESS(
+            f'✓ {result.created} created, {result.updated} updated, {result.unchanged} unchanged, {result.error_count} rows with errors, '
+            f'{result.categories_created} new categories in {time.perf_counter() - started:.1f}s'
+        ))
@@ -0,0 +1,70 @@
+# Generated by Django 5.0.1 on 2026-10-18 02:40
+
+import logging
+from django.conf import settings
+from django.db import migrations, models
+
+logger = logging.getLogger(__name__)
+
+
+def clamp_negative_stock(apps, schema_editor):
+    """
+    The old read-modify-write checkout could oversell and deleting a
+    reservation could over-release, leaving negative stock or reserved
+    stock that the constraints below would refuse. Set those to zero and
+    leave a kardex adjustment for each so the correction is traceable.
+    """
+    Product = apps.get_model('products', 'Product')
+    StockMovement = apps.get_model('purchases', 'StockMovement')
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split('.'))
+
+    products = list(Product.objects.filter(models.Q(stock__lt=0) | models.Q(reserved_stock__lt=0)))
+    if not products:
+        return
+    user = User.objects.filter(is_superuser=True).order_by('pk').first() or User.objects.order_by('pk').first()
+    movements = []
+    for product in products:
+        notes = []
+        if product.stock < 0:
+            notes.append(f'stock {product.stock} -> 0')
+        if product.reserved_stock < 0:
+            notes.append(f'stock reservado {product.reserved_stock} -> 0')
+        logger.warning('Product %s had negative stock: %s', product.pk, ', '.join(notes))
+        movements.append(StockMovement(
+            product_id=product.pk,
+            movement_type='ADJUSTMENT',
+            quantity=max(-product.stock, 0),
+            previous_stock=product.stock,
+            new_stock=max(product.stock, 0),
+            notes='Corrección de stock negativo: ' + ', '.join(notes),
+            created_by=user,
+        ))
+        product.stock = max(product.stock, 0)
+        product.reserved_stock = max(product.reserved_stock, 0)
+    Product.objects.bulk_update(products, ['stock', 'reserved_stock'])
+    if user is None:
+        logger.warning('No user to record the stock corrections in the kardex')
+    else:
+        StockMovement.objects.bulk_create(movements)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0003_product_reserved_stock'),
+        ('purchases', '0001_initial'),
+        ('suppliers', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(clamp_negative_stock, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='product',
+            constraint=models.CheckConstraint(check=models.Q(('stock__gte', 0)), name='product_stock_non_negative'),
+        ),
+        migrations.AddConstraint(
+            model_name='product',
+            constraint=models.CheckConstraint(check=models.Q(('reserved_stock__gte', 0)), name='product_reserved_stock_non_negative'),
+        ),
+    ]
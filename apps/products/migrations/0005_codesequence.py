@@ -0,0 +1,59 @@
+# Generated by Django 5.0.1 on 2026-10-18 02:49
+
+from django.db import migrations, models
+
+
+def seed_sequences(apps, schema_editor):
+    """Start every counter after the highest code already issued"""
+    Product = apps.get_model('products', 'Product')
+    Sale = apps.get_model('sales', 'Sale')
+    Purchase = apps.get_model('purchases', 'Purchase')
+    CodeSequence = apps.get_model('products', 'CodeSequence')
+    last = {}
+
+    def track(prefix, period, number):
+        if number.isdigit():
+            key = (prefix, period)
+            last[key] = max(last.get(key, 0), int(number))
+
+    for code in Product.objects.filter(code__startswith='P-').values_list('code', flat=True).iterator():
+        track('P', '', code[2:])
+    for model, prefix in ((Sale, 'V'), (Purchase, 'C')):
+        for code in model.objects.filter(code__startswith=f'{prefix}-').values_list('code', flat=True).iterator():
+            parts = code.split('-')
+            if len(parts) == 3:
+                track(prefix, parts[1], parts[2])
+    CodeSequence.objects.bulk_create([
+        CodeSequence(prefix=prefix, period=period, last_value=value)
+        for (prefix, period), value in last.items()
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0004_product_stock_constraints'),
+        ('sales', '0003_invoicejob'),
+        ('purchases', '0002_purchase_is_draft'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CodeSequence',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('prefix', models.CharField(max_length=10, verbose_name='Prefijo')),
+                ('period', models.CharField(blank=True, help_text='YYYYMMDD para códigos diarios, vacío para secuencias globales', max_length=8, verbose_name='Periodo')),
+                ('last_value', models.BigIntegerField(default=0, verbose_name='Último valor')),
+            ],
+            options={
+                'verbose_name': 'Secuencia de códigos',
+                'verbose_name_plural': 'Secuencias de códigos',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='codesequence',
+            constraint=models.UniqueConstraint(fields=('prefix', 'period'), name='codesequence_prefix_period'),
+        ),
+        migrations.RunPython(seed_sequences, migrations.RunPython.noop),
+    ]
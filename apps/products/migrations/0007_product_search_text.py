@@ -0,0 +1,37 @@
+# Generated by Django 5.0.1 on 2026-10-18 02:56
+
+from django.db import migrations, models
+from apps.products import search
+
+
+def fill_search_text(apps, schema_editor):
+    Product = apps.get_model('products', 'Product')
+    products = list(Product.objects.select_related('category'))
+    for product in products:
+        product.search_text = search.search_text(product.name, product.code, product.category.name)
+    Product.objects.bulk_update(products, ['search_text'], batch_size=500)
+
+
+def install_index(apps, schema_editor):
+    search.install(schema_editor.connection)
+
+
+def uninstall_index(apps, schema_editor):
+    search.uninstall(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0006_product_updated_at_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='search_text',
+            field=models.TextField(blank=True, editable=False, help_text='Nombre, código y categoría sin tildes (ver apps.products.search)', verbose_name='Texto de búsqueda'),
+        ),
+        migrations.RunPython(fill_search_text, migrations.RunPython.noop),
+        migrations.RunPython(install_index, uninstall_index),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 5.0.1 on 2026-10-18 03:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0007_product_search_text'),
+        ('suppliers', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='last_sold_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True, verbose_name='Última venta'),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='units_30d',
+            field=models.IntegerField(default=0, editable=False, verbose_name='Vendidos (30 días)'),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='units_7d',
+            field=models.IntegerField(default=0, editable=False, verbose_name='Vendidos (7 días)'),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='units_90d',
+            field=models.IntegerField(default=0, editable=False, verbose_name='Vendidos (90 días)'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['last_sold_at'], name='product_active_last_sold'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['units_30d'], name='product_active_units_30d'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['units_90d'], name='product_active_units_90d'),
+        ),
+    ]
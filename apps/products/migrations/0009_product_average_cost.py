@@ -0,0 +1,26 @@
+# Generated by Django 5.0.1 on 2026-10-18 03:41
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def start_from_purchase_price(apps, schema_editor):
+    # Stock on hand is valued at the list cost until a purchase moves it
+    Product = apps.get_model('products', 'Product')
+    Product.objects.update(average_cost=F('purchase_price'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0008_product_sales_velocity'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='average_cost',
+            field=models.DecimalField(decimal_places=4, default=0, editable=False, help_text='Costo promedio ponderado del stock; se recalcula con cada compra recibida', max_digits=14, verbose_name='Costo promedio'),
+        ),
+        migrations.RunPython(start_from_purchase_price, migrations.RunPython.noop),
+    ]
@@ -4,8 +4,6 @@ Products and Categories Models
 from django.db import models
 from django.core.validators import MinValueValidator
 from django.utils import timezone
-import random
-import string
 
 
 class Category(models.Model):
@@ -41,6 +39,19 @@ class Category(models.Model):
     
     def __str__(self):
         return self.name
+    
+    def save(self, *args, **kwargs):
+        renamed = self.pk and Category.objects.filter(pk=self.pk).exclude(name=self.name).exists()
+        super().save(*args, **kwargs)
+        if renamed:
+            # The category name is part of each product's search text, and
+            # POS terminals re-read renamed products through catalog sync
+            now = timezone.now()
+            products = list(self.products.select_related('category'))
+            for product in products:
+                product.search_text = product.build_search_text()
+                product.updated_at = now
+            Product.objects.bulk_update(products, ['search_text', 'updated_at'], batch_size=500)
 
 
 class Product(models.Model):
@@ -90,6 +101,15 @@ class Product(models.Model):
         verbose_name='Precio de venta'
     )
     
+    average_cost = models.DecimalField(
+        max_digits=14,
+        decimal_places=4,
+        default=0,
+        editable=False,
+        verbose_name='Costo promedio',
+        help_text='Costo promedio ponderado del stock; se recalcula con cada compra recibida'
+    )
+    
     stock = models.IntegerField(
         default=0,
         validators=[MinValueValidator(0)],
@@ -133,6 +153,39 @@ class Product(models.Model):
         verbose_name='Activo'
     )
     
+    search_text = models.TextField(
+        blank=True,
+        editable=False,
+        verbose_name='Texto de búsqueda',
+        help_text='Nombre, código y categoría sin tildes (ver apps.products.search)'
+    )
+    
+    # Sales velocity: updated at checkout, corrected nightly (apps.reports.velocity)
+    last_sold_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        editable=False,
+        verbose_name='Última venta'
+    )
+    
+    units_7d = models.IntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Vendidos (7 días)'
+    )
+    
+    units_30d = models.IntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Vendidos (30 días)'
+    )
+    
+    units_90d = models.IntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Vendidos (90 días)'
+    )
+    
     created_at = models.DateTimeField(
         auto_now_add=True,
         verbose_name='Fecha de creación'
@@ -147,22 +200,58 @@ class Product(models.Model):
         verbose_name = 'Producto'
         verbose_name_plural = 'Productos'
         ordering = ['-created_at']
+        constraints = [
+            models.CheckConstraint(check=models.Q(stock__gte=0), name='product_stock_non_negative'),
+            models.CheckConstraint(check=models.Q(reserved_stock__gte=0), name='product_reserved_stock_non_negative'),
+        ]
+        indexes = [
+            # Catalog sync reads changes in (updated_at, id) order
+            models.Index(fields=['updated_at', 'id'], name='product_updated_at_id'),
+            # Dead stock, top sellers and slow movers (active products only)
+            models.Index(fields=['last_sold_at'], condition=models.Q(is_active=True), name='product_active_last_sold'),
+            models.Index(fields=['units_30d'], condition=models.Q(is_active=True), name='product_active_units_30d'),
+            models.Index(fields=['units_90d'], condition=models.Q(is_active=True), name='product_active_units_90d'),
+        ]
     
     def __str__(self):
         return f"{self.code} - {self.name} ({self.presentation})"
     
     def save(self, *args, **kwargs):
+        from django.db import transaction
+        from apps.reports import valuation
+
         if not self.code:
             self.code = self.generate_code()
-        super().save(*args, **kwargs)
+        self.search_text = self.build_search_text()
+        if self._state.adding and not self.average_cost:
+            self.average_cost = self.purchase_price or 0
+        # Move the inventory value by whatever changed in stock, cost,
+        # category or supplier, read back so update_fields is honoured
+        tracked = ('category_id', 'supplier_id', 'stock', 'average_cost')
+        with transaction.atomic():
+            before = None
+            if not self._state.adding:
+                before = Product.objects.select_for_update().filter(pk=self.pk).values_list(*tracked).first()
+            super().save(*args, **kwargs)
+            after = Product.objects.filter(pk=self.pk).values_list(*tracked).first()
+            if before != after:
+                valuation.changed([(before, after)])
+    
+    def build_search_text(self):
+        """Normalized text indexed for search; set it yourself when using bulk_create"""
+        from .search import search_text
+        return search_text(self.name, self.code, self.category.name if self.category_id else '')
     
     @staticmethod
     def generate_code():
-        """Generate unique product code"""
-        while True:
-            code = 'P-' + ''.join(random.choices(string.digits, k=6))
-            if not Product.objects.filter(code=code).exists():
-                return code
+        """Generate unique product code: P-XXXXXX"""
+        return Product.generate_codes(1)[0]
+    
+    @staticmethod
+    def generate_codes(count):
+        """Reserve `count` sequential product codes"""
+        from .sequences import allocate
+        return [f'P-{n:06d}' for n in allocate('P', '', count)]
     
     @property
     def profit_margin(self):
@@ -196,3 +285,34 @@ class Product(models.Model):
         """Stock disponible (stock - reservado)"""
         avail = self.stock - self.reserved_stock
         return avail if avail > 0 else 0
+
+
+class CodeSequence(models.Model):
+    """Counter behind the human-readable codes (P-, V-YYYYMMDD-, C-YYYYMMDD-)"""
+
+    prefix = models.CharField(
+        max_length=10,
+        verbose_name='Prefijo'
+    )
+
+    period = models.CharField(
+        max_length=8,
+        blank=True,
+        verbose_name='Periodo',
+        help_text='YYYYMMDD para códigos diarios, vacío para secuencias globales'
+    )
+
+    last_value = models.BigIntegerField(
+        default=0,
+        verbose_name='Último valor'
+    )
+
+    class Meta:
+        verbose_name = 'Secuencia de códigos'
+        verbose_name_plural = 'Secuencias de códigos'
+        constraints = [
+            models.UniqueConstraint(fields=['prefix', 'period'], name='codesequence_prefix_period'),
+        ]
+
+    def __str__(self):
+        return f"{self.prefix}{'-' + self.period if self.period else ''}: {self.last_value}"
@@ -0,0 +1,149 @@
+"""
+Product search backend
+
+Every product keeps `search_text`: name, code and category name, lowercased
+and stripped of accents, so "lampara" finds "Lámpara". Searches run against
+an index on that column instead of OR-ed icontains scans:
+
+- PostgreSQL: pg_trgm GIN index; every token is a LIKE '%tok%' the index
+  serves, ranked by trigram similarity.
+- SQLite: external-content FTS5 table kept in sync by triggers; tokens are
+  prefix queries ("tok"*).
+- Anything else: LIKE on search_text.
+
+A query equal to a product code short-circuits to that product. Results are
+ranked: exact code, then name starting with the query, then the rest.
+"""
+from django.db import connection
+from django.db.models import Case, When, Value, IntegerField
+from django.db.models.expressions import RawSQL
+import re
+import unicodedata
+
+FTS_TABLE = 'products_product_fts'
+TRGM_INDEX = 'product_search_text_trgm'
+
+
+def normalize(text):
+    """Lowercase, accent-free text (must match Catalog.normalize in catalog.js)"""
+    text = unicodedata.normalize('NFD', text or '')
+    return ''.join(ch for ch in text if not unicodedata.combining(ch)).lower()
+
+
+def tokenize(text):
+    return [t for t in re.split(r'[^0-9a-z]+', normalize(text)) if t]
+
+
+def search_text(name, code, category_name):
+    return ' '.join(tokenize(f'{name} {code} {category_name}'))
+
+
+def search(queryset, query):
+    """Filter and rank a Product queryset by `query`"""
+    query = (query or '').strip()
+    tokens = tokenize(query)
+    if not tokens:
+        return queryset
+
+    code = query.upper()
+    exact = queryset.filter(code__in={query, code})
+    if exact.exists():
+        return exact
+
+    vendor = connection.vendor
+    if vendor == 'postgresql':
+        from django.contrib.postgres.search import TrigramSimilarity
+        for token in tokens:
+            queryset = queryset.filter(search_text__contains=token)
+        queryset = queryset.annotate(search_similarity=TrigramSimilarity('search_text', ' '.join(tokens)))
+        secondary = ['-search_similarity', 'name']
+    elif vendor == 'sqlite' and fts_available():
+        match = ' '.join(f'"{token}"*' for token in tokens)
+        queryset = queryset.filter(
+            id__in=RawSQL(f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s', [match])
+        )
+        secondary = ['name']
+    else:
+        for token in tokens:
+            queryset = queryset.filter(search_text__contains=token)
+        secondary = ['name']
+
+    prefix = ' '.join(tokens)
+    return queryset.annotate(
+        search_rank=Case(
+            When(search_text__startswith=prefix, then=Value(1)),
+            default=Value(2),
+            output_field=IntegerField(),
+        )
+    ).order_by('search_rank', *secondary)
+
+
+_fts_available = None
+
+
+def fts_available():
+    global _fts_available
+    if _fts_available is None:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", [FTS_TABLE])
+            _fts_available = cursor.fetchone() is not None
+    return _fts_available
+
+
+def install(conn=None):
+    """
+    Create the search index for the current database.
+
+    Idempotent: called from the migration and after every migrate, because
+    SQLite rebuilds a table (dropping its triggers) whenever a migration
+    alters it.
+    """
+    global _fts_available
+    conn = conn or connection
+    with conn.cursor() as cursor:
+        if conn.vendor == 'postgresql':
+            cursor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+            cursor.execute(
+                f'CREATE INDEX IF NOT EXISTS {TRGM_INDEX} ON products_product '
+                f'USING gin (search_text gin_trgm_ops)'
+            )
+        elif conn.vendor == 'sqlite':
+            cursor.execute(
+                "SELECT count(*) FROM sqlite_master WHERE type = 'trigger' AND name LIKE 'products_product_fts_%'"
+            )
+            if cursor.fetchone()[0] == 3:
+                return
+            cursor.execute(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+                f"search_text, content='products_product', content_rowid='id', "
+                f"tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+            )
+            cursor.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON products_product BEGIN
+                    INSERT INTO {FTS_TABLE}(rowid, search_text) VALUES (new.id, new.search_text);
+                END""")
+            cursor.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON products_product BEGIN
+                    INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, search_text) VALUES ('delete', old.id, old.search_text);
+                END""")
+            cursor.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF search_text ON products_product BEGIN
+                    INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, search_text) VALUES ('delete', old.id, old.search_text);
+                    INSERT INTO {FTS_TABLE}(rowid, search_text) VALUES (new.id, new.search_text);
+                END""")
+            # Triggers were missing, so the index may be stale
+            cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+            _fts_available = True
+
+
+def uninstall(conn=None):
+    global _fts_available
+    conn = conn or connection
+    with conn.cursor() as cursor:
+        if conn.vendor == 'postgresql':
+            cursor.execute(f'DROP INDEX IF EXISTS {TRGM_INDEX}')
+        elif conn.vendor == 'sqlite':
+            for suffix in ('ai', 'ad', 'au'):
+                cursor.execute(f'DROP TRIGGER IF EXISTS {FTS_TABLE}_{suffix}')
+            cursor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+    _fts_available = None
@@ -0,0 +1,81 @@
+"""
+Sequential code allocator
+
+Codes are handed out from per-prefix, per-period counters stored in
+CodeSequence. Each process reserves a block of values with a single upsert
+and serves codes from memory until the block runs out, so allocating a
+code never probes for uniqueness. Bulk paths reserve N values in one
+statement.
+"""
+from django.db import connection, transaction
+import threading
+
+BLOCK_SIZE = 20
+
+_blocks = {}
+_lock = threading.Lock()
+
+
+def _reserve(prefix, period, count):
+    """Advance the counter by `count` in one statement and return the first reserved value"""
+    from .models import CodeSequence
+    table = connection.ops.quote_name(CodeSequence._meta.db_table)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {table} (prefix, period, last_value) VALUES (%s, %s, %s) '
+            f'ON CONFLICT (prefix, period) DO UPDATE '
+            f'SET last_value = {table}.last_value + excluded.last_value '
+            f'RETURNING last_value',
+            [prefix, period, count]
+        )
+        last_value = cursor.fetchone()[0]
+    return last_value - count + 1
+
+
+def _publish(key, start, end):
+    with _lock:
+        block = _blocks.get(key)
+        if block is None or block[0] > block[1]:
+            _blocks[key] = [start, end]
+
+
+def allocate(prefix, period='', count=1):
+    """
+    Return `count` unused sequence values for prefix/period.
+
+    A block reserved inside a transaction is only cached for reuse after
+    that transaction commits; if it rolls back the counter rolls back too,
+    and the leftover values must not be handed out again.
+    """
+    key = (prefix, period)
+    values = []
+    with _lock:
+        for stale in [k for k in _blocks if k[0] == prefix and k != key]:
+            del _blocks[stale]
+        block = _blocks.get(key)
+        if block is not None:
+            take = min(count, block[1] - block[0] + 1)
+            values.extend(range(block[0], block[0] + take))
+            block[0] += take
+    missing = count - len(values)
+    if missing:
+        size = max(missing, BLOCK_SIZE)
+        start = _reserve(prefix, period, size)
+        values.extend(range(start, start + missing))
+        if size > missing:
+            rest = (key, start + missing, start + size - 1)
+            if connection.in_atomic_block:
+                transaction.on_commit(lambda: _publish(*rest))
+            else:
+                _publish(*rest)
+    return values
+
+
+def next_value(prefix, period=''):
+    return allocate(prefix, period, 1)[0]
+
+
+def reset_cache():
+    """Forget cached blocks (e.g. after a counter is reseeded)"""
+    with _lock:
+        _blocks.clear()
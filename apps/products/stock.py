@@ -0,0 +1,105 @@
+"""
+Atomic stock operations
+
+Stock and reserved stock are never read-modified-written from Python: every
+change is a single guarded UPDATE that only matches when enough stock is
+available, backed by the non-negative check constraints on Product.
+"""
+from django.db import connection
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.utils import timezone
+from .models import Product
+
+
+class InsufficientStock(Exception):
+    """Not enough available stock for the requested quantity"""
+
+    def __init__(self, product_id, available):
+        self.product_id = product_id
+        self.available = available
+        super().__init__(f'Disponible: {available}')
+
+
+def available_stock(product_id):
+    """Current available stock (stock - reserved) read from the database"""
+    row = Product.objects.filter(pk=product_id).values('stock', 'reserved_stock').first()
+    if row is None:
+        return 0
+    return max(row['stock'] - row['reserved_stock'], 0)
+
+
+def reserve_stock(product_id, quantity):
+    """Move `quantity` units from available to reserved, or raise InsufficientStock"""
+    updated = Product.objects.filter(
+        pk=product_id,
+        stock__gte=F('reserved_stock') + quantity
+    ).update(
+        reserved_stock=F('reserved_stock') + quantity,
+        updated_at=timezone.now()
+    )
+    if not updated:
+        raise InsufficientStock(product_id, available_stock(product_id))
+
+
+def release_reserved_stock(product_id, quantity):
+    """Return `quantity` reserved units to available stock"""
+    Product.objects.filter(pk=product_id).update(
+        reserved_stock=Greatest(F('reserved_stock') - quantity, 0),
+        updated_at=timezone.now()
+    )
+
+
+def lock_products(product_ids):
+    """
+    Lock product rows in primary key order and return them as a dict.
+
+    Taking row locks in a deterministic order keeps two checkouts touching
+    the same products from deadlocking each other on PostgreSQL. SQLite
+    ignores FOR UPDATE and serializes writers on its own.
+    """
+    return {
+        p.pk: p
+        for p in Product.objects.select_for_update().filter(pk__in=list(product_ids)).order_by('pk')
+    }
+
+
+def take_stock(quantities, released, now, add_to=(), set_values=None):
+    """
+    Take {product_id: units} out of stock and {product_id: units} out of
+    reserved stock, adding the units to the `add_to` counter columns and
+    setting `set_values` too; returns the number of products updated.
+
+    A product is only updated while it still has enough available stock.
+    The quantities go in a VALUES list joined to the UPDATE, so one
+    statement covers the whole cart without the ORM building a CASE WHEN
+    per product and column, which costs more than the query on big carts.
+    """
+    if not quantities:
+        return 0
+    values = {'updated_at': now, **(set_values or {})}
+    table = connection.ops.quote_name(Product._meta.db_table)
+    pk = connection.ops.quote_name(Product._meta.pk.column)
+
+    def column(name):
+        return connection.ops.quote_name(Product._meta.get_field(name).column)
+
+    # VALUES columns are column1..3 (id, units, released) on both SQLite and
+    # PostgreSQL; a WITH v(...) list would hide the row count from SQLite
+    assignments = [
+        f'{column("stock")} = {table}.{column("stock")} - v.column2',
+        f'{column("reserved_stock")} = {table}.{column("reserved_stock")} - v.column3',
+        *[f'{column(name)} = {table}.{column(name)} + v.column2' for name in add_to],
+        *[f'{column(name)} = %s' for name in values],
+    ]
+    params = [Product._meta.get_field(name).get_db_prep_value(value, connection) for name, value in values.items()]
+    params += [pk_value for pk, units in quantities.items() for pk_value in (pk, units, released.get(pk, 0))]
+    sql = (
+        f'UPDATE {table} SET {", ".join(assignments)} '
+        f'FROM (VALUES {", ".join(["(%s, %s, %s)"] * len(quantities))}) AS v '
+        f'WHERE {table}.{pk} = v.column1 '
+        f'AND {table}.{column("stock")} >= {table}.{column("reserved_stock")} + v.column2 - v.column3'
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.rowcount
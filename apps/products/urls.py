@@ -9,6 +9,7 @@ app_name = 'products'
 urlpatterns = [
     path('', views.ProductListView.as_view(), name='product_list'),
     path('create/', views.ProductCreateView.as_view(), name='product_create'),
+    path('import/', views.ProductImportView.as_view(), name='product_import'),
     path('<int:pk>/edit/', views.ProductUpdateView.as_view(), name='product_edit'),
     path('<int:pk>/delete/', views.ProductDeleteView.as_view(), name='product_delete'),
     path('categories/create/', views.CategoryCreateView.as_view(), name='category_create'),
@@ -2,11 +2,20 @@
 Fix missing import in products views
 """
 from django.contrib.auth.mixins import LoginRequiredMixin
-from django.views.generic import ListView, CreateView, UpdateView, DeleteView
+from django.views.generic import ListView, CreateView, UpdateView, DeleteView, FormView
 from django.urls import reverse_lazy
-from django.db.models import Q, F
+from django.db.models import F
 from django.http import HttpResponseRedirect
+from django import forms
 from .models import Product, Category
+from . import importer, search
+from apps.reports import velocity
+
+MOVEMENT_FILTERS = {
+    'dead': lambda qs: velocity.dead_stock(qs).order_by('last_sold_at', 'name'),
+    'slow': velocity.slow_movers,
+    'top': velocity.top_sellers,
+}
 
 
 class ProductListView(LoginRequiredMixin, ListView):
@@ -18,25 +27,29 @@ class ProductListView(LoginRequiredMixin, ListView):
     def get_queryset(self):
         queryset = Product.objects.filter(is_active=True).select_related('category', 'supplier')
         
-        # Search
-        search = self.request.GET.get('search')
-        if search:
-            queryset = queryset.filter(
-                Q(name__icontains=search) |
-                Q(code__icontains=search) |
-                Q(category__name__icontains=search)
-            )
-        
         # Category filter
         category = self.request.GET.get('category')
         if category:
             queryset = queryset.filter(category_id=category)
         
-        return queryset.order_by('-created_at')
+        # Search (ranked, see apps.products.search)
+        query = self.request.GET.get('search')
+        if query:
+            queryset = search.search(queryset, query)
+        
+        # Sales velocity: dead stock, slow movers, top sellers (their order
+        # replaces the search ranking)
+        movement = self.request.GET.get('movement')
+        if movement in MOVEMENT_FILTERS:
+            return MOVEMENT_FILTERS[movement](queryset)
+        
+        return queryset if query else queryset.order_by('-created_at')
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context['categories'] = Category.objects.all()
+        movement = self.request.GET.get('movement')
+        context['movement'] = movement if movement in MOVEMENT_FILTERS else ''
         context['low_stock_count'] = Product.objects.annotate(available=F('stock')-F('reserved_stock')).filter(available__lte=F('min_stock')).count()
         return context
 
@@ -91,3 +104,41 @@ class CategoryCreateView(LoginRequiredMixin, CreateView):
         context = super().get_context_data(**kwargs)
         context['title'] = 'Nueva Categoría'
         return context
+
+
+class ProductImportForm(forms.Form):
+    file = forms.FileField(
+        label='Archivo CSV o XLSX',
+        help_text='Columnas: codigo, nombre, categoria, proveedor (RUC o nombre), presentacion, '
+                  'precio_compra, precio_venta, stock, stock_minimo, vencimiento, activo'
+    )
+    supplier = forms.ModelChoiceField(
+        queryset=None,
+        required=False,
+        label='Proveedor por defecto',
+        help_text='Para filas sin proveedor'
+    )
+
+    def __init__(self, *args, **kwargs):
+        from apps.suppliers.models import Supplier
+        super().__init__(*args, **kwargs)
+        self.fields['supplier'].queryset = Supplier.objects.filter(is_active=True)
+
+
+class ProductImportView(LoginRequiredMixin, FormView):
+    """Create or update products in bulk from a supplier catalog file"""
+    form_class = ProductImportForm
+    template_name = 'products/product_import.html'
+
+    def form_valid(self, form):
+        upload = form.cleaned_data['file']
+        supplier = form.cleaned_data['supplier']
+        try:
+            result = importer.import_file(
+                upload.file, upload.name,
+                default_supplier=supplier.ruc if supplier else None,
+            )
+        except importer.InvalidFile as e:
+            form.add_error('file', str(e))
+            return self.form_invalid(form)
+        return self.render_to_response(self.get_context_data(form=self.form_class(), result=result))
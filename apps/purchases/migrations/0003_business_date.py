@@ -0,0 +1,56 @@
+# Generated by Django 5.0.1 on 2026-10-18 03:02
+
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+def fill_business_date(model_names):
+    def fill(apps, schema_editor):
+        for model_name in model_names:
+            Model = apps.get_model('purchases', model_name)
+            rows = []
+            for row in Model.objects.only('id', 'created_at').iterator(chunk_size=2000):
+                row.business_date = django.utils.timezone.localdate(row.created_at)
+                rows.append(row)
+                if len(rows) == 2000:
+                    Model.objects.bulk_update(rows, ['business_date'])
+                    rows = []
+            Model.objects.bulk_update(rows, ['business_date'])
+    return fill
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0007_product_search_text'),
+        ('purchases', '0002_purchase_is_draft'),
+        ('suppliers', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='purchase',
+            name='business_date',
+            field=models.DateField(default=django.utils.timezone.localdate, editable=False, help_text='Día local (TIME_ZONE) de la compra; filtrar reportes por este campo', verbose_name='Fecha contable'),
+        ),
+        migrations.AddField(
+            model_name='stockmovement',
+            name='business_date',
+            field=models.DateField(default=django.utils.timezone.localdate, editable=False, help_text='Día local (TIME_ZONE) del movimiento; filtrar el kardex por este campo', verbose_name='Fecha contable'),
+        ),
+        migrations.RunPython(fill_business_date(['Purchase', 'StockMovement']), migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='purchase',
+            index=models.Index(fields=['business_date'], name='purchase_business_date'),
+        ),
+        migrations.AddIndex(
+            model_name='stockmovement',
+            index=models.Index(fields=['business_date'], name='stockmovement_business_date'),
+        ),
+        migrations.AddIndex(
+            model_name='stockmovement',
+            index=models.Index(fields=['product', 'business_date'], name='stockmovement_product_date'),
+        ),
+    ]
@@ -1,12 +1,11 @@
 """
 Purchases and Stock Movement Models
 """
-from django.db import models
+from django.db import models, transaction
 from django.core.validators import MinValueValidator
 from django.conf import settings
+from django.utils import timezone
 from datetime import datetime
-import random
-import string
 
 
 class Purchase(models.Model):
@@ -67,6 +66,13 @@ class Purchase(models.Model):
         verbose_name='Fecha de compra'
     )
     
+    business_date = models.DateField(
+        default=timezone.localdate,
+        editable=False,
+        verbose_name='Fecha contable',
+        help_text='Día local (TIME_ZONE) de la compra; filtrar reportes por este campo'
+    )
+    
     updated_at = models.DateTimeField(
         auto_now=True,
         verbose_name='Última actualización'
@@ -76,24 +82,37 @@ class Purchase(models.Model):
         verbose_name = 'Compra'
         verbose_name_plural = 'Compras'
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['business_date'], name='purchase_business_date'),
+        ]
     
     def __str__(self):
         return f"{self.code} - {self.supplier.name}"
     
     def save(self, *args, **kwargs):
+        from .services import apply_receipt
         if not self.code:
             self.code = self.generate_code()
-        super().save(*args, **kwargs)
+        with transaction.atomic():
+            # Receive the purchase once, when it stops being a draft
+            was_draft = True
+            if self.pk:
+                was_draft = Purchase.objects.filter(pk=self.pk, is_draft=True).exists()
+            super().save(*args, **kwargs)
+            if was_draft and not self.is_draft:
+                apply_receipt(self, self.created_by)
     
     @staticmethod
     def generate_code():
         """Generate unique purchase code: C-YYYYMMDD-XXXX"""
+        return Purchase.generate_codes(1)[0]
+    
+    @staticmethod
+    def generate_codes(count):
+        """Reserve `count` sequential purchase codes for today"""
+        from apps.products.sequences import allocate
         date_str = datetime.now().strftime('%Y%m%d')
-        while True:
-            random_str = ''.join(random.choices(string.digits, k=4))
-            code = f'C-{date_str}-{random_str}'
-            if not Purchase.objects.filter(code=code).exists():
-                return code
+        return [f'C-{date_str}-{n:04d}' for n in allocate('C', date_str, count)]
     
     @property
     def items_count(self):
@@ -145,22 +164,12 @@ class PurchaseItem(models.Model):
         return f"{self.product.name} x {self.quantity}"
     
     def save(self, *args, **kwargs):
+        from .services import stock_in
         self.subtotal = self.quantity * self.unit_price
-        super().save(*args, **kwargs)
-        if not self.purchase.is_draft:
-            product = self.product
-            previous = product.stock
-            product.stock = previous + self.quantity
-            product.save()
-            StockMovement.objects.create(
-                product=product,
-                movement_type=StockMovement.MovementType.PURCHASE,
-                quantity=self.quantity,
-                previous_stock=previous,
-                new_stock=product.stock,
-                reference_id=self.purchase_id,
-                created_by=self.purchase.created_by,
-            )
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if not self.purchase.is_draft:
+                stock_in(self.purchase, [(self.product_id, self.quantity, self.subtotal)], self.purchase.created_by)
 
 
 class StockMovement(models.Model):
@@ -221,10 +230,21 @@ class StockMovement(models.Model):
         verbose_name='Fecha de movimiento'
     )
     
+    business_date = models.DateField(
+        default=timezone.localdate,
+        editable=False,
+        verbose_name='Fecha contable',
+        help_text='Día local (TIME_ZONE) del movimiento; filtrar el kardex por este campo'
+    )
+    
     class Meta:
         verbose_name = 'Movimiento de stock'
         verbose_name_plural = 'Movimientos de stock (Kardex)'
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['business_date'], name='stockmovement_business_date'),
+            models.Index(fields=['product', 'business_date'], name='stockmovement_product_date'),
+        ]
     
     def __str__(self):
         return f"{self.product.code} - {self.get_movement_type_display()} ({self.quantity:+d})"
@@ -0,0 +1,155 @@
+"""
+Receiving - set-based purchase processing
+"""
+from django.db import transaction, models
+from django.db.models import Case, When, F, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from decimal import Decimal, InvalidOperation
+from .models import Purchase, PurchaseItem, StockMovement
+from apps.products.models import Product
+from apps.products.stock import lock_products
+from apps.reports import kpis, rollups, valuation
+
+MAX_LINES = 2000
+
+
+class ReceivingError(Exception):
+    """Purchase cannot be received; nothing is written"""
+
+
+def parse_lines(items):
+    """Normalize invoice lines into [(product_id, quantity, unit_price)]"""
+    lines = []
+    for item in items:
+        try:
+            product_id = int(item['product_id'])
+            qty = int(item['quantity'])
+            price = Decimal(str(item['unit_price']))
+        except (KeyError, TypeError, ValueError, InvalidOperation):
+            raise ReceivingError('Línea inválida')
+        if qty <= 0 or price < 0:
+            raise ReceivingError('Cantidad o precio inválido')
+        lines.append((product_id, qty, price))
+    if not lines:
+        raise ReceivingError('La compra no tiene productos')
+    if len(lines) > MAX_LINES:
+        raise ReceivingError(f'Máximo {MAX_LINES} líneas por compra')
+    return lines
+
+
+def stock_in(purchase, items, user):
+    """
+    Add received units to stock: `items` are (product_id, quantity, subtotal).
+
+    Quantities are summed per product, the rows are locked in primary key
+    order and raised with a single UPDATE, which also moves their average
+    cost; the kardex rows are bulk inserted and the units added to the
+    product rollups, so the number of queries does not depend on the number
+    of lines.
+    """
+    received = {}
+    for product_id, qty, subtotal in items:
+        total_qty, total_cost = received.get(product_id, (0, Decimal(0)))
+        received[product_id] = (total_qty + qty, total_cost + subtotal)
+    if not received:
+        return
+
+    products = lock_products(received)
+    missing = set(received) - set(products)
+    if missing:
+        raise ReceivingError(f"Producto no encontrado: {', '.join(str(pk) for pk in sorted(missing))}")
+
+    Product.objects.filter(pk__in=list(received)).update(
+        stock=Case(
+            *[When(pk=pk, then=F('stock') + qty) for pk, (qty, _) in received.items()],
+            default=F('stock'),
+            output_field=models.IntegerField(),
+        ),
+        updated_at=timezone.now(),
+        **valuation.received(products, received),
+    )
+    StockMovement.objects.bulk_create([
+        StockMovement(
+            product_id=product_id,
+            movement_type=StockMovement.MovementType.PURCHASE,
+            quantity=qty,
+            previous_stock=products[product_id].stock,
+            new_stock=products[product_id].stock + qty,
+            reference_id=purchase.pk,
+            created_by=user,
+        )
+        for product_id, (qty, _) in received.items()
+    ], batch_size=1000)
+
+    rollups.record_purchase_items(purchase, [
+        (product_id, qty, cost) for product_id, (qty, cost) in received.items()
+    ])
+    kpis.stock_changed(
+        (products[pk].available_stock, products[pk].available_stock + qty, products[pk].min_stock)
+        for pk, (qty, _) in received.items()
+    )
+
+
+def apply_receipt(purchase, user):
+    """Count a purchase that stopped being a draft and put all its lines into stock"""
+    rollups.record_purchase(purchase)
+    stock_in(purchase, purchase.items.values_list('product_id', 'quantity', 'subtotal'), user)
+
+
+def receive_purchase(user, data):
+    """
+    Register and receive a whole supplier invoice from a JSON payload:
+    {supplier_id, invoice_number, notes, items: [{product_id, quantity, unit_price}]}.
+
+    The lines are bulk inserted on a draft which is then confirmed, all in
+    one transaction.
+    """
+    from apps.suppliers.models import Supplier
+
+    lines = parse_lines(data.get('items') or [])
+    invoice_number = (data.get('invoice_number') or '').strip()
+    if not invoice_number:
+        raise ReceivingError('Número de factura requerido')
+    with transaction.atomic():
+        supplier = Supplier.objects.filter(pk=data.get('supplier_id'), is_active=True).first()
+        if supplier is None:
+            raise ReceivingError('Proveedor no encontrado')
+
+        purchase = Purchase.objects.create(
+            supplier=supplier,
+            invoice_number=invoice_number,
+            total=sum((qty * price for _, qty, price in lines), Decimal(0)),
+            notes=(data.get('notes') or '').strip(),
+            created_by=user,
+            is_draft=True,
+        )
+        PurchaseItem.objects.bulk_create([
+            PurchaseItem(purchase=purchase, product_id=product_id, quantity=qty,
+                         unit_price=price, subtotal=qty * price)
+            for product_id, qty, price in lines
+        ], batch_size=1000)
+        return confirm_purchase(purchase.pk, user)
+
+
+def confirm_purchase(purchase_id, user):
+    """
+    Receive a draft purchase: its total is recomputed from its lines and
+    every line goes into stock, the kardex and the rollups.
+    """
+    with transaction.atomic():
+        purchase = Purchase.objects.select_for_update().filter(pk=purchase_id).first()
+        if purchase is None:
+            raise ReceivingError('Compra no encontrada')
+        if not purchase.is_draft:
+            raise ReceivingError('La compra ya fue recibida')
+        total = purchase.items.aggregate(
+            amount=Coalesce(Sum('subtotal'), Decimal(0)), lines=models.Count('id')
+        )
+        if not total['lines']:
+            raise ReceivingError('La compra no tiene productos')
+        now = timezone.now()
+        Purchase.objects.filter(pk=purchase.pk).update(total=total['amount'], is_draft=False, updated_at=now)
+        purchase.total, purchase.is_draft, purchase.updated_at = total['amount'], False, now
+        apply_receipt(purchase, user)
+    return purchase
@@ -6,4 +6,6 @@ app_name = 'purchases'
 urlpatterns = [
     path('', views.PurchaseListView.as_view(), name='purchase_list'),
     path('create/', views.PurchaseCreateView.as_view(), name='purchase_create'),
+    path('receive/', views.ReceivePurchaseView.as_view(), name='receive_purchase'),
+    path('<int:pk>/confirm/', views.ConfirmPurchaseView.as_view(), name='confirm_purchase'),
 ]
@@ -1,10 +1,15 @@
 """
 Purchase Views
 """
+from django.contrib import messages
 from django.contrib.auth.mixins import LoginRequiredMixin
+from django.http import JsonResponse
+from django.shortcuts import redirect
+from django.views import View
 from django.views.generic import ListView, CreateView
 from django.urls import reverse_lazy
 from .models import Purchase
+from .services import receive_purchase, confirm_purchase, ReceivingError
 
 
 class PurchaseListView(LoginRequiredMixin, ListView):
@@ -14,6 +19,9 @@ class PurchaseListView(LoginRequiredMixin, ListView):
     paginate_by = 20
     ordering = ['-created_at']
 
+    def get_queryset(self):
+        return super().get_queryset().select_related('supplier')
+
 
 class PurchaseCreateView(LoginRequiredMixin, CreateView):
     model = Purchase
@@ -55,3 +63,36 @@ class PurchaseItemCreateView(LoginRequiredMixin, CreateView):
         
     def get_success_url(self):
         return reverse_lazy('purchases:purchase_detail', kwargs={'pk': self.kwargs['pk']})
+
+
+class ReceivePurchaseView(LoginRequiredMixin, View):
+    """Register and receive a whole supplier invoice in one request (JSON)"""
+
+    def post(self, request):
+        import json
+        try:
+            data = json.loads(request.body)
+        except ValueError:
+            return JsonResponse({'success': False, 'error': 'Datos inválidos'}, status=400)
+        try:
+            purchase = receive_purchase(request.user, data)
+        except ReceivingError as e:
+            return JsonResponse({'success': False, 'error': str(e)}, status=400)
+        return JsonResponse({
+            'success': True,
+            'purchase_id': purchase.id,
+            'purchase_code': purchase.code,
+            'total': f'{purchase.total:.2f}',
+        })
+
+
+class ConfirmPurchaseView(LoginRequiredMixin, View):
+    """Receive a draft purchase: all its lines go into stock at once"""
+
+    def post(self, request, pk):
+        try:
+            purchase = confirm_purchase(pk, request.user)
+            messages.success(request, f'Compra {purchase.code} recibida y stock actualizado')
+        except ReceivingError as e:
+            messages.error(request, str(e))
+        return redirect('purchases:purchase_list')
@@ -5,3 +5,22 @@ class ReportsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.reports'
     verbose_name = 'Reportes y Dashboard'
+
+    def ready(self):
+        from django.conf import settings
+        from django.db.models.signals import post_save, post_delete, post_migrate
+        from . import kpis
+        for sender in ('products.Product', 'products.Category'):
+            post_save.connect(kpis.product_changed, sender=sender, dispatch_uid=f'kpis-{sender}-save')
+            post_delete.connect(kpis.product_changed, sender=sender, dispatch_uid=f'kpis-{sender}-delete')
+        post_save.connect(kpis.reservation_changed, sender='sales.Reservation', dispatch_uid='kpis-reservation-save')
+        post_delete.connect(kpis.reservation_changed, sender='sales.Reservation', dispatch_uid='kpis-reservation-delete')
+        for sender in (settings.AUTH_USER_MODEL, 'accounts.WhatsAppTemplate'):
+            post_save.connect(kpis.settings_changed, sender=sender, dispatch_uid=f'kpis-{sender}-save')
+        post_migrate.connect(_create_cache_table, sender=self)
+
+
+def _create_cache_table(using, **kwargs):
+    # DatabaseCache needs its table; the command skips tables that already exist
+    from django.core.management import call_command
+    call_command('createcachetable', database=using, verbosity=0)
@@ -0,0 +1,57 @@
+"""
+Business-date ranges
+
+Sales, purchases and stock movements store `business_date`, the local
+(TIME_ZONE) day they belong to, next to `created_at`. Reports filter and
+group on that column instead of `created_at__date` or TruncDate, which wrap
+the indexed column in a function (and a timezone conversion) and force a
+full scan. Every range here is half-open, `start <= day < end + 1`, so the
+same filter works for a date column or a datetime column and the planner
+can serve it from a plain B-tree index.
+"""
+from django.db.models import Q
+from django.utils import timezone
+from datetime import date, datetime, time, timedelta
+
+
+def business_date(moment=None):
+    """Local day of `moment` (default: now)"""
+    return timezone.localdate(moment)
+
+
+def parse(value):
+    """A date from a date or a 'YYYY-MM-DD' string; None when empty or invalid"""
+    if isinstance(value, date):
+        return value
+    try:
+        return date.fromisoformat(value) if value else None
+    except ValueError:
+        return None
+
+
+def date_range(start=None, end=None, field='business_date'):
+    """
+    Q for `start` <= `field` <= `end` (either side optional), written as the
+    half-open range `field >= start AND field < end + 1 day`.
+    """
+    q = Q()
+    if start:
+        q &= Q(**{f'{field}__gte': start})
+    if end:
+        q &= Q(**{f'{field}__lt': end + timedelta(days=1)})
+    return q
+
+
+def start_of_day(day):
+    """Aware datetime of local midnight at the start of `day`"""
+    return timezone.make_aware(datetime.combine(day, time.min), timezone.get_current_timezone())
+
+
+def datetime_range(start=None, end=None, field='created_at'):
+    """Same as date_range for a datetime column, with local-midnight bounds"""
+    q = Q()
+    if start:
+        q &= Q(**{f'{field}__gte': start_of_day(start)})
+    if end:
+        q &= Q(**{f'{field}__lt': start_of_day(end + timedelta(days=1))})
+    return q
@@ -0,0 +1,202 @@
+"""
+Streaming report exports
+
+Each dataset is a queryset of `values_list` rows read with `iterator()` in
+chunks (a server-side cursor on PostgreSQL), so memory stays flat whatever
+the date range. CSV is streamed to the client as rows are read; XLSX is
+written by openpyxl in write-only mode to a temporary file and streamed
+from there, because the zip container can only be finished at the end.
+"""
+from django.http import FileResponse, StreamingHttpResponse
+from django.utils import timezone
+from datetime import datetime
+import csv
+import tempfile
+from . import dates
+
+CHUNK_SIZE = 2000
+
+
+class Dataset:
+    """Title, column headers, filtered queryset and row formatter of an export"""
+
+    def __init__(self, title, headers, queryset, row=None):
+        self.title = title
+        self.headers = headers
+        self.queryset = queryset
+        self.row = row or (lambda values: values)
+
+    def rows(self, start, end):
+        for values in self.queryset(start, end).iterator(chunk_size=CHUNK_SIZE):
+            yield [_cell(value) for value in self.row(values)]
+
+
+def _label(choices, value):
+    return dict(choices.choices).get(value, value)
+
+
+def _cell(value):
+    # Excel has no timezones: write local wall-clock time
+    if isinstance(value, datetime):
+        return timezone.localtime(value).replace(tzinfo=None, microsecond=0)
+    return value
+
+
+def _daily(start, end):
+    from django.db.models import Sum
+    from .models import DailySales
+    return DailySales.objects.filter(dates.date_range(start, end, 'date')).values('date').annotate(
+        sales=Sum('sale_count'), sold=Sum('units'), amount=Sum('revenue'), spent=Sum('cost')
+    ).order_by('date').values_list('date', 'sales', 'sold', 'amount', 'spent')
+
+
+def _sales(start, end):
+    from apps.sales.models import Sale
+    return Sale.objects.filter(dates.date_range(start, end)).order_by('business_date', 'id').values_list(
+        'code', 'created_at', 'customer__name', 'seller__username', 'payment_method', 'status',
+        'subtotal', 'discount', 'tax', 'total', 'cost', 'profit'
+    )
+
+
+def _sale_row(values):
+    from apps.sales.models import Sale
+    values = list(values)
+    values[4] = _label(Sale.PaymentMethod, values[4])
+    values[5] = _label(Sale.Status, values[5])
+    return values
+
+
+def _sale_items(start, end):
+    from apps.sales.models import SaleItem
+    return SaleItem.objects.filter(dates.date_range(start, end, 'sale__business_date')).order_by(
+        'sale__business_date', 'sale_id', 'id'
+    ).values_list(
+        'sale__code', 'sale__created_at', 'sale__status', 'product_code', 'product_name',
+        'quantity', 'unit_price', 'subtotal', 'unit_cost'
+    )
+
+
+def _sale_item_row(values):
+    from apps.sales.models import Sale
+    values = list(values)
+    values[2] = _label(Sale.Status, values[2])
+    return values
+
+
+def _purchases(start, end):
+    from apps.purchases.models import Purchase
+    return Purchase.objects.filter(dates.date_range(start, end)).order_by('business_date', 'id').values_list(
+        'code', 'created_at', 'supplier__name', 'invoice_number', 'is_draft', 'total', 'created_by__username'
+    )
+
+
+def _purchase_row(values):
+    values = list(values)
+    values[4] = 'Borrador' if values[4] else 'Recibida'
+    return values
+
+
+def _kardex(start, end):
+    from apps.purchases.models import StockMovement
+    return StockMovement.objects.filter(dates.date_range(start, end)).order_by('business_date', 'id').values_list(
+        'created_at', 'product__code', 'product__name', 'movement_type', 'quantity',
+        'previous_stock', 'new_stock', 'reference_id', 'notes', 'created_by__username'
+    )
+
+
+def _kardex_row(values):
+    from apps.purchases.models import StockMovement
+    values = list(values)
+    values[3] = _label(StockMovement.MovementType, values[3])
+    return values
+
+
+DATASETS = {
+    'daily': Dataset(
+        'Ventas por día',
+        ['Fecha', 'Ventas', 'Unidades', 'Ingresos', 'Costo'],
+        _daily,
+    ),
+    'sales': Dataset(
+        'Ventas',
+        ['Código', 'Fecha', 'Cliente', 'Vendedor', 'Método de pago', 'Estado',
+         'Subtotal', 'Descuento', 'Impuesto', 'Total', 'Costo', 'Ganancia'],
+        _sales, _sale_row,
+    ),
+    'sale_items': Dataset(
+        'Detalle de ventas',
+        ['Venta', 'Fecha', 'Estado', 'Código', 'Producto', 'Cantidad', 'Precio unitario', 'Subtotal',
+         'Costo unitario'],
+        _sale_items, _sale_item_row,
+    ),
+    'purchases': Dataset(
+        'Compras',
+        ['Código', 'Fecha', 'Proveedor', 'Factura', 'Estado', 'Total', 'Registrado por'],
+        _purchases, _purchase_row,
+    ),
+    'kardex': Dataset(
+        'Kardex',
+        ['Fecha', 'Código', 'Producto', 'Tipo', 'Cantidad', 'Stock anterior', 'Stock nuevo',
+         'Referencia', 'Notas', 'Usuario'],
+        _kardex, _kardex_row,
+    ),
+}
+
+FORMATS = ('csv', 'xlsx')
+
+
+class _Echo:
+    """File-like object whose write() hands the line back to the csv writer's caller"""
+
+    def write(self, value):
+        return value
+
+
+def filename(name, start, end, extension):
+    period = '_'.join(str(d) for d in (start, end) if d) or 'todo'
+    return f'{name}_{period}.{extension}'
+
+
+def csv_response(name, start=None, end=None):
+    dataset = DATASETS[name]
+    writer = csv.writer(_Echo())
+
+    def stream():
+        # BOM so Excel opens the file as UTF-8
+        yield '\ufeff' + writer.writerow(dataset.headers)
+        for row in dataset.rows(start, end):
+            yield writer.writerow(row)
+
+    response = StreamingHttpResponse(stream(), content_type='text/csv; charset=utf-8')
+    response['Content-Disposition'] = f'attachment; filename="{filename(name, start, end, "csv")}"'
+    return response
+
+
+def xlsx_response(name, start=None, end=None):
+    from openpyxl import Workbook
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import Font
+
+    dataset = DATASETS[name]
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet(dataset.title[:31])
+    bold = Font(bold=True)
+    header = []
+    for title in dataset.headers:
+        cell = WriteOnlyCell(sheet, value=title)
+        cell.font = bold
+        header.append(cell)
+    sheet.append(header)
+    for row in dataset.rows(start, end):
+        sheet.append(row)
+
+    # Deleted when the response is closed
+    output = tempfile.TemporaryFile()
+    workbook.save(output)
+    output.seek(0)
+    return FileResponse(
+        output,
+        as_attachment=True,
+        filename=filename(name, start, end, 'xlsx'),
+        content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    )
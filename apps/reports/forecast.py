@@ -0,0 +1,209 @@
+"""
+Demand forecast and suggested purchase orders
+
+`load` reads the active catalog and its daily unit sales (from the
+DailyProductSales rollups) into NumPy arrays, and `forecast` computes for
+every product in one vectorized pass:
+
+- moving averages of daily demand over 7 days, 28 days and the whole
+  history (each over the days the product has existed), blended into a
+  daily rate;
+- the standard deviation of daily demand, days without sales counting as 0;
+- safety stock z·σ·√lead time and the reorder point, rate · lead time +
+  safety stock, which is also the suggested min_stock;
+- the quantity to order: products at or under their reorder level (the
+  larger of the reorder point and the current min_stock) are brought back
+  to it plus FORECAST_COVER_DAYS of demand.
+
+Sales are never expanded into a products × days matrix: every sum is a
+np.bincount over the sparse (product, day, units) rows, so memory follows
+the number of rows that exist, not catalog size × history.
+"""
+from django.conf import settings
+from django.db import transaction
+from django.db.models import OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from datetime import timedelta
+from decimal import Decimal
+import numpy as np
+from .dates import business_date, date_range
+from .models import DailyProductSales
+
+# Weights of the 7-day, 28-day and full-history averages in the daily rate
+RATE_WEIGHTS = (0.2, 0.5, 0.3)
+SUGGESTED_INVOICE = 'SUGERIDO'
+
+
+def load(today=None, history_days=None):
+    """Active products and their daily sales over the last `history_days` days, as arrays"""
+    from apps.products.models import Product
+
+    today = today or business_date()
+    history_days = history_days or settings.FORECAST_HISTORY_DAYS
+    start = today - timedelta(days=history_days - 1)
+
+    rows = list(Product.objects.filter(is_active=True).order_by('id').values_list(
+        'id', 'stock', 'reserved_stock', 'min_stock', 'supplier_id', 'supplier__lead_time_days',
+        'purchase_price', 'created_at'
+    ))
+    columns = list(zip(*rows)) or [()] * 8
+    ids = np.array(columns[0], dtype=np.int64)
+
+    origin = start.toordinal()
+    product_ids, days, units = [], [], []
+    sales = DailyProductSales.objects.filter(
+        date_range(start, today, 'date'), units__gt=0, product__is_active=True
+    ).values_list('product_id', 'date', 'units')
+    for product_id, day, quantity in sales.iterator(chunk_size=10000):
+        product_ids.append(product_id)
+        days.append(day.toordinal() - origin)
+        units.append(quantity)
+
+    return {
+        'today': today,
+        'history_days': history_days,
+        'ids': ids,
+        'available': np.array(columns[1], dtype=np.int64) - np.array(columns[2], dtype=np.int64),
+        'min_stock': np.array(columns[3], dtype=np.int64),
+        'supplier': np.array(columns[4], dtype=np.int64),
+        'lead_time': np.array(columns[5], dtype=np.float64),
+        'price': list(columns[6]),
+        'age': np.array([(today - timezone.localdate(c)).days + 1 for c in columns[7]], dtype=np.int64),
+        'product': np.searchsorted(ids, np.array(product_ids, dtype=np.int64)),
+        'day': np.array(days, dtype=np.int64),
+        'units': np.array(units, dtype=np.float64),
+    }
+
+
+def forecast(data, z=None, cover_days=None):
+    """Per-product demand statistics, suggested min_stock and order quantity, as arrays"""
+    z = settings.FORECAST_SERVICE_LEVEL_Z if z is None else z
+    cover_days = settings.FORECAST_COVER_DAYS if cover_days is None else cover_days
+    n = len(data['ids'])
+    history = data['history_days']
+    product, day, units = data['product'], data['day'], data['units']
+    observed = np.clip(data['age'], 1, history).astype(np.float64)
+
+    def window_sum(days):
+        recent = day >= history - days
+        return np.bincount(product[recent], weights=units[recent], minlength=n)
+
+    total = np.bincount(product, weights=units, minlength=n)
+    averages = np.vstack([
+        window_sum(7) / np.minimum(observed, 7),
+        window_sum(28) / np.minimum(observed, 28),
+        total / observed,
+    ])
+    rate = np.average(averages, axis=0, weights=RATE_WEIGHTS)
+    mean = averages[2]
+    variance = np.bincount(product, weights=units ** 2, minlength=n) / observed - mean ** 2
+    sigma = np.sqrt(np.maximum(variance, 0))
+
+    lead_time = data['lead_time']
+    safety_stock = z * sigma * np.sqrt(lead_time)
+    reorder_point = rate * lead_time + safety_stock
+    reorder_level = np.maximum(reorder_point, data['min_stock'])
+    target = np.maximum(reorder_point + rate * cover_days, data['min_stock'])
+    available = data['available']
+    order = np.where(available <= reorder_level, np.maximum(np.ceil(target - available), 1), 0)
+
+    return {
+        'rate': rate,
+        'sigma': sigma,
+        'safety_stock': safety_stock,
+        'reorder_point': reorder_point,
+        'suggested_min_stock': np.ceil(reorder_point).astype(np.int64),
+        'order_quantity': order.astype(np.int64),
+        'has_history': total > 0,
+    }
+
+
+def write_orders(data, result, user):
+    """
+    Write the suggested quantities as draft purchases, one per supplier.
+
+    A supplier's latest suggested draft is reused: its lines for these
+    products are set to the new quantity and missing lines are added, all
+    with bulk inserts and updates. Returns (drafts created, drafts
+    updated, lines written).
+    """
+    from apps.purchases.models import Purchase, PurchaseItem
+
+    lines = {}
+    for i in np.flatnonzero(result['order_quantity'] > 0):
+        lines.setdefault(int(data['supplier'][i]), {})[int(data['ids'][i])] = (
+            int(result['order_quantity'][i]), data['price'][i]
+        )
+    if not lines:
+        return 0, 0, 0
+
+    with transaction.atomic():
+        drafts = {}
+        for purchase in Purchase.objects.select_for_update().filter(
+            is_draft=True, invoice_number=SUGGESTED_INVOICE, supplier_id__in=list(lines)
+        ).order_by('created_at', 'id'):
+            drafts[purchase.supplier_id] = purchase
+        reused = len(drafts)
+
+        missing = [supplier_id for supplier_id in lines if supplier_id not in drafts]
+        created = Purchase.objects.bulk_create([
+            Purchase(
+                code=code,
+                supplier_id=supplier_id,
+                invoice_number=SUGGESTED_INVOICE,
+                total=Decimal(0),
+                notes='Generado automáticamente según la demanda proyectada',
+                created_by=user,
+                is_draft=True,
+            )
+            for supplier_id, code in zip(missing, Purchase.generate_codes(len(missing)))
+        ])
+        drafts.update((purchase.supplier_id, purchase) for purchase in created)
+
+        existing = {
+            (item.purchase_id, item.product_id): item
+            for item in PurchaseItem.objects.filter(
+                purchase__in=list(drafts.values()),
+                product_id__in=[pk for products in lines.values() for pk in products],
+            )
+        }
+        to_create, to_update = [], []
+        for supplier_id, products in lines.items():
+            purchase = drafts[supplier_id]
+            for product_id, (quantity, price) in products.items():
+                item = existing.get((purchase.pk, product_id))
+                if item is None:
+                    to_create.append(PurchaseItem(
+                        purchase=purchase, product_id=product_id, quantity=quantity,
+                        unit_price=price, subtotal=price * quantity,
+                    ))
+                else:
+                    item.quantity, item.unit_price, item.subtotal = quantity, price, price * quantity
+                    to_update.append(item)
+        PurchaseItem.objects.bulk_create(to_create, batch_size=1000)
+        PurchaseItem.objects.bulk_update(to_update, ['quantity', 'unit_price', 'subtotal'], batch_size=1000)
+
+        item_total = PurchaseItem.objects.filter(purchase=OuterRef('pk')).values('purchase').annotate(
+            amount=Sum('subtotal')
+        ).values('amount')
+        Purchase.objects.filter(pk__in=[p.pk for p in drafts.values()]).update(
+            total=Coalesce(Subquery(item_total), Decimal(0)),
+            updated_at=timezone.now(),
+        )
+    return len(created), reused, len(to_create) + len(to_update)
+
+
+def apply_min_stock(data, result):
+    """Set min_stock to the reorder point for products with sales history; returns the number changed"""
+    from apps.products.models import Product
+    from . import kpis
+
+    changed = np.flatnonzero(result['has_history'] & (result['suggested_min_stock'] != data['min_stock']))
+    Product.objects.bulk_update(
+        [Product(pk=int(data['ids'][i]), min_stock=int(result['suggested_min_stock'][i])) for i in changed],
+        ['min_stock'], batch_size=1000,
+    )
+    if len(changed):
+        kpis.bump(kpis.STOCK)
+    return len(changed)
@@ -0,0 +1,218 @@
+"""
+Dashboard KPI blocks
+
+Each dashboard block is cached under the business date and the version
+tokens (apps.reports.versions) of the data it reads: sales, stock,
+reservations, settings. Writers call `bump` when that data changes, after
+their transaction commits, so a block is recomputed on the first load
+after a relevant change and served from the cache until the next one.
+A block's key carries the tokens, so a cached block never changes: each
+process keeps the blocks it has seen in its local-memory cache and a warm
+dashboard costs one shared cache read, the version tokens.
+
+When several requests miss the same block at once, only the one that takes
+the block's lock (`cache.add`) runs its queries; the others wait briefly for
+its result.
+"""
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.db.models import F, Sum
+from datetime import timedelta
+import time
+from . import dates, velocity
+from .versions import bump, current
+from .models import DailySales
+
+SALES = 'sales'
+STOCK = 'stock'
+RESERVATIONS = 'reservations'
+SETTINGS = 'settings'
+
+PREFIX = 'dashboard'
+LOCAL_CACHE = 'local'
+LOCK_TIMEOUT = 30
+LOCK_WAIT = 2.0
+_MISSING = object()
+
+
+def stock_changed(rows):
+    """
+    Bump STOCK when a product is, or becomes, low or out of stock.
+
+    `rows` are (available_before, available_after, min_stock) tuples. Only
+    products at or under their minimum appear on the dashboard, so changes
+    that stay above it do not invalidate anything.
+    """
+    if any(before <= min_stock or after <= min_stock for before, after, min_stock in rows):
+        bump(STOCK)
+
+
+def _compute(key, compute):
+    """Run `compute` for a missing block, letting only one request do it at a time"""
+    lock = f'{key}:lock'
+    deadline = time.monotonic() + LOCK_WAIT
+    while True:
+        if cache.add(lock, 1, LOCK_TIMEOUT):
+            try:
+                value = compute()
+                cache.set(key, value, settings.DASHBOARD_CACHE_TIMEOUT)
+            finally:
+                cache.delete(lock)
+            return value
+        time.sleep(0.05)
+        value = cache.get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+        if time.monotonic() >= deadline:
+            # The lock holder is slow or died; don't keep the page waiting
+            return compute()
+
+
+def blocks(specs, today):
+    """
+    Merge the values of every block in `specs` ({name: (topics, compute)}).
+
+    `compute(today)` returns a dict of context values.
+    """
+    versions = current({topic for topics, _ in specs.values() for topic in topics})
+    keys = {
+        name: ':'.join([PREFIX, name, today.isoformat()] + [versions[t] for t in sorted(topics)])
+        for name, (topics, _) in specs.items()
+    }
+    local = caches[LOCAL_CACHE]
+    found = local.get_many(keys.values())
+    missing = [key for key in keys.values() if key not in found]
+    if missing:
+        shared = cache.get_many(missing)
+        local.set_many(shared, settings.DASHBOARD_CACHE_TIMEOUT)
+        found.update(shared)
+    context = {}
+    for name, (topics, compute) in specs.items():
+        value = found.get(keys[name], _MISSING)
+        if value is _MISSING:
+            value = _compute(keys[name], lambda: compute(today))
+            local.set(keys[name], value, settings.DASHBOARD_CACHE_TIMEOUT)
+        context.update(value)
+    return context
+
+
+def sales_totals(today):
+    month_start = today.replace(day=1)
+    today_sales = DailySales.objects.filter(date=today).aggregate(
+        total=Sum('revenue'),
+        count=Sum('sale_count')
+    )
+    month_sales = DailySales.objects.filter(dates.date_range(month_start, today, 'date')).aggregate(
+        total=Sum('revenue'),
+        count=Sum('sale_count')
+    )
+    return {
+        'today_sales': today_sales['total'] or 0,
+        'today_count': today_sales['count'] or 0,
+        'month_sales': month_sales['total'] or 0,
+        'month_count': month_sales['count'] or 0,
+    }
+
+
+def stock_alerts(today):
+    from apps.products.models import Product
+    products = Product.objects.annotate(available=F('stock') - F('reserved_stock'))
+    return {
+        'low_stock': products.filter(
+            available__lte=F('min_stock'),
+            is_active=True
+        ).count(),
+        'out_of_stock_products': list(products.filter(
+            available=0,
+            is_active=True
+        ).select_related('category', 'supplier').order_by('name')[:20]),
+        'low_stock_products': list(products.filter(
+            available__gt=0,
+            available__lte=F('min_stock'),
+            is_active=True
+        ).select_related('category', 'supplier').order_by('available')[:20]),
+        # Expiring products (next 30 days)
+        'expiring_soon': Product.objects.filter(
+            expiration_date__lte=today + timedelta(days=30),
+            expiration_date__gte=today,
+            is_active=True
+        ).count(),
+    }
+
+
+def top_products(today):
+    from apps.products.models import Product
+    products = Product.objects.filter(is_active=True).select_related('category')
+    return {'top_products': list(velocity.top_sellers(products)[:5])}
+
+
+def dead_stock(today):
+    # No sales in 30 days
+    from apps.products.models import Product
+    return {'dead_stock': velocity.dead_stock(Product.objects.filter(is_active=True), 30, today).count()}
+
+
+def recent_sales(today):
+    from apps.sales.models import Sale
+    return {'recent_sales': list(
+        Sale.objects.filter(status='COMPLETED').select_related('customer', 'seller').order_by('-created_at')[:10]
+    )}
+
+
+def reservations(today):
+    from apps.sales.models import Reservation
+    return {'reservations_active': Reservation.objects.filter(status='RESERVED').count()}
+
+
+def contact(today):
+    from django.contrib.auth import get_user_model
+    from apps.accounts.models import WhatsAppTemplate
+    admin = get_user_model().objects.filter(username='admin').first()
+    phone = ''
+    if admin and admin.phone:
+        phone = ''.join(ch for ch in admin.phone if ch.isdigit())
+    return {
+        'admin_phone': phone,
+        'wa_tpl_out_of_stock': WhatsAppTemplate.get_content(
+            'ALERT_OUT_OF_STOCK',
+            'Producto agotado\n\nNombre: {{name}}\nCódigo: {{code}}'
+        ),
+        'wa_tpl_low_stock': WhatsAppTemplate.get_content(
+            'ALERT_LOW_STOCK',
+            'Producto por debajo del stock mínimo\n\nNombre: {{name}}\nCódigo: {{code}}\nStock: {{stock}}\nStock mínimo: {{min_stock}}'
+        ),
+    }
+
+
+DASHBOARD = {
+    'sales_totals': ([SALES], sales_totals),
+    'stock_alerts': ([STOCK], stock_alerts),
+    'top_products': ([SALES, STOCK], top_products),
+    'dead_stock': ([SALES, STOCK], dead_stock),
+    'recent_sales': ([SALES], recent_sales),
+    'reservations': ([RESERVATIONS], reservations),
+    'contact': ([SETTINGS], contact),
+}
+
+
+def dashboard(today=None):
+    """Context values for the dashboard"""
+    return blocks(DASHBOARD, today or dates.business_date())
+
+
+# Model signal receivers (connected in ReportsConfig.ready). Set-based
+# writers that bypass signals (checkout, cancellation) call bump directly.
+
+def product_changed(**kwargs):
+    bump(STOCK)
+
+
+def reservation_changed(**kwargs):
+    bump(RESERVATIONS, STOCK)
+
+
+def settings_changed(update_fields=None, **kwargs):
+    # Every login saves the user's last_login
+    if update_fields and set(update_fields) <= {'last_login'}:
+        return
+    bump(SETTINGS)
@@ -0,0 +1,39 @@
+"""
+Management command to show the query plans of the report filters
+"""
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from datetime import timedelta
+from apps.reports import dates, plans
+from apps.sales.models import Sale
+
+
+class Command(BaseCommand):
+    help = 'Print EXPLAIN for the report date and sales velocity filters and fail if one scans a whole table'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=30, help='Range length in days')
+        parser.add_argument('--legacy', action='store_true', help='Also show the created_at__date plans for comparison')
+
+    def handle(self, *args, **options):
+        end = dates.business_date()
+        start = end - timedelta(days=options['days'] - 1)
+        queries = plans.report_queries(options['days'], end)
+        self.stdout.write(f'Database: {connection.vendor}, range {start} .. {end}')
+
+        unindexed = []
+        for label, queryset in queries:
+            plan = plans.explain(queryset)
+            self.stdout.write(f'\n{label}\n{plan}')
+            if plans.unindexed_steps(plan):
+                unindexed.append(label)
+
+        if options['legacy']:
+            legacy = Sale.objects.filter(
+                created_at__date__gte=start, created_at__date__lte=end, status=Sale.Status.COMPLETED
+            )
+            self.stdout.write(f'\nAntes: created_at__date (el rango de fechas no usa índice)\n{plans.explain(legacy)}')
+
+        if unindexed:
+            raise CommandError(f'Sin índice: {", ".join(unindexed)}')
+        self.stdout.write(self.style.SUCCESS(f'\n✓ {len(queries)} report filters use an index'))
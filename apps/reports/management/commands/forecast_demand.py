@@ -0,0 +1,52 @@
+"""
+Management command to run the demand forecast
+"""
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+import numpy as np
+import time
+from apps.reports import forecast
+
+
+class Command(BaseCommand):
+    help = 'Forecast demand for every active product; optionally write suggested orders and update min_stock'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, help='Days of sales history (default: FORECAST_HISTORY_DAYS)')
+        parser.add_argument('--orders', action='store_true', help='Write the suggested draft purchases')
+        parser.add_argument('--user', help='Username recorded on new drafts (default: first superuser)')
+        parser.add_argument('--apply-min-stock', action='store_true', help='Set min_stock to the forecast reorder point')
+        parser.add_argument('--top', type=int, default=10, help='Products to list, by daily demand')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        data = forecast.load(history_days=options['days'])
+        loaded = time.perf_counter()
+        result = forecast.forecast(data)
+        computed = time.perf_counter()
+        self.stdout.write(
+            f"{len(data['ids'])} products, {len(data['units'])} daily sales rows: "
+            f"load {loaded - started:.2f}s, forecast {(computed - loaded) * 1000:.1f} ms"
+        )
+
+        self.stdout.write(f"{'id':>8} {'rate/day':>9} {'σ':>7} {'safety':>7} {'min now':>8} {'min sug':>8} {'order':>6}")
+        for i in np.argsort(-result['rate'])[:options['top']]:
+            self.stdout.write(
+                f"{data['ids'][i]:>8} {result['rate'][i]:>9.2f} {result['sigma'][i]:>7.2f} "
+                f"{result['safety_stock'][i]:>7.1f} {data['min_stock'][i]:>8} "
+                f"{result['suggested_min_stock'][i]:>8} {result['order_quantity'][i]:>6}"
+            )
+
+        if options['apply_min_stock']:
+            changed = forecast.apply_min_stock(data, result)
+            self.stdout.write(self.style.SUCCESS(f'✓ min_stock updated on {changed} products'))
+        if options['orders']:
+            users = get_user_model().objects
+            user = users.filter(username=options['user']).first() if options['user'] else \
+                users.filter(is_superuser=True).order_by('pk').first()
+            if user is None:
+                raise CommandError('User not found')
+            created, reused, lines = forecast.write_orders(data, result, user)
+            self.stdout.write(self.style.SUCCESS(
+                f'✓ {lines} order lines in {created + reused} drafts ({created} new, {reused} updated)'
+            ))
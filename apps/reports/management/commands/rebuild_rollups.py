@@ -0,0 +1,55 @@
+"""
+Management command to backfill or rebuild the report rollups
+"""
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Min
+from django.utils import timezone
+from datetime import date, timedelta
+from apps.reports import rollups
+from apps.reports.models import DailySales
+from apps.sales.models import Sale
+from apps.purchases.models import Purchase
+
+
+class Command(BaseCommand):
+    help = 'Recompute daily sales, product and purchase rollups for a date range (default: all history)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start', help='First day, YYYY-MM-DD (default: first sale or purchase)')
+        parser.add_argument('--end', help='Last day, YYYY-MM-DD (default: today)')
+        parser.add_argument('--days', type=int, default=31, help='Days rebuilt per transaction')
+        parser.add_argument('--if-empty', action='store_true', help='Only run when no rollups exist yet (deploy backfill)')
+
+    def handle(self, *args, **options):
+        if options['if_empty'] and DailySales.objects.exists():
+            self.stdout.write('Rollups already populated, nothing to do')
+            return
+        try:
+            start = date.fromisoformat(options['start']) if options['start'] else self.first_day()
+            end = date.fromisoformat(options['end']) if options['end'] else timezone.localdate()
+        except ValueError as e:
+            raise CommandError(f'Invalid date: {e}')
+        if start is None:
+            self.stdout.write('No sales or purchases yet')
+            return
+
+        totals = [0, 0, 0]
+        chunk_start = start
+        while chunk_start <= end:
+            chunk_end = min(chunk_start + timedelta(days=options['days'] - 1), end)
+            counts = rollups.rebuild(chunk_start, chunk_end)
+            totals = [t + c for t, c in zip(totals, counts)]
+            chunk_start = chunk_end + timedelta(days=1)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'✓ Rollups rebuilt from {start} to {end}: {totals[0]} sales rows, '
+            f'{totals[1]} product rows, {totals[2]} purchase rows'
+        ))
+
+    def first_day(self):
+        firsts = [
+            Sale.objects.aggregate(first=Min('business_date'))['first'],
+            Purchase.objects.aggregate(first=Min('business_date'))['first'],
+        ]
+        firsts = [f for f in firsts if f]
+        return min(firsts) if firsts else None
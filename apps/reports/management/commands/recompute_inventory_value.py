@@ -0,0 +1,20 @@
+"""
+Management command to rebuild average costs and the inventory valuation
+"""
+from django.core.management.base import BaseCommand
+from apps.reports import valuation
+
+
+class Command(BaseCommand):
+    help = 'Replay the kardex to rebuild every product average cost and the inventory value totals'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Rows read and written per batch')
+
+    def handle(self, *args, **options):
+        changed = valuation.recompute(batch_size=options['batch_size'])
+        totals = valuation.totals()
+        self.stdout.write(self.style.SUCCESS(
+            f'✓ Inventory revalued: {changed} average costs corrected, '
+            f'{totals["units"] or 0} units worth S/ {totals["value"] or 0:.2f}'
+        ))
@@ -0,0 +1,14 @@
+"""
+Management command to recompute product sales velocity (run nightly)
+"""
+from django.core.management.base import BaseCommand
+from apps.reports import kpis, velocity
+
+
+class Command(BaseCommand):
+    help = "Recompute each product's last sale and 7/30/90-day units sold from the daily rollups"
+
+    def handle(self, *args, **options):
+        changed = velocity.recompute()
+        kpis.bump(kpis.SALES)
+        self.stdout.write(self.style.SUCCESS(f'✓ Sales velocity recomputed: {changed} products updated'))
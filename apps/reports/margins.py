@@ -0,0 +1,73 @@
+"""
+Margin reports
+
+Every sale line carries the unit cost it was sold at and every sale its
+cost and profit, so margins by product, category or seller are
+aggregates over rows that never change, and stay right after purchase
+prices move.
+"""
+from django.db.models import Count, DecimalField, ExpressionWrapper, F, OuterRef, Subquery, Sum
+from .dates import date_range
+
+MONEY = DecimalField(max_digits=14, decimal_places=2)
+LINE_COST = ExpressionWrapper(F('quantity') * F('unit_cost'), output_field=MONEY)
+
+
+def _lines(start, end):
+    from apps.sales.models import Sale, SaleItem
+    return SaleItem.objects.filter(
+        date_range(start, end, 'sale__business_date'), sale__status=Sale.Status.COMPLETED
+    )
+
+
+def _with_margin(rows):
+    rows = list(rows)
+    for row in rows:
+        row['profit'] = row['revenue'] - row['cost']
+        row['margin'] = row['profit'] * 100 / row['revenue'] if row['revenue'] else 0
+    return rows
+
+
+def by_product(start=None, end=None, limit=20):
+    """Products with most profit in the period, named as when last sold"""
+    from apps.products.models import Product
+    rows = list(
+        _lines(start, end).values('product_id').annotate(
+            units=Sum('quantity'), revenue=Sum('subtotal'), cost=Sum(LINE_COST),
+        ).order_by(F('revenue') - F('cost')).reverse()[:limit]
+    )
+    # Code and name from each product's latest line in the period, read for
+    # the listed products only
+    latest = _lines(start, end).filter(product_id=OuterRef('pk')).order_by('-sale__created_at', '-id')
+    names = {
+        pk: (code, name)
+        for pk, code, name in Product.objects.filter(pk__in=[row['product_id'] for row in rows]).annotate(
+            last_code=Subquery(latest.values('product_code')[:1]),
+            last_name=Subquery(latest.values('product_name')[:1]),
+        ).values_list('pk', 'last_code', 'last_name')
+    }
+    for row in rows:
+        row['code'], row['name'] = names.get(row['product_id'], ('', ''))
+    return _with_margin(rows)
+
+
+def by_category(start=None, end=None):
+    return _with_margin(
+        _lines(start, end).values(name=F('product__category__name')).annotate(
+            units=Sum('quantity'), revenue=Sum('subtotal'), cost=Sum(LINE_COST),
+        ).order_by('-revenue')
+    )
+
+
+def by_seller(start=None, end=None):
+    """Read from the sales alone: each stores its cost and profit"""
+    from apps.sales.models import Sale
+    rows = Sale.objects.filter(date_range(start, end), status=Sale.Status.COMPLETED).values(
+        name=F('seller__username')
+    ).annotate(
+        sales=Count('id'), spent=Sum('cost'), earned=Sum('profit'),
+    ).order_by('-earned')
+    return _with_margin(
+        {'name': r['name'], 'sales': r['sales'], 'cost': r['spent'], 'revenue': r['spent'] + r['earned']}
+        for r in rows
+    )
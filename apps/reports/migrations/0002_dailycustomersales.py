@@ -0,0 +1,52 @@
+# Generated by Django 5.0.1 on 2026-10-18 03:13
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def fill_customer_rollups(apps, schema_editor):
+    Sale = apps.get_model('sales', 'Sale')
+    DailyCustomerSales = apps.get_model('reports', 'DailyCustomerSales')
+    rows = Sale.objects.filter(status='COMPLETED', customer__isnull=False).values(
+        'business_date', 'customer_id'
+    ).annotate(sale_count=Count('id'), revenue=Sum('total')).order_by()
+    DailyCustomerSales.objects.bulk_create([
+        DailyCustomerSales(
+            date=r['business_date'], customer_id=r['customer_id'],
+            sale_count=r['sale_count'], revenue=r['revenue'],
+        )
+        for r in rows.iterator()
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customers', '0001_initial'),
+        ('reports', '0001_rollups'),
+        ('sales', '0005_business_date'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyCustomerSales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='Fecha')),
+                ('sale_count', models.IntegerField(default=0, verbose_name='Ventas')),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='Ingresos')),
+                ('customer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='customers.customer', verbose_name='Cliente')),
+            ],
+            options={
+                'verbose_name': 'Resumen diario por cliente',
+                'verbose_name_plural': 'Resúmenes diarios por cliente',
+                'ordering': ['-date'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='dailycustomersales',
+            constraint=models.UniqueConstraint(fields=('date', 'customer'), name='dailycustomersales_key'),
+        ),
+        migrations.RunPython(fill_customer_rollups, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 5.0.1 on 2026-10-18 03:41
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import DecimalField, F, Sum
+
+
+def fill_totals(apps, schema_editor):
+    Product = apps.get_model('products', 'Product')
+    InventoryValue = apps.get_model('reports', 'InventoryValue')
+    InventoryValue.objects.bulk_create([
+        InventoryValue(category_id=row['category_id'], supplier_id=row['supplier_id'],
+                       units=row['units'], value=row['value'])
+        for row in Product.objects.values('category_id', 'supplier_id').annotate(
+            units=Sum('stock'),
+            value=Sum(F('stock') * F('average_cost'), output_field=DecimalField(max_digits=16, decimal_places=4)),
+        )
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0009_product_average_cost'),
+        ('reports', '0002_dailycustomersales'),
+        ('suppliers', '0002_supplier_lead_time_days'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InventoryValue',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('units', models.IntegerField(default=0, verbose_name='Unidades')),
+                ('value', models.DecimalField(decimal_places=4, default=0, max_digits=16, verbose_name='Valor')),
+                ('category', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='products.category', verbose_name='Categoría')),
+                ('supplier', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='suppliers.supplier', verbose_name='Proveedor')),
+            ],
+            options={
+                'verbose_name': 'Valor de inventario',
+                'verbose_name_plural': 'Valor de inventario',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='inventoryvalue',
+            constraint=models.UniqueConstraint(fields=('category', 'supplier'), name='inventoryvalue_key'),
+        ),
+        migrations.RunPython(fill_totals, migrations.RunPython.noop),
+    ]
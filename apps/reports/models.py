@@ -1,6 +1,245 @@
 """
-Reports app doesn't need models - uses data from other apps
+Reports Rollup Models
+
+Per-day totals kept up to date in the same transaction as each sale,
+cancellation and purchase (see apps.reports.rollups), so dashboards and
+reports read one row per day instead of aggregating every sale.
 """
 from django.db import models
+from django.conf import settings
+
+
+class DailySales(models.Model):
+    """Sales totals per day, payment method and seller"""
+
+    date = models.DateField(
+        verbose_name='Fecha'
+    )
+
+    payment_method = models.CharField(
+        max_length=10,
+        verbose_name='Método de pago'
+    )
+
+    seller = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Vendedor'
+    )
+
+    sale_count = models.IntegerField(
+        default=0,
+        verbose_name='Ventas'
+    )
+
+    units = models.IntegerField(
+        default=0,
+        verbose_name='Unidades'
+    )
+
+    revenue = models.DecimalField(
+        max_digits=14,
+        decimal_places=2,
+        default=0,
+        verbose_name='Ingresos'
+    )
+
+    cost = models.DecimalField(
+        max_digits=14,
+        decimal_places=2,
+        default=0,
+        verbose_name='Costo'
+    )
+
+    class Meta:
+        verbose_name = 'Resumen diario de ventas'
+        verbose_name_plural = 'Resúmenes diarios de ventas'
+        ordering = ['-date']
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'payment_method', 'seller'], name='dailysales_key'),
+        ]
+
+    def __str__(self):
+        return f"{self.date} {self.payment_method} - S/ {self.revenue}"
+
+
+class DailyProductSales(models.Model):
+    """Units sold and purchased per day and product"""
+
+    date = models.DateField(
+        verbose_name='Fecha'
+    )
+
+    product = models.ForeignKey(
+        'products.Product',
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Producto'
+    )
+
+    sale_count = models.IntegerField(
+        default=0,
+        verbose_name='Ventas'
+    )
+
+    units = models.IntegerField(
+        default=0,
+        verbose_name='Unidades vendidas'
+    )
+
+    revenue = models.DecimalField(
+        max_digits=14,
+        decimal_places=2,
+        default=0,
+        verbose_name='Ingresos'
+    )
+
+    cost = models.DecimalField(
+        max_digits=14,
+        decimal_places=2,
+        default=0,
+        verbose_name='Costo'
+    )
+
+    purchased_units = models.IntegerField(
+        default=0,
+        verbose_name='Unidades compradas'
+    )
+
+    purchased_cost = models.DecimalField(
+        max_digits=14,
+        decimal_places=2,
+        default=0,
+        verbose_name='Costo de compras'
+    )
+
+    class Meta:
+        verbose_name = 'Resumen diario por producto'
+        verbose_name_plural = 'Resúmenes diarios por producto'
+        ordering = ['-date']
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'product'], name='dailyproductsales_key'),
+        ]
+
+    def __str__(self):
+        return f"{self.date} {self.product_id} x {self.units}"
+
+
+class DailyCustomerSales(models.Model):
+    """Sales per day and customer"""
+
+    date = models.DateField(
+        verbose_name='Fecha'
+    )
+
+    customer = models.ForeignKey(
+        'customers.Customer',
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Cliente'
+    )
+
+    sale_count = models.IntegerField(
+        default=0,
+        verbose_name='Ventas'
+    )
+
+    revenue = models.DecimalField(
+        max_digits=14,
+        decimal_places=2,
+        default=0,
+        verbose_name='Ingresos'
+    )
+
+    class Meta:
+        verbose_name = 'Resumen diario por cliente'
+        verbose_name_plural = 'Resúmenes diarios por cliente'
+        ordering = ['-date']
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'customer'], name='dailycustomersales_key'),
+        ]
+
+    def __str__(self):
+        return f"{self.date} {self.customer_id} - S/ {self.revenue}"
+
+
+class DailyPurchases(models.Model):
+    """Purchase totals per day and supplier"""
+
+    date = models.DateField(
+        verbose_name='Fecha'
+    )
+
+    supplier = models.ForeignKey(
+        'suppliers.Supplier',
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Proveedor'
+    )
+
+    purchase_count = models.IntegerField(
+        default=0,
+        verbose_name='Compras'
+    )
+
+    total = models.DecimalField(
+        max_digits=14,
+        decimal_places=2,
+        default=0,
+        verbose_name='Total'
+    )
+
+    class Meta:
+        verbose_name = 'Resumen diario de compras'
+        verbose_name_plural = 'Resúmenes diarios de compras'
+        ordering = ['-date']
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'supplier'], name='dailypurchases_key'),
+        ]
+
+    def __str__(self):
+        return f"{self.date} {self.supplier_id} - S/ {self.total}"
+
+
+class InventoryValue(models.Model):
+    """
+    Units in stock and their value at average cost, per category and
+    supplier. Kept up to date by deltas (see apps.reports.valuation).
+    """
+
+    category = models.ForeignKey(
+        'products.Category',
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Categoría'
+    )
+
+    supplier = models.ForeignKey(
+        'suppliers.Supplier',
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Proveedor'
+    )
+
+    units = models.IntegerField(
+        default=0,
+        verbose_name='Unidades'
+    )
+
+    value = models.DecimalField(
+        max_digits=16,
+        decimal_places=4,
+        default=0,
+        verbose_name='Valor'
+    )
+
+    class Meta:
+        verbose_name = 'Valor de inventario'
+        verbose_name_plural = 'Valor de inventario'
+        constraints = [
+            models.UniqueConstraint(fields=['category', 'supplier'], name='inventoryvalue_key'),
+        ]
 
-# No models needed - this app aggregates data from other apps
+    def __str__(self):
+        return f"{self.category_id}/{self.supplier_id} - S/ {self.value}"
@@ -0,0 +1,103 @@
+"""
+Date-scoped rankings
+
+Top products and frequent customers for any period are summed from the
+per-day rollups. The closed part of the period (every day before today)
+cannot change except through a cancellation of an old sale or a rollup
+rebuild, which bump the HISTORY version, so its totals are cached with no
+timeout under that version. Only today's rows are read live, so a
+multi-year report costs one cache read plus one day of rollups.
+"""
+from django.core.cache import cache
+from django.db.models import Sum
+from datetime import timedelta
+from .dates import business_date, date_range
+from .models import DailyProductSales, DailyCustomerSales
+from .rollups import HISTORY
+from .versions import current
+
+
+def _product_units(start, end):
+    rows = DailyProductSales.objects.filter(date_range(start, end, 'date')).values('product_id').annotate(
+        sold=Sum('units')
+    ).filter(sold__gt=0)
+    return {r['product_id']: r['sold'] for r in rows}
+
+
+def _customer_sales(start, end):
+    rows = DailyCustomerSales.objects.filter(date_range(start, end, 'date')).values('customer_id').annotate(
+        sales=Sum('sale_count'), amount=Sum('revenue')
+    ).filter(sales__gt=0)
+    return {r['customer_id']: (r['sales'], r['amount']) for r in rows}
+
+
+def _totals(name, compute, start, end):
+    """
+    compute(start, end) over the period, as {id: value}; `start` and `end`
+    are inclusive and either may be None (unbounded).
+    """
+    today = business_date()
+    closed_end = min(end, today - timedelta(days=1)) if end else today - timedelta(days=1)
+    totals = {}
+    if start is None or start <= closed_end:
+        key = f'rankings:{name}:{start}:{closed_end}:{current([HISTORY])[HISTORY]}'
+        totals = cache.get(key)
+        if totals is None:
+            totals = compute(start, closed_end)
+            cache.set(key, totals, timeout=None)
+    if (end is None or end >= today) and (start is None or start <= today):
+        totals = dict(totals)
+        for pk, value in compute(today, today).items():
+            totals[pk] = _add(totals[pk], value) if pk in totals else value
+    return totals
+
+
+def _add(a, b):
+    if isinstance(a, tuple):
+        return tuple(x + y for x, y in zip(a, b))
+    return a + b
+
+
+def _ranked(totals, key, limit, queryset):
+    """The first `limit` rows of `queryset` in `totals` order"""
+    ranked = sorted(totals, key=lambda pk: (-key(totals[pk]), pk))
+    result = []
+    # Rows may have been deactivated since they sold; read more until `limit` are found
+    for offset in range(0, len(ranked), limit * 2):
+        ids = ranked[offset:offset + limit * 2]
+        objects = queryset.in_bulk(ids)
+        result.extend(objects[pk] for pk in ids if pk in objects)
+        if len(result) >= limit:
+            break
+    return result[:limit]
+
+
+def top_products(limit, start=None, end=None):
+    """Active products with most units sold in the period, each with `total_sold`"""
+    from apps.products.models import Product
+    totals = _totals('products', _product_units, start, end)
+    products = _ranked(
+        totals, lambda units: units, limit,
+        Product.objects.filter(is_active=True).select_related('category'),
+    )
+    for product in products:
+        product.total_sold = totals[product.pk]
+    return products
+
+
+def frequent_customers(limit, start=None, end=None):
+    """Customers with most purchases in the period, each with `count` and `amount`"""
+    from apps.customers.models import Customer
+    if start is None and end is None:
+        # All time: straight from the maintained, indexed customer figures
+        customers = list(Customer.objects.filter(stats__sale_count__gt=0).select_related('stats').order_by(
+            '-stats__sale_count', 'pk'
+        )[:limit])
+        for customer in customers:
+            customer.count, customer.amount = customer.stats.sale_count, customer.stats.revenue
+        return customers
+    totals = _totals('customers', _customer_sales, start, end)
+    customers = _ranked(totals, lambda value: value[0], limit, Customer.objects.all())
+    for customer in customers:
+        customer.count, customer.amount = totals[customer.pk]
+    return customers
@@ -0,0 +1,183 @@
+"""
+Incremental report rollups
+
+Sales, cancellations and purchases add their deltas to the daily rollup
+rows inside their own transaction, with one INSERT ... ON CONFLICT DO
+UPDATE per table, so the rollups never drift from the rows they summarize.
+`rebuild` recomputes any date range from the raw tables (backfill, or
+after fixing data by hand).
+"""
+from django.db import connection, transaction
+from django.db.models import Sum, Count, F, DecimalField
+from decimal import Decimal
+from .dates import business_date, date_range
+from .models import DailySales, DailyProductSales, DailyCustomerSales, DailyPurchases
+from .versions import bump
+
+# Version topic of closed days: bumped whenever a day before today changes
+HISTORY = 'history'
+
+
+def _increment(model, keys, rows):
+    """
+    Add `rows` ({key tuple: {field: delta}}) to `model`, creating missing rows.
+
+    Keys must be unique within `rows`: PostgreSQL rejects a statement that
+    updates the same row twice.
+    """
+    if not rows:
+        return
+    qn = connection.ops.quote_name
+    table = qn(model._meta.db_table)
+    fields = list(next(iter(rows.values())))
+    # Counters not touched by this call start at their default on insert
+    others = [
+        f for f in model._meta.concrete_fields
+        if not f.primary_key and f.name not in keys and f.name not in fields
+    ]
+    key_columns = [qn(model._meta.get_field(k).column) for k in keys]
+    value_columns = [qn(model._meta.get_field(f).column) for f in fields]
+    other_columns = [qn(f.column) for f in others]
+    placeholders = '(' + ', '.join(['%s'] * (len(keys) + len(fields) + len(others))) + ')'
+    params = []
+    for key, values in rows.items():
+        params.extend(key)
+        params.extend(values[f] for f in fields)
+        params.extend(f.get_default() for f in others)
+    updates = ', '.join(f'{c} = {table}.{c} + excluded.{c}' for c in value_columns)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {table} ({", ".join(key_columns + value_columns + other_columns)}) '
+            f'VALUES {", ".join([placeholders] * len(rows))} '
+            f'ON CONFLICT ({", ".join(key_columns)}) DO UPDATE SET {updates}',
+            params
+        )
+
+
+def record_sale(sale, lines, sign=1):
+    """
+    Count a completed sale (sign=1) or take a cancelled one back out (sign=-1).
+
+    `lines` are (product_id, quantity, revenue, cost) tuples, one per product.
+    Cancellations are booked on the sale's business date.
+    """
+    day = sale.business_date
+    lines = list(lines)
+    _increment(DailySales, ['date', 'payment_method', 'seller'], {
+        (day, sale.payment_method, sale.seller_id): {
+            'sale_count': sign,
+            'units': sign * sum(qty for _, qty, _, _ in lines),
+            'revenue': sign * sale.total,
+            'cost': sign * sum((cost for _, _, _, cost in lines), Decimal(0)),
+        }
+    })
+    _increment(DailyProductSales, ['date', 'product'], {
+        (day, product_id): {
+            'sale_count': sign,
+            'units': sign * qty,
+            'revenue': sign * revenue,
+            'cost': sign * cost,
+        }
+        for product_id, qty, revenue, cost in lines
+    })
+    if sale.customer_id:
+        _increment(DailyCustomerSales, ['date', 'customer'], {
+            (day, sale.customer_id): {'sale_count': sign, 'revenue': sign * sale.total}
+        })
+    if day < business_date():
+        bump(HISTORY)
+
+
+def record_purchase(purchase):
+    """Count a received (non-draft) purchase"""
+    _increment(DailyPurchases, ['date', 'supplier'], {
+        (purchase.business_date, purchase.supplier_id): {
+            'purchase_count': 1,
+            'total': purchase.total,
+        }
+    })
+
+
+def record_purchase_items(purchase, items):
+    """Add received units per product; `items` are (product_id, quantity, subtotal)"""
+    day = purchase.business_date
+    rows = {}
+    for product_id, qty, subtotal in items:
+        row = rows.setdefault((day, product_id), {'purchased_units': 0, 'purchased_cost': Decimal(0)})
+        row['purchased_units'] += qty
+        row['purchased_cost'] += subtotal
+    _increment(DailyProductSales, ['date', 'product'], rows)
+
+
+@transaction.atomic
+def rebuild(start, end):
+    """Recompute every rollup between `start` and `end` (inclusive) from the raw tables"""
+    from apps.sales.models import Sale, SaleItem
+    from apps.purchases.models import Purchase, PurchaseItem
+
+    for model in (DailySales, DailyProductSales, DailyCustomerSales, DailyPurchases):
+        model.objects.filter(date_range(start, end, 'date')).delete()
+    bump(HISTORY)
+    money = DecimalField(max_digits=14, decimal_places=2)
+    line_cost = Sum(F('quantity') * F('unit_cost'), output_field=money)
+
+    sales = Sale.objects.filter(
+        date_range(start, end), status=Sale.Status.COMPLETED
+    ).annotate(day=F('business_date'))
+    customers = [
+        DailyCustomerSales(date=r['day'], customer_id=r['customer_id'], sale_count=r['sale_count'], revenue=r['revenue'])
+        for r in sales.filter(customer__isnull=False).values('day', 'customer_id').annotate(
+            sale_count=Count('id'), revenue=Sum('total')
+        )
+    ]
+    daily = {
+        (r['day'], r['payment_method'], r['seller_id']): DailySales(
+            date=r['day'], payment_method=r['payment_method'], seller_id=r['seller_id'],
+            sale_count=r['sale_count'], revenue=r['revenue'],
+        )
+        for r in sales.values('day', 'payment_method', 'seller_id').annotate(
+            sale_count=Count('id'), revenue=Sum('total')
+        )
+    }
+    items = SaleItem.objects.filter(
+        date_range(start, end, 'sale__business_date'), sale__status=Sale.Status.COMPLETED
+    ).annotate(day=F('sale__business_date'))
+    for r in items.values('day', 'sale__payment_method', 'sale__seller_id').annotate(
+        units=Sum('quantity'), cost=line_cost
+    ):
+        row = daily[(r['day'], r['sale__payment_method'], r['sale__seller_id'])]
+        row.units, row.cost = r['units'], r['cost']
+
+    products = {
+        (r['day'], r['product_id']): DailyProductSales(
+            date=r['day'], product_id=r['product_id'], sale_count=r['sale_count'],
+            units=r['units'], revenue=r['revenue'], cost=r['cost'],
+        )
+        for r in items.values('day', 'product_id').annotate(
+            sale_count=Count('sale_id', distinct=True), units=Sum('quantity'),
+            revenue=Sum('subtotal'), cost=line_cost,
+        )
+    }
+    received = PurchaseItem.objects.filter(
+        date_range(start, end, 'purchase__business_date'), purchase__is_draft=False
+    ).annotate(day=F('purchase__business_date'))
+    for r in received.values('day', 'product_id').annotate(units=Sum('quantity'), cost=Sum('subtotal')):
+        row = products.setdefault(
+            (r['day'], r['product_id']), DailyProductSales(date=r['day'], product_id=r['product_id'])
+        )
+        row.purchased_units, row.purchased_cost = r['units'], r['cost']
+
+    purchases = [
+        DailyPurchases(date=r['day'], supplier_id=r['supplier_id'], purchase_count=r['count'], total=r['amount'])
+        for r in Purchase.objects.filter(
+            date_range(start, end), is_draft=False
+        ).annotate(day=F('business_date')).values('day', 'supplier_id').annotate(
+            count=Count('id'), amount=Sum('total')
+        )
+    ]
+
+    DailySales.objects.bulk_create(daily.values(), batch_size=1000)
+    DailyProductSales.objects.bulk_create(products.values(), batch_size=1000)
+    DailyCustomerSales.objects.bulk_create(customers, batch_size=1000)
+    DailyPurchases.objects.bulk_create(purchases, batch_size=1000)
+    return len(daily), len(products), len(purchases)
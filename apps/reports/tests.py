@@ -0,0 +1,91 @@
+"""
+Reports tests: the report filters are served by index searches
+"""
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.db.models import Q
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+from datetime import timedelta
+from decimal import Decimal
+from unittest import skipUnless
+from apps.products.models import Category, Product
+from apps.suppliers.models import Supplier
+from . import plans, velocity
+from .dates import business_date
+
+# Index each report filter is expected to search
+EXPECTED_INDEXES = {
+    'Ventas del periodo': 'sale_status_business_date',
+    'Ventas por día': 'sale_status_business_date',
+    'Detalle de ventas': 'sale_status_business_date',
+    'Compras del periodo': 'purchase_business_date',
+    'Kardex del periodo': 'stockmovement_business_date',
+    'Resumen diario': 'dailysales',  # dailysales_key (SQLite: its autoindex)
+    'Sin movimiento': 'product_active_last_sold',
+    'Más vendidos': 'product_active_units_30d',
+    'Rotación lenta': 'product_active_units_90d',
+}
+
+
+class ReportPlanTests(TestCase):
+
+    def test_report_filters_search_their_indexes(self):
+        queries = plans.report_queries(30)
+        self.assertEqual({label for label, _ in queries}, set(EXPECTED_INDEXES))
+        for label, queryset in queries:
+            with self.subTest(label):
+                plan = plans.explain(queryset)
+                self.assertEqual(plans.unindexed_steps(plan), [], plan)
+                self.assertIn(EXPECTED_INDEXES[label], plan)
+                if connection.vendor == 'sqlite':
+                    self.assertIn('SEARCH', plan)
+                    self.assertNotIn('SCAN', plan)
+
+    @skipUnless(connection.vendor == 'sqlite', 'SQLite plan wording')
+    def test_full_scan_through_an_index_is_rejected(self):
+        # OR-ing the branches of dead_stock walks the whole index
+        cutoff = timezone.now()
+        queryset = Product.objects.filter(is_active=True).filter(
+            Q(last_sold_at__isnull=True) | Q(last_sold_at__lt=cutoff)
+        )
+        plan = plans.explain(queryset)
+        self.assertIn('SCAN', plan)
+        self.assertNotEqual(plans.unindexed_steps(plan), [])
+
+
+class DeadStockTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Filtros')
+        supplier = Supplier.objects.create(name='Proveedor', ruc='20123456789', phone='999999999', address='-')
+        now = timezone.now()
+
+        def product(name, last_sold_at=None, is_active=True):
+            item = Product.objects.create(
+                name=name, category=category, supplier=supplier, presentation='Unidad',
+                purchase_price=Decimal('5.00'), sale_price=Decimal('8.00'), stock=10, is_active=is_active,
+            )
+            Product.objects.filter(pk=item.pk).update(last_sold_at=last_sold_at)
+            return item
+
+        cls.never_sold = product('Nunca vendido')
+        cls.sold_long_ago = product('Vendido hace meses', now - timedelta(days=90))
+        cls.sold_today = product('Vendido hoy', now)
+        cls.inactive = product('Inactivo', is_active=False)
+
+    def test_never_sold_and_old_sales_are_dead_stock(self):
+        dead = velocity.dead_stock(Product.objects.filter(is_active=True), 30, business_date())
+        self.assertEqual(set(dead), {self.never_sold, self.sold_long_ago})
+
+    def test_dead_stock_keeps_the_caller_filters(self):
+        queryset = Product.objects.filter(is_active=True, name__startswith='Nunca')
+        self.assertEqual(list(velocity.dead_stock(queryset).order_by('name')), [self.never_sold])
+
+    def test_product_list_searches_within_the_movement_filter(self):
+        self.client.force_login(get_user_model().objects.create_user('vendedor', password='x'))
+        response = self.client.get(reverse('products:product_list'), {'movement': 'dead', 'search': 'meses'})
+        self.assertEqual(list(response.context['products']), [self.sold_long_ago])
+        self.assertContains(response, '?movement=slow&search=meses"')
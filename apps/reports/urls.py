@@ -9,5 +9,6 @@ app_name = 'reports'
 urlpatterns = [
     path('', views.DashboardView.as_view(), name='dashboard'),
     path('reports/', views.ReportView.as_view(), name='reports'),
+    path('reports/export/<str:dataset>.<str:fmt>', views.ExportView.as_view(), name='export'),
     path('generate-suggested-orders/', views.GenerateSuggestedOrdersView.as_view(), name='generate_suggested_orders'),
 ]
@@ -0,0 +1,175 @@
+"""
+Inventory valuation
+
+Product.average_cost is the weighted-average cost of the units in stock.
+Units received at a known cost (purchases, and units returned by a
+cancelled sale at the cost they left with) move it; units sold leave at it.
+
+The value of the stock, stock × average cost, is kept per category and
+supplier in InventoryValue. Every change of stock, cost, category or
+supplier adds its delta there in the same transaction, so the valuation
+report reads a handful of rows however large the catalog and its history.
+
+`recompute` (the recompute_inventory_value command) replays the kardex to
+rebuild every average cost and then the totals.
+"""
+from django.db import models, transaction
+from django.db.models import Case, When, F, Sum, Value
+from decimal import Decimal
+from itertools import groupby
+from .models import InventoryValue
+from .rollups import _increment
+
+PRECISION = Decimal('0.0001')
+COST = models.DecimalField(max_digits=14, decimal_places=4)
+
+
+def record(deltas):
+    """Add {(category_id, supplier_id): (units, value)} to the running totals"""
+    _increment(InventoryValue, ['category', 'supplier'], {
+        key: {'units': units, 'value': value}
+        for key, (units, value) in deltas.items()
+        if units or value
+    })
+
+
+def _add(deltas, product, units, value):
+    key = (product.category_id, product.supplier_id)
+    current = deltas.get(key, (0, Decimal(0)))
+    deltas[key] = (current[0] + units, current[1] + value)
+
+
+def average(stock, cost, quantity, amount):
+    """Average cost after `quantity` units costing `amount` in total join `stock` units at `cost`"""
+    stock = max(stock, 0)
+    return ((stock * cost + amount) / (stock + quantity)).quantize(PRECISION)
+
+
+def received(products, lines):
+    """
+    UPDATE kwargs for units coming in at a known cost, {product_id:
+    (quantity, total cost)}, on the locked `products`; books the value added.
+    """
+    costs, deltas = {}, {}
+    for pk, (qty, amount) in lines.items():
+        product = products[pk]
+        costs[pk] = average(product.stock, product.average_cost, qty, amount)
+        _add(deltas, product, qty, (product.stock + qty) * costs[pk] - product.stock * product.average_cost)
+    record(deltas)
+    return {
+        'average_cost': Case(
+            *[When(pk=pk, then=Value(cost)) for pk, cost in costs.items()],
+            default=F('average_cost'),
+            output_field=COST,
+        )
+    }
+
+
+def issued(products, quantities):
+    """Book the value of units leaving the locked `products` at their average cost, {product_id: quantity}"""
+    deltas = {}
+    for pk, qty in quantities.items():
+        _add(deltas, products[pk], -qty, -qty * products[pk].average_cost)
+    record(deltas)
+
+
+def changed(rows):
+    """
+    Book products written field by field (forms, admin, imports): `rows` are
+    (before, after) pairs of (category_id, supplier_id, stock, average_cost),
+    `before` being None for a new product.
+    """
+    deltas = {}
+    for before, after in rows:
+        for sign, row in ((-1, before), (1, after)):
+            if row is not None:
+                category_id, supplier_id, stock, cost = row
+                key = (category_id, supplier_id)
+                current = deltas.get(key, (0, Decimal(0)))
+                deltas[key] = (current[0] + sign * stock, current[1] + sign * stock * Decimal(cost))
+    record(deltas)
+
+
+def totals():
+    return InventoryValue.objects.aggregate(units=Sum('units'), value=Sum('value'))
+
+
+def by_category():
+    return list(InventoryValue.objects.values(name=F('category__name')).annotate(
+        total_units=Sum('units'), total_value=Sum('value')
+    ).filter(total_units__gt=0).order_by('-total_value'))
+
+
+def by_supplier():
+    return list(InventoryValue.objects.values(name=F('supplier__name')).annotate(
+        total_units=Sum('units'), total_value=Sum('value')
+    ).filter(total_units__gt=0).order_by('-total_value'))
+
+
+@transaction.atomic
+def recompute(batch_size=1000):
+    """
+    Replay every product's kardex to rebuild its average cost, then the
+    totals from the products. Returns the number of products whose average
+    cost changed.
+
+    Opening stock (before the first movement) is valued at the purchase
+    price. Purchases come in at their line cost, units returned by a
+    cancelled sale at the cost they were sold at; everything else moves at
+    the running average.
+    """
+    from apps.products.models import Product
+    from apps.purchases.models import PurchaseItem, StockMovement
+    from apps.sales.models import Sale, SaleItem
+
+    purchased = {}
+    for purchase_id, product_id, qty, amount in PurchaseItem.objects.filter(
+        purchase__is_draft=False
+    ).values_list('purchase_id', 'product_id').annotate(
+        units=Sum('quantity'), amount=Sum('subtotal')
+    ).values_list('purchase_id', 'product_id', 'units', 'amount'):
+        purchased[(purchase_id, product_id)] = amount / qty
+    returned = dict(
+        ((sale_id, product_id), cost)
+        for sale_id, product_id, cost in SaleItem.objects.filter(
+            sale__status=Sale.Status.CANCELLED
+        ).values_list('sale_id', 'product_id', 'unit_cost')
+    )
+
+    costs = {}
+    movements = StockMovement.objects.order_by('product_id', 'id').values_list(
+        'product_id', 'movement_type', 'quantity', 'previous_stock', 'reference_id'
+    )
+    list_prices = dict(Product.objects.values_list('id', 'purchase_price'))
+    for product_id, rows in groupby(movements.iterator(chunk_size=batch_size), key=lambda row: row[0]):
+        stock, cost = None, Decimal(list_prices.get(product_id, 0))
+        for _, kind, qty, previous, reference in rows:
+            if stock is None:
+                stock = previous
+            unit = None
+            if qty > 0 and kind == StockMovement.MovementType.PURCHASE:
+                unit = purchased.get((reference, product_id))
+            elif qty > 0 and kind == StockMovement.MovementType.ADJUSTMENT:
+                unit = returned.get((reference, product_id))
+            if unit is not None:
+                cost = average(stock, cost, qty, qty * unit)
+            stock += qty
+        costs[product_id] = cost
+
+    changed_products = []
+    for product in Product.objects.only('id', 'purchase_price', 'average_cost').iterator(chunk_size=batch_size):
+        cost = costs.get(product.pk, product.purchase_price).quantize(PRECISION)
+        if product.average_cost != cost:
+            product.average_cost = cost
+            changed_products.append(product)
+    Product.objects.bulk_update(changed_products, ['average_cost'], batch_size=batch_size)
+
+    InventoryValue.objects.all().delete()
+    InventoryValue.objects.bulk_create([
+        InventoryValue(category_id=row['category_id'], supplier_id=row['supplier_id'],
+                       units=row['units'], value=row['value'])
+        for row in Product.objects.values('category_id', 'supplier_id').annotate(
+            units=Sum('stock'), value=Sum(F('stock') * F('average_cost'), output_field=COST),
+        )
+    ], batch_size=batch_size)
+    return len(changed_products)
@@ -0,0 +1,100 @@
+"""
+Product sales velocity
+
+Product carries `last_sold_at` and the units sold in the last 7, 30 and 90
+days, so dead stock, slow movers and top sellers are filters on the product
+table alone (each backed by an (is_active, column) index) instead of joins
+against sale history.
+
+Checkout adds to the counters in the same UPDATE that takes the stock out,
+and a cancellation subtracts from the windows its sale still falls in.
+Nothing ages the counters in between: `recompute` (the nightly
+`recompute_sales_velocity` command) rebuilds them from the daily rollups.
+"""
+from django.db import models, transaction
+from django.db.models import Case, When, F, Max, Sum
+from django.db.models.functions import Greatest
+from datetime import timedelta
+from .dates import business_date, date_range, start_of_day
+from .models import DailyProductSales
+
+WINDOWS = {'units_7d': 7, 'units_30d': 30, 'units_90d': 90}
+
+
+def _case(mapping, field):
+    return Case(
+        *[When(pk=pk, then=value) for pk, value in mapping.items()],
+        default=F(field),
+        output_field=models.IntegerField(),
+    )
+
+
+def cancel_update(quantities, day, today=None):
+    """UPDATE kwargs taking back a sale of {product_id: quantity} made on `day`"""
+    age = ((today or business_date()) - day).days
+    return {
+        field: _case({pk: Greatest(F(field) - qty, 0) for pk, qty in quantities.items()}, field)
+        for field, days in WINDOWS.items()
+        if age < days
+    }
+
+
+def dead_stock(queryset, days=30, today=None):
+    """
+    Products without a sale in the last `days` days. "Never sold" and "sold
+    before the cutoff" are two range searches on the last_sold_at index
+    joined with UNION ALL: OR-ing them makes SQLite scan the whole table.
+    """
+    cutoff = start_of_day((today or business_date()) - timedelta(days=days - 1))
+    branches = queryset.order_by().values('pk')
+    ids = branches.filter(last_sold_at__isnull=True).union(branches.filter(last_sold_at__lt=cutoff), all=True)
+    return queryset.filter(pk__in=ids)
+
+
+def top_sellers(queryset, field='units_30d'):
+    """Products that sold in the window, best first"""
+    return queryset.filter(**{f'{field}__gt': 0}).order_by(f'-{field}', 'name')
+
+
+def slow_movers(queryset):
+    """Products that sold in the last 90 days, slowest first"""
+    return queryset.filter(units_90d__gt=0).order_by('units_90d', 'units_30d', 'name')
+
+
+def recompute(today=None, batch_size=1000):
+    """
+    Rebuild every product's counters from the daily rollups and its
+    `last_sold_at` from sale history. Returns the number of products changed.
+
+    Checkouts committing while this runs can be overwritten; run it while
+    the store is closed.
+    """
+    from apps.products.models import Product
+    from apps.sales.models import Sale, SaleItem
+
+    today = today or business_date()
+    stats = {}
+    for field, days in WINDOWS.items():
+        rows = DailyProductSales.objects.filter(
+            date_range(today - timedelta(days=days - 1), today, 'date')
+        ).values('product_id').annotate(sold=Sum('units'))
+        for row in rows:
+            stats.setdefault(row['product_id'], {})[field] = max(row['sold'], 0)
+    last_sold = dict(
+        SaleItem.objects.filter(sale__status=Sale.Status.COMPLETED)
+        .values('product_id').annotate(last=Max('sale__created_at')).values_list('product_id', 'last')
+    )
+
+    fields = list(WINDOWS) + ['last_sold_at']
+    changed = []
+    with transaction.atomic():
+        for product in Product.objects.only('id', *fields).iterator(chunk_size=batch_size):
+            values = stats.get(product.pk, {})
+            values = {field: values.get(field, 0) for field in WINDOWS}
+            values['last_sold_at'] = last_sold.get(product.pk)
+            if any(getattr(product, field) != value for field, value in values.items()):
+                for field, value in values.items():
+                    setattr(product, field, value)
+                changed.append(product)
+        Product.objects.bulk_update(changed, fields, batch_size=batch_size)
+    return len(changed)
@@ -0,0 +1,36 @@
+"""
+Cache version tokens
+
+Cached report values are keyed by the current token of each topic they
+read. `bump` replaces a topic's token after the current transaction
+commits, so every cached value built from the old data stops being found
+and ages out of the cache on its own.
+"""
+from django.core.cache import cache
+from django.db import transaction
+import uuid
+
+PREFIX = 'version'
+
+
+def bump(*topics):
+    """Give `topics` new tokens once the current transaction commits"""
+    def apply():
+        token = uuid.uuid4().hex
+        cache.set_many({_key(topic): token for topic in topics}, timeout=None)
+    transaction.on_commit(apply)
+
+
+def current(topics):
+    """{topic: token} for `topics`, with one cache read"""
+    keys = {topic: _key(topic) for topic in topics}
+    found = cache.get_many(keys.values())
+    for key in keys.values():
+        if key not in found:
+            cache.add(key, uuid.uuid4().hex, timeout=None)
+            found[key] = cache.get(key)
+    return {topic: found[key] for topic, key in keys.items()}
+
+
+def _key(topic):
+    return f'{PREFIX}:{topic}'
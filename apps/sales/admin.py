@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Sale, SaleItem
+from .models import Sale, SaleItem, InvoiceJob
 
 
 class SaleItemInline(admin.TabularInline):
@@ -15,3 +15,11 @@ class SaleAdmin(admin.ModelAdmin):
     search_fields = ['code', 'customer__name']
     readonly_fields = ['code', 'created_at', 'updated_at']
     inlines = [SaleItemInline]
+
+
+@admin.register(InvoiceJob)
+class InvoiceJobAdmin(admin.ModelAdmin):
+    list_display = ['sale', 'status', 'attempts', 'pdf_ms', 'png_ms', 'render_ms', 'created_at', 'finished_at']
+    list_filter = ['status', 'created_at']
+    search_fields = ['sale__code']
+    readonly_fields = ['created_at', 'started_at', 'finished_at']
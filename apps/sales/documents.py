@@ -0,0 +1,83 @@
+"""
+Sale Document - single-load snapshot shared by receipt renderers
+"""
+from dataclasses import dataclass
+from decimal import Decimal
+from django.db.models import Prefetch
+from django.http import Http404
+from .models import Sale, SaleItem
+
+
+DEFAULT_WHATSAPP_TEMPLATE = (
+    'Gracias por su compra\nVenta: {{code}}\nCliente: {{customer}}\nProductos:\n{{items}}\nTOTAL: S/ {{total}}'
+)
+
+
+@dataclass(frozen=True)
+class SaleLine:
+    """One receipt line, detached from the ORM"""
+    product_id: int
+    product_code: str
+    product_name: str
+    quantity: int
+    unit_price: Decimal
+    subtotal: Decimal
+
+
+@dataclass(frozen=True)
+class SaleDocument:
+    """
+    Everything needed to print or share a sale.
+
+    Built once with the sale, customer, seller and lines (which carry the
+    product snapshot) loaded together, so the PDF, PNG and WhatsApp
+    renderers (and SaleDetailView) never touch the database again.
+    """
+    sale: Sale
+    lines: tuple
+    whatsapp_template: str
+
+    @classmethod
+    def load(cls, sale_id):
+        from apps.accounts.models import WhatsAppTemplate
+        items = SaleItem.objects.order_by('id')
+        try:
+            sale = Sale.objects.select_related('customer', 'seller').prefetch_related(
+                Prefetch('items', queryset=items)
+            ).get(pk=sale_id)
+        except Sale.DoesNotExist:
+            raise Http404('Venta no encontrada')
+        lines = tuple(
+            SaleLine(
+                product_id=item.product_id,
+                product_code=item.product_code,
+                product_name=item.product_name,
+                quantity=item.quantity,
+                unit_price=item.unit_price,
+                subtotal=item.subtotal,
+            )
+            for item in sale.items.all()
+        )
+        template = WhatsAppTemplate.get_content('SALE_MESSAGE', DEFAULT_WHATSAPP_TEMPLATE)
+        return cls(sale=sale, lines=lines, whatsapp_template=template)
+
+    @property
+    def code(self):
+        return self.sale.code
+
+    @property
+    def created_at(self):
+        return self.sale.created_at
+
+    @property
+    def total(self):
+        return self.sale.total
+
+    @property
+    def customer_name(self):
+        return self.sale.customer.name if self.sale.customer else 'Cliente General'
+
+    @property
+    def customer_phone(self):
+        phone = self.sale.customer.phone if self.sale.customer and self.sale.customer.phone else ''
+        return ''.join(ch for ch in phone if ch.isdigit())
@@ -0,0 +1,85 @@
+"""
+Idempotent sale submission
+
+POS clients send an Idempotency-Key header (or `idempotency_key` in the
+payload) and reuse it on every retry of the same cart. The key row is
+inserted in the same transaction as the sale, so a retry either finds the
+stored response and replays it without touching stock, or (if the first
+attempt rolled back) runs the checkout again.
+"""
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from datetime import timedelta
+from .models import IdempotencyKey
+import hashlib
+import json
+
+# Client bookkeeping that may differ between retries of the same cart
+CLIENT_FIELDS = {'idempotency_key', 'queued_at'}
+
+
+def request_key(request, data):
+    """Client supplied key, if any"""
+    key = request.headers.get('Idempotency-Key') or data.get('idempotency_key') or ''
+    return str(key).strip()[:64]
+
+
+def request_fingerprint(data):
+    """Stable hash of the payload, to reject a key reused for a different cart"""
+    payload = {k: v for k, v in data.items() if k not in CLIENT_FIELDS}
+    raw = json.dumps(payload, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+def expiry_cutoff():
+    return timezone.now() - timedelta(hours=settings.IDEMPOTENCY_KEY_TTL_HOURS)
+
+
+def replay(record, fingerprint):
+    """(payload, status_code) stored for a key, or a 422 if the cart differs"""
+    if record.request_hash != fingerprint:
+        return {
+            'success': False,
+            'error': 'La clave de idempotencia ya se usó con otra venta'
+        }, 422
+    return record.response, record.status_code
+
+
+def claim(key, user, fingerprint):
+    """
+    Insert the key row inside the caller's transaction.
+
+    Keys are scoped to the user. Returns (record, None) when this request
+    owns the key, or (None, previous) with the stored row when an earlier
+    attempt of the same user already committed. On PostgreSQL a concurrent
+    duplicate blocks on the unique index until the first attempt commits
+    or rolls back.
+    """
+    IdempotencyKey.objects.filter(user=user, key=key, created_at__lt=expiry_cutoff()).delete()
+    try:
+        with transaction.atomic():
+            record = IdempotencyKey.objects.create(key=key, user=user, request_hash=fingerprint)
+        return record, None
+    except IntegrityError:
+        return None, IdempotencyKey.objects.get(user=user, key=key)
+
+
+def store(record, sale, payload, status_code=200):
+    record.sale = sale
+    record.response = payload
+    record.status_code = status_code
+    record.save(update_fields=['sale', 'response', 'status_code'])
+
+
+def purge_expired(batch_size=1000):
+    """Delete expired keys in batches; returns how many were removed"""
+    removed = 0
+    cutoff = expiry_cutoff()
+    while True:
+        ids = list(
+            IdempotencyKey.objects.filter(created_at__lt=cutoff).values_list('pk', flat=True)[:batch_size]
+        )
+        if not ids:
+            return removed
+        removed += IdempotencyKey.objects.filter(pk__in=ids).delete()[0]
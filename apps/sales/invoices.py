@@ -0,0 +1,345 @@
+"""
+Invoice rendering - PDF/PNG receipts and the local render queue
+
+Receipts are rendered outside the checkout transaction: the sale enqueues an
+InvoiceJob row and a worker (an in-process thread after commit, or the
+run_invoice_worker command) claims and renders it. The POS polls the
+invoice status endpoint until the files are ready.
+"""
+from django.conf import settings
+from django.db import transaction, connection
+from django.db.models import F
+from django.utils import timezone
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfgen import canvas
+from reportlab.lib.units import mm
+from PIL import Image, ImageDraw, ImageFont
+from datetime import timedelta
+from .models import InvoiceJob
+from .documents import SaleDocument
+from functools import lru_cache
+import logging
+import math
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+# Receipt layout shared by the PDF and PNG renderers
+BRAND_NAME = "Kelvin Repuestos"
+CONTACT_LINE = "Teléfono: 987654321 | Dirección: Av. Principal 123"
+BRAND_RGB = (43, 76, 126)
+ACCENT_RGB = (60, 106, 163)
+TEXT_RGB = (28, 28, 28)
+PNG_BACKGROUND = (245, 247, 248)
+PNG_WIDTH = 800
+PNG_MIN_HEIGHT = 1100
+PNG_HEADER_HEIGHT = 100
+PNG_ROW_HEIGHT = 26
+PNG_COLORS = 64
+FONT_CANDIDATES = {
+    'regular': ['arial.ttf', 'DejaVuSans.ttf', 'LiberationSans-Regular.ttf'],
+    'bold': ['arialbd.ttf', 'DejaVuSans-Bold.ttf', 'LiberationSans-Bold.ttf'],
+}
+
+
+def _rgb(color):
+    return tuple(v / 255 for v in color)
+
+
+@lru_cache(maxsize=None)
+def _wheel_spokes(cx, cy, r, inner):
+    """Line segments of the wheel logo (8 spokes), computed once per size"""
+    spokes = []
+    for i in range(8):
+        ang = i * (math.pi / 4)
+        spokes.append((
+            cx + inner * math.cos(ang), cy + inner * math.sin(ang),
+            cx + r * math.cos(ang), cy + r * math.sin(ang),
+        ))
+    return tuple(spokes)
+
+
+def _pdf_header_form(c, w, h, header_h):
+    """Draw the header band, logo and branding once per document as a reusable form"""
+    name = 'receipt_header'
+    c.beginForm(name)
+    c.setFillColorRGB(*_rgb(BRAND_RGB))
+    c.rect(0, h-header_h, w, header_h, fill=1, stroke=0)
+    c.setFillColorRGB(1, 1, 1)
+    # Logo ruedita (blanco) en header
+    cx = 12*mm; cy = h - header_h/2; r = 6*mm
+    c.setLineWidth(2)
+    c.setStrokeColorRGB(1, 1, 1)
+    c.circle(cx, cy, r)
+    for x1, y1, x2, y2 in _wheel_spokes(cx, cy, r, r - 3):
+        c.line(x1, y1, x2, y2)
+    # Marca
+    c.setFont("Helvetica-Bold", 18)
+    c.drawString(22*mm, h-header_h+7*mm, BRAND_NAME)
+    c.endForm()
+    return name
+
+
+def generate_invoice_pdf(doc):
+    media_dir = os.path.join(settings.MEDIA_ROOT, 'invoices')
+    os.makedirs(media_dir, exist_ok=True)
+    pdf_path = os.path.join(media_dir, f"{doc.code}.pdf")
+    c = canvas.Canvas(pdf_path, pagesize=A4)
+    w, h = A4
+    header_h = 22*mm
+    header = _pdf_header_form(c, w, h, header_h)
+
+    def start_page():
+        c.doForm(header)
+        c.setFillColorRGB(*_rgb(ACCENT_RGB))
+        c.setFont("Helvetica-Bold", 13)
+
+    c.doForm(header)
+    c.setFillColorRGB(0, 0, 0)
+    c.setFont("Helvetica", 10)
+    c.drawString(22*mm, h-header_h-1*mm, CONTACT_LINE)
+    y = h - header_h - 12*mm
+    c.setFont("Helvetica", 11)
+    c.drawString(20*mm, y, f"Fecha: {doc.created_at.strftime('%d/%m/%Y %H:%M')}")
+    y -= 6*mm
+    c.drawString(20*mm, y, f"Cliente: {doc.customer_name}")
+    y -= 6*mm
+    c.drawString(20*mm, y, f"Venta: {doc.code}")
+    y -= 10*mm
+    c.setFont("Helvetica-Bold", 13)
+    c.setFillColorRGB(*_rgb(ACCENT_RGB))
+    c.drawString(20*mm, y, "Productos")
+    c.setFillColorRGB(0, 0, 0)
+    y -= 8*mm
+    c.setFont("Helvetica", 11)
+    for item in doc.lines:
+        left_text = f"{item.product_name}"
+        right_text = f"{item.quantity} x S/ {item.unit_price:.2f} = S/ {item.subtotal:.2f}"
+        c.drawString(20*mm, y, left_text)
+        c.drawRightString(w-20*mm, y, right_text)
+        y -= 6*mm
+        if y < 30*mm:
+            c.showPage()
+            start_page()
+            y = h - header_h - 12*mm
+            c.drawString(20*mm, y, "Productos")
+            c.setFillColorRGB(0, 0, 0)
+            y -= 8*mm
+            c.setFont("Helvetica", 11)
+    y -= 10*mm
+    c.setFont("Helvetica-Bold", 14)
+    c.setFillColorRGB(*_rgb(BRAND_RGB))
+    c.drawRightString(w-20*mm, y, f"TOTAL: S/ {doc.total:.2f}")
+    c.save()
+    return os.path.join(settings.MEDIA_URL, 'invoices', f"{doc.code}.pdf")
+
+
+@lru_cache(maxsize=None)
+def _png_font(style, size):
+    """Load a TrueType font once per process, falling back to Pillow's bundled font"""
+    for name in FONT_CANDIDATES[style]:
+        try:
+            return ImageFont.truetype(name, size)
+        except OSError:
+            continue
+    return ImageFont.load_default(size)
+
+
+@lru_cache(maxsize=None)
+def _png_header_tile():
+    """Pre-rendered header band with logo and branding, pasted into every PNG"""
+    tile = Image.new('RGB', (PNG_WIDTH, PNG_HEADER_HEIGHT), color=BRAND_RGB)
+    draw = ImageDraw.Draw(tile)
+    # Logo ruedita
+    cx, cy, r = 40, 50, 20
+    draw.ellipse([cx-r, cy-r, cx+r, cy+r], outline=(255,255,255), width=3)
+    for x1, y1, x2, y2 in _wheel_spokes(cx, cy, r, r - 6):
+        draw.line([int(x1), int(y1), int(x2), int(y2)], fill=(255,255,255), width=3)
+    # Marca y contacto
+    draw.text((80, 30), BRAND_NAME, fill=(255,255,255), font=_png_font('regular', 30))
+    draw.text((80, 68), CONTACT_LINE, fill=(255,255,255), font=_png_font('regular', 20))
+    return tile
+
+
+@lru_cache(maxsize=None)
+def _png_palette():
+    """
+    Fixed palette for receipt PNGs, built once per process from a sample render.
+
+    Receipts only use a handful of flat colors plus anti-aliased text, so
+    mapping onto a precomputed palette keeps files several times smaller than
+    RGB output without paying for a per-image color search.
+    """
+    sample = Image.new('RGB', (PNG_WIDTH, 200), color=PNG_BACKGROUND)
+    sample.paste(_png_header_tile(), (0, 0))
+    draw = ImageDraw.Draw(sample)
+    draw.text((40, 110), "Productos 0123456789 S/ TOTAL", fill=TEXT_RGB, font=_png_font('regular', 20))
+    draw.text((40, 140), "Productos", fill=ACCENT_RGB, font=_png_font('bold', 22))
+    draw.text((520, 170), "TOTAL: S/ 0.00", fill=BRAND_RGB, font=_png_font('bold', 22))
+    return sample.quantize(colors=PNG_COLORS, method=Image.Quantize.MEDIANCUT)
+
+
+def generate_invoice_png(doc):
+    media_dir = os.path.join(settings.MEDIA_ROOT, 'invoices')
+    os.makedirs(media_dir, exist_ok=True)
+    img_path = os.path.join(media_dir, f"{doc.code}.png")
+    height = max(PNG_MIN_HEIGHT, 130 + 88 + len(doc.lines) * PNG_ROW_HEIGHT + 80)
+    img = Image.new('RGB', (PNG_WIDTH, height), color=PNG_BACKGROUND)
+    img.paste(_png_header_tile(), (0, 0))
+    draw = ImageDraw.Draw(img)
+    font_text = _png_font('regular', 20)
+    font_bold = _png_font('bold', 22)
+    y = 130
+    draw.text((40, y), f"Fecha: {doc.created_at.strftime('%d/%m/%Y %H:%M')}", fill=TEXT_RGB, font=font_text)
+    y += 26
+    draw.text((40, y), f"Cliente: {doc.customer_name}", fill=TEXT_RGB, font=font_text)
+    y += 26
+    draw.text((40, y), f"Venta: {doc.code}", fill=TEXT_RGB, font=font_text)
+    y += 34
+    draw.text((40, y), "Productos", fill=ACCENT_RGB, font=font_bold)
+    y += 28
+    for item in doc.lines:
+        left = f"{item.product_name}"
+        right = f"{item.quantity} x S/ {item.unit_price:.2f} = S/ {item.subtotal:.2f}"
+        draw.text((40, y), left, fill=TEXT_RGB, font=font_text)
+        draw.text((520, y), right, fill=TEXT_RGB, font=font_text)
+        y += PNG_ROW_HEIGHT
+    y += 22
+    draw.text((520, y), f"TOTAL: S/ {doc.total:.2f}", fill=BRAND_RGB, font=font_bold)
+    img.quantize(palette=_png_palette(), dither=Image.Dither.NONE).save(img_path)
+    return os.path.join(settings.MEDIA_URL, 'invoices', f"{doc.code}.png")
+
+def generate_whatsapp_text_url(doc):
+    from urllib.parse import quote
+    items_text = '\n'.join([
+        f"- {item.product_name} x {item.quantity} = S/ {item.subtotal}" for item in doc.lines
+    ])
+    text_raw = doc.whatsapp_template.replace('{{code}}', doc.code)
+    text_raw = text_raw.replace('{{customer}}', doc.customer_name)
+    text_raw = text_raw.replace('{{items}}', items_text)
+    text_raw = text_raw.replace('{{total}}', str(doc.total))
+    text = quote(text_raw)
+    if doc.customer_phone:
+        return f"https://wa.me/{doc.customer_phone}?text={text}"
+    return f"https://wa.me/?text={text}"
+
+
+def enqueue_invoice(sale):
+    """
+    Queue receipt rendering for a sale, or queue it again if the worker
+    rendering it died; the in-process worker starts once the job commits.
+    """
+    job, _ = InvoiceJob.objects.get_or_create(sale=sale)
+    if job.status == InvoiceJob.Status.RUNNING and requeue_stale_jobs():
+        job.refresh_from_db()
+    if job.status == InvoiceJob.Status.PENDING and settings.INVOICE_WORKER_IN_PROCESS:
+        transaction.on_commit(start_background_worker)
+    return job
+
+
+def render_invoice(job):
+    """Render the PDF and PNG receipts of a claimed job and record timings"""
+    try:
+        start = time.perf_counter()
+        doc = SaleDocument.load(job.sale_id)
+        job.invoice_pdf_url = generate_invoice_pdf(doc)
+        pdf_done = time.perf_counter()
+        job.invoice_png_url = generate_invoice_png(doc)
+        png_done = time.perf_counter()
+        job.pdf_ms = int((pdf_done - start) * 1000)
+        job.png_ms = int((png_done - pdf_done) * 1000)
+        job.render_ms = job.pdf_ms + job.png_ms
+        job.status = InvoiceJob.Status.DONE
+        job.error = ''
+    except Exception as e:
+        logger.exception('Invoice rendering failed for sale %s', job.sale_id)
+        job.status = (
+            InvoiceJob.Status.FAILED if job.attempts >= InvoiceJob.MAX_ATTEMPTS
+            else InvoiceJob.Status.PENDING
+        )
+        job.error = str(e)
+    job.finished_at = timezone.now()
+    job.save(update_fields=[
+        'status', 'invoice_pdf_url', 'invoice_png_url', 'pdf_ms', 'png_ms',
+        'render_ms', 'error', 'finished_at'
+    ])
+    return job
+
+
+def claim_next_job():
+    """
+    Claim the oldest pending job.
+
+    The claim is a conditional UPDATE on the status column, so several
+    workers can poll the same table without a broker or row locks.
+    """
+    while True:
+        job = InvoiceJob.objects.filter(status=InvoiceJob.Status.PENDING).order_by('created_at').first()
+        if job is None:
+            return None
+        claimed = InvoiceJob.objects.filter(pk=job.pk, status=InvoiceJob.Status.PENDING).update(
+            status=InvoiceJob.Status.RUNNING,
+            started_at=timezone.now(),
+            attempts=F('attempts') + 1
+        )
+        if claimed:
+            return InvoiceJob.objects.get(pk=job.pk)
+
+
+def requeue_stale_jobs(timeout=timedelta(minutes=5)):
+    """Put back jobs whose worker died while rendering"""
+    return InvoiceJob.objects.filter(
+        status=InvoiceJob.Status.RUNNING,
+        started_at__lt=timezone.now() - timeout
+    ).update(status=InvoiceJob.Status.PENDING)
+
+
+def run_pending_jobs(limit=None):
+    """Render queued jobs until the queue is empty (or `limit` jobs); returns the count"""
+    done = 0
+    while limit is None or done < limit:
+        job = claim_next_job()
+        if job is None:
+            break
+        render_invoice(job)
+        done += 1
+    return done
+
+
+_worker_lock = threading.Lock()
+_worker_thread = None
+_worker_pending = False
+
+
+def start_background_worker():
+    """Drain the queue in a daemon thread of the current process"""
+    global _worker_thread, _worker_pending
+    with _worker_lock:
+        if _worker_thread is not None:
+            _worker_pending = True
+            return
+        _worker_thread = threading.Thread(target=_background_worker, name='invoice-worker', daemon=True)
+        _worker_thread.start()
+
+
+def _background_worker():
+    global _worker_thread, _worker_pending
+    try:
+        while True:
+            # Jobs left RUNNING by a web process that was restarted or killed
+            requeue_stale_jobs()
+            run_pending_jobs()
+            with _worker_lock:
+                if not _worker_pending:
+                    _worker_thread = None
+                    break
+                _worker_pending = False
+    except Exception:
+        logger.exception('Invoice worker stopped')
+        with _worker_lock:
+            _worker_thread = None
+    finally:
+        connection.close()
@@ -0,0 +1,79 @@
+"""
+Management command to benchmark the checkout engine
+"""
+from django.core.management.base import BaseCommand
+from django.contrib.auth import get_user_model
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from apps.products.models import Category, Product
+from apps.suppliers.models import Supplier
+from apps.sales.services import process_sale
+from decimal import Decimal
+import statistics
+import time
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Benchmark checkout query count and latency by cart size (data is rolled back)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='1,10,50,200', help='Cart sizes, comma separated')
+        parser.add_argument('--runs', type=int, default=30, help='Checkouts per cart size')
+
+    def handle(self, *args, **options):
+        sizes = [int(s) for s in options['sizes'].split(',') if s.strip()]
+        runs = options['runs']
+
+        with transaction.atomic():
+            products = self.create_fixtures(max(sizes))
+            seller = User.objects.create_user(username='bench-checkout', password=None)
+
+            self.stdout.write(f"{'lines':>6} {'queries':>8} {'p50 ms':>9} {'p95 ms':>9}")
+            for size in sizes:
+                cart = {
+                    'items': [
+                        {'product_id': p.id, 'quantity': 1, 'price': str(p.sale_price)}
+                        for p in products[:size]
+                    ],
+                    'subtotal': str(sum(p.sale_price for p in products[:size])),
+                    'total': str(sum(p.sale_price for p in products[:size])),
+                    'payment_method': 'CASH',
+                }
+                timings = []
+                queries = 0
+                for _ in range(runs):
+                    sid = transaction.savepoint()
+                    with CaptureQueriesContext(connection) as ctx:
+                        start = time.perf_counter()
+                        process_sale(seller, cart)
+                        timings.append((time.perf_counter() - start) * 1000)
+                    queries = len(ctx.captured_queries)
+                    transaction.savepoint_rollback(sid)
+                p50 = statistics.median(timings)
+                p95 = statistics.quantiles(timings, n=20)[-1] if len(timings) > 1 else timings[0]
+                self.stdout.write(f'{size:>6} {queries:>8} {p50:>9.2f} {p95:>9.2f}')
+
+            transaction.set_rollback(True)
+
+    def create_fixtures(self, count):
+        category = Category.objects.create(name='__bench_checkout__')
+        supplier = Supplier.objects.create(
+            name='Bench', ruc='00000000000', phone='000000000', address='-'
+        )
+        Product.objects.bulk_create([
+            Product(
+                code=f'BENCH-{i:06d}',
+                name=f'Producto benchmark {i}',
+                category=category,
+                presentation='Unidad',
+                purchase_price=Decimal('5.00'),
+                average_cost=Decimal('5.00'),
+                sale_price=Decimal('8.00'),
+                stock=1_000_000,
+                supplier=supplier,
+            )
+            for i in range(count)
+        ])
+        return list(Product.objects.filter(category=category).order_by('id'))
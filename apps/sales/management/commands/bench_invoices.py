@@ -0,0 +1,96 @@
+"""
+Management command to benchmark PDF/PNG receipt rendering
+"""
+from django.core.management.base import BaseCommand
+from django.contrib.auth import get_user_model
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.test.utils import override_settings
+from apps.products.models import Category, Product
+from apps.suppliers.models import Supplier
+from apps.sales.models import Sale, SaleItem
+from apps.sales import invoices
+from apps.sales.documents import SaleDocument
+from decimal import Decimal
+import tempfile
+import time
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Benchmark invoices per second for receipts of 5 and 100 lines (data is rolled back)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lines', default='5,100', help='Receipt sizes, comma separated')
+        parser.add_argument('--runs', type=int, default=20, help='Renders per size and format')
+
+    def handle(self, *args, **options):
+        sizes = [int(s) for s in options['lines'].split(',') if s.strip()]
+        runs = options['runs']
+
+        with tempfile.TemporaryDirectory() as media_root, override_settings(MEDIA_ROOT=media_root):
+            with transaction.atomic():
+                seller = User.objects.create_user(username='bench-invoices', password=None)
+                products = self.create_products(max(sizes))
+                self.stdout.write(f"{'lines':>6} {'PDF/s':>8} {'PNG/s':>8} {'PNG KB':>8} {'queries':>8}")
+                for size in sizes:
+                    sale = self.create_sale(seller, products[:size])
+                    load = lambda: SaleDocument.load(sale.id)
+                    pdf_rate = self.rate(lambda: invoices.generate_invoice_pdf(load()), runs)
+                    png_rate = self.rate(lambda: invoices.generate_invoice_png(load()), runs)
+                    png_kb = self.png_size(media_root, sale) / 1024
+                    queries = self.count_queries(sale)
+                    self.stdout.write(f'{size:>6} {pdf_rate:>8.1f} {png_rate:>8.1f} {png_kb:>8.1f} {queries:>8}')
+                transaction.set_rollback(True)
+
+    def rate(self, render, runs):
+        render()  # warm up
+        start = time.perf_counter()
+        for _ in range(runs):
+            render()
+        return runs / (time.perf_counter() - start)
+
+    def count_queries(self, sale):
+        """Queries needed to produce every artifact (PDF, PNG, WhatsApp) for a sale"""
+        with CaptureQueriesContext(connection) as ctx:
+            doc = SaleDocument.load(sale.id)
+            invoices.generate_invoice_pdf(doc)
+            invoices.generate_invoice_png(doc)
+            invoices.generate_whatsapp_text_url(doc)
+        return len(ctx.captured_queries)
+
+    def png_size(self, media_root, sale):
+        import os
+        return os.path.getsize(os.path.join(media_root, 'invoices', f'{sale.code}.png'))
+
+    def create_products(self, count):
+        category = Category.objects.create(name='__bench_invoices__')
+        supplier = Supplier.objects.create(
+            name='Bench', ruc='00000000001', phone='000000000', address='-'
+        )
+        Product.objects.bulk_create([
+            Product(
+                code=f'BENCHI-{i:05d}',
+                name=f'Repuesto de prueba número {i}',
+                category=category,
+                presentation='Unidad',
+                purchase_price=Decimal('5.00'),
+                average_cost=Decimal('5.00'),
+                sale_price=Decimal('8.50'),
+                stock=100,
+                supplier=supplier,
+            )
+            for i in range(count)
+        ])
+        return list(Product.objects.filter(category=category).order_by('id'))
+
+    def create_sale(self, seller, products):
+        total = sum(p.sale_price * 2 for p in products)
+        sale = Sale.objects.create(seller=seller, subtotal=total, total=total)
+        SaleItem.objects.bulk_create([
+            SaleItem(sale=sale, product=p, quantity=2, unit_price=p.sale_price, subtotal=p.sale_price * 2,
+                     product_code=p.code, product_name=p.name, unit_cost=p.average_cost)
+            for p in products
+        ])
+        return sale
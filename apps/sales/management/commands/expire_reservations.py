@@ -0,0 +1,28 @@
+"""
+Management command to expire reservations past their expires_at
+"""
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from apps.sales.reservations import expire_reservations
+import time
+
+
+class Command(BaseCommand):
+    help = 'Expire open reservations past their expires_at and release their reserved stock'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Reservations expired per transaction')
+        parser.add_argument('--loop', action='store_true', help='Keep sweeping instead of exiting after one pass')
+        parser.add_argument('--interval', type=float, default=60.0, help='Seconds between sweeps with --loop')
+
+    def handle(self, *args, **options):
+        while True:
+            close_old_connections()
+            expired, units = expire_reservations(batch_size=options['batch_size'])
+            if expired or not options['loop']:
+                self.stdout.write(self.style.SUCCESS(
+                    f'✓ {expired} reservations expired, {units} units released'
+                ))
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,16 @@
+"""
+Management command to delete expired idempotency keys
+"""
+from django.core.management.base import BaseCommand
+from apps.sales.idempotency import purge_expired
+
+
+class Command(BaseCommand):
+    help = 'Delete idempotency keys older than IDEMPOTENCY_KEY_TTL_HOURS'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        removed = purge_expired(options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'✓ {removed} expired keys deleted'))
@@ -0,0 +1,47 @@
+"""
+Management command to render queued invoices
+"""
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from django.db.models import Avg, Max
+from apps.sales.invoices import run_pending_jobs, requeue_stale_jobs
+from apps.sales.models import InvoiceJob
+import time
+
+
+class Command(BaseCommand):
+    help = 'Render queued invoice PDF/PNG receipts (DB-backed queue, no broker)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Drain the queue once and exit')
+        parser.add_argument('--interval', type=float, default=1.0, help='Seconds between polls')
+        parser.add_argument('--stats', action='store_true', help='Print render time statistics and exit')
+
+    def handle(self, *args, **options):
+        if options['stats']:
+            return self.print_stats()
+
+        self.stdout.write('Invoice worker started')
+        while True:
+            close_old_connections()
+            requeue_stale_jobs()
+            done = run_pending_jobs()
+            if done:
+                self.stdout.write(f'✓ {done} invoices rendered')
+            if options['once']:
+                break
+            time.sleep(options['interval'])
+
+    def print_stats(self):
+        stats = InvoiceJob.objects.filter(status=InvoiceJob.Status.DONE).aggregate(
+            avg_pdf=Avg('pdf_ms'), avg_png=Avg('png_ms'),
+            avg_total=Avg('render_ms'), max_total=Max('render_ms')
+        )
+        for status, label in InvoiceJob.Status.choices:
+            count = InvoiceJob.objects.filter(status=status).count()
+            self.stdout.write(f'{label}: {count}')
+        if stats['avg_total'] is not None:
+            self.stdout.write(
+                f"Render ms - PDF avg {stats['avg_pdf']:.0f}, PNG avg {stats['avg_png']:.0f}, "
+                f"total avg {stats['avg_total']:.0f}, max {stats['max_total']}"
+            )
@@ -0,0 +1,168 @@
+"""
+Management command to stress concurrent sales and reservations on hot products
+"""
+from django.core.management.base import BaseCommand
+from django.contrib.auth import get_user_model
+from django.db import connection, close_old_connections, DatabaseError
+from django.db.models import Sum
+from apps.products.models import Category, Product
+from apps.products.stock import InsufficientStock
+from apps.suppliers.models import Supplier
+from apps.customers.models import Customer
+from apps.purchases.models import StockMovement
+from apps.sales.models import Sale, SaleItem, Reservation
+from apps.sales.services import process_sale, CheckoutError
+from decimal import Decimal
+import random
+import threading
+import time
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Fire concurrent sales and reservations at a few hot products and verify final stock'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=8, help='Concurrent terminals')
+        parser.add_argument('--ops', type=int, default=100, help='Operations per terminal')
+        parser.add_argument('--products', type=int, default=3, help='Number of hot products')
+        parser.add_argument('--stock', type=int, default=200, help='Initial stock per product')
+        parser.add_argument('--reserve-ratio', type=float, default=0.3, help='Share of operations that are reservations')
+        parser.add_argument('--seed', type=int, default=None)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        fixtures = self.create_fixtures(options['products'], options['stock'])
+        product_ids = [p.id for p in fixtures['products']]
+        counters = {'ok': 0, 'rejected': 0, 'conflicts': 0, 'errors': 0}
+        lock = threading.Lock()
+
+        def terminal(seed):
+            local = random.Random(seed)
+            for _ in range(options['ops']):
+                outcome = self.run_operation(local, fixtures, product_ids, options['reserve_ratio'])
+                with lock:
+                    counters[outcome] += 1
+            connection.close()
+
+        threads = [
+            threading.Thread(target=terminal, args=(rng.random(),))
+            for _ in range(options['threads'])
+        ]
+        start = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        elapsed = time.perf_counter() - start
+        close_old_connections()
+
+        total = sum(counters.values())
+        self.stdout.write(f'Database: {connection.vendor}')
+        self.stdout.write(f"Operations: {total} in {elapsed:.2f}s ({total / elapsed:.1f} ops/s)")
+        self.stdout.write(
+            f"Committed: {counters['ok']}  Rejected (no stock): {counters['rejected']}  "
+            f"Conflicts: {counters['conflicts']} ({counters['conflicts'] / total:.1%})  "
+            f"Errors: {counters['errors']}"
+        )
+        ok = self.verify(fixtures, options['stock'])
+        self.cleanup(fixtures)
+        if ok:
+            self.stdout.write(self.style.SUCCESS('✓ Final stock is consistent'))
+        else:
+            self.stdout.write(self.style.ERROR('✗ Final stock is inconsistent'))
+
+    def run_operation(self, rng, fixtures, product_ids, reserve_ratio):
+        try:
+            if rng.random() < reserve_ratio:
+                Reservation.objects.create(
+                    product_id=rng.choice(product_ids),
+                    customer=fixtures['customer'],
+                    quantity=rng.randint(1, 3),
+                    status=Reservation.Status.RESERVED,
+                    created_by=fixtures['seller'],
+                )
+            else:
+                # Carts list products in random order to exercise lock ordering
+                cart = rng.sample(product_ids, rng.randint(1, len(product_ids)))
+                items = [
+                    {'product_id': pk, 'quantity': rng.randint(1, 3), 'price': '1.00'}
+                    for pk in cart
+                ]
+                total = str(sum(i['quantity'] for i in items))
+                process_sale(fixtures['seller'], {
+                    'items': items,
+                    'subtotal': total,
+                    'total': total,
+                    'payment_method': 'CASH',
+                    'customer_id': fixtures['customer'].id if rng.random() < 0.5 else None,
+                })
+            return 'ok'
+        except (CheckoutError, InsufficientStock):
+            return 'rejected'
+        except DatabaseError:
+            # Lock timeouts, deadlocks and SQLite "database is locked"
+            return 'conflicts'
+        except Exception:
+            return 'errors'
+
+    def verify(self, fixtures, initial_stock):
+        ok = True
+        for product in Product.objects.filter(category=fixtures['category']).order_by('id'):
+            sold = SaleItem.objects.filter(product=product).aggregate(q=Sum('quantity'))['q'] or 0
+            reserved = Reservation.objects.filter(
+                product=product, status=Reservation.Status.RESERVED
+            ).aggregate(q=Sum('quantity'))['q'] or 0
+            consistent = (
+                product.stock == initial_stock - sold
+                and product.reserved_stock == reserved
+                and 0 <= product.reserved_stock <= product.stock
+            )
+            ok = ok and consistent
+            self.stdout.write(
+                f'  {product.code}: stock={product.stock} (expected {initial_stock - sold}) '
+                f'reserved={product.reserved_stock} (expected {reserved}) '
+                f"{'OK' if consistent else 'MISMATCH'}"
+            )
+        return ok
+
+    def create_fixtures(self, count, stock):
+        tag = f'{int(time.time())}'
+        category = Category.objects.create(name=f'__stress_{tag}__')
+        supplier = Supplier.objects.create(
+            name='Stress', ruc=tag[-11:].rjust(11, '9'), phone='000000000', address='-'
+        )
+        products = [
+            Product.objects.create(
+                code=f'STRESS-{tag[-6:]}-{i}',
+                name=f'Producto stress {i}',
+                category=category,
+                presentation='Unidad',
+                purchase_price=Decimal('0.50'),
+                average_cost=Decimal('0.50'),
+                sale_price=Decimal('1.00'),
+                stock=stock,
+                supplier=supplier,
+            )
+            for i in range(count)
+        ]
+        return {
+            'category': category,
+            'supplier': supplier,
+            'products': products,
+            'seller': User.objects.create_user(username=f'stress-{tag}', password=None),
+            'customer': Customer.objects.create(dni=tag[-8:], name='Cliente stress', phone=''),
+        }
+
+    def cleanup(self, fixtures):
+        products = Product.objects.filter(category=fixtures['category'])
+        sale_ids = SaleItem.objects.filter(product__in=products).values_list('sale_id', flat=True)
+        StockMovement.objects.filter(product__in=products).delete()
+        Sale.objects.filter(pk__in=list(sale_ids)).delete()
+        Reservation.objects.filter(product__in=products).delete()
+        products.delete()
+        fixtures['category'].delete()
+        fixtures['supplier'].delete()
+        fixtures['customer'].delete()
+        fixtures['seller'].delete()
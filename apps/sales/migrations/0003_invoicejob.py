@@ -0,0 +1,38 @@
+# Generated by Django 5.0.1 on 2026-10-18 02:41
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales', '0002_reservation'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InvoiceJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('PENDING', 'Pendiente'), ('RUNNING', 'Procesando'), ('DONE', 'Listo'), ('FAILED', 'Fallido')], default='PENDING', max_length=10, verbose_name='Estado')),
+                ('attempts', models.PositiveSmallIntegerField(default=0, verbose_name='Intentos')),
+                ('invoice_pdf_url', models.CharField(blank=True, max_length=255, verbose_name='PDF')),
+                ('invoice_png_url', models.CharField(blank=True, max_length=255, verbose_name='PNG')),
+                ('pdf_ms', models.PositiveIntegerField(blank=True, null=True, verbose_name='Tiempo PDF (ms)')),
+                ('png_ms', models.PositiveIntegerField(blank=True, null=True, verbose_name='Tiempo PNG (ms)')),
+                ('render_ms', models.PositiveIntegerField(blank=True, null=True, verbose_name='Tiempo total (ms)')),
+                ('error', models.TextField(blank=True, verbose_name='Error')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Encolado')),
+                ('started_at', models.DateTimeField(blank=True, null=True, verbose_name='Iniciado')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='Terminado')),
+                ('sale', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='invoice_job', to='sales.sale', verbose_name='Venta')),
+            ],
+            options={
+                'verbose_name': 'Comprobante en cola',
+                'verbose_name_plural': 'Comprobantes en cola',
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['status', 'created_at'], name='invoicejob_status_created')],
+            },
+        ),
+    ]
@@ -0,0 +1,71 @@
+# Generated by Django 5.0.1 on 2026-10-18 03:37
+
+from django.db import migrations, models
+from django.db.models import Count, DecimalField, F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def fill_snapshot(apps, schema_editor):
+    # Past lines get the product's current cost: the closest record there is
+    Product = apps.get_model('products', 'Product')
+    Sale = apps.get_model('sales', 'Sale')
+    SaleItem = apps.get_model('sales', 'SaleItem')
+    product = Product.objects.filter(pk=OuterRef('product_id'))
+    SaleItem.objects.update(
+        product_code=Subquery(product.values('code')[:1]),
+        product_name=Subquery(product.values('name')[:1]),
+        unit_cost=Subquery(product.values('purchase_price')[:1]),
+    )
+    money = DecimalField(max_digits=12, decimal_places=2)
+    lines = SaleItem.objects.filter(sale_id=OuterRef('pk')).values('sale_id')
+    Sale.objects.update(
+        item_count=Coalesce(Subquery(lines.annotate(n=Count('id')).values('n')), 0),
+        cost=Coalesce(Subquery(lines.annotate(
+            amount=Sum(F('quantity') * F('unit_cost'), output_field=money)
+        ).values('amount')), Value(0), output_field=money),
+        profit=Coalesce(Subquery(lines.annotate(
+            amount=Sum(F('subtotal') - F('quantity') * F('unit_cost'), output_field=money)
+        ).values('amount')), Value(0), output_field=money),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0008_product_sales_velocity'),
+        ('sales', '0005_business_date'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sale',
+            name='cost',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, help_text='Costo de los productos al momento de la venta', max_digits=12, verbose_name='Costo'),
+        ),
+        migrations.AddField(
+            model_name='sale',
+            name='item_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Número de líneas'),
+        ),
+        migrations.AddField(
+            model_name='sale',
+            name='profit',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, help_text='Subtotal de las líneas menos su costo', max_digits=12, verbose_name='Ganancia'),
+        ),
+        migrations.AddField(
+            model_name='saleitem',
+            name='product_code',
+            field=models.CharField(blank=True, editable=False, max_length=20, verbose_name='Código del producto'),
+        ),
+        migrations.AddField(
+            model_name='saleitem',
+            name='product_name',
+            field=models.CharField(blank=True, editable=False, max_length=200, verbose_name='Nombre del producto'),
+        ),
+        migrations.AddField(
+            model_name='saleitem',
+            name='unit_cost',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=10, verbose_name='Costo unitario'),
+        ),
+        migrations.RunPython(fill_snapshot, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.1 on 2026-10-18 03:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales', '0006_sale_snapshot'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='saleitem',
+            name='unit_cost',
+            field=models.DecimalField(decimal_places=4, default=0, editable=False, max_digits=14, verbose_name='Costo unitario'),
+        ),
+    ]
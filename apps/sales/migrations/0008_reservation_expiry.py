@@ -0,0 +1,22 @@
+# Generated by Django 5.0.1 on 2026-10-18 03:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales', '0007_alter_saleitem_unit_cost'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='reservation',
+            name='status',
+            field=models.CharField(choices=[('RESERVED', 'Reservado'), ('FULFILLED', 'Cumplido'), ('CANCELED', 'Cancelado'), ('EXPIRED', 'Vencido')], default='RESERVED', max_length=10, verbose_name='Estado'),
+        ),
+        migrations.AddIndex(
+            model_name='reservation',
+            index=models.Index(fields=['status', 'expires_at'], name='reservation_status_expires'),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.0.1 on 2026-10-18 04:40
+
+from datetime import timedelta
+from django.conf import settings
+from django.db import migrations
+from django.db.models import F
+
+
+def fill_expires_at(apps, schema_editor):
+    """
+    Open reservations made before they had an expiry get one counted from
+    their creation, so holds older than RESERVATION_TTL_HOURS are released
+    by the first sweep after the deploy instead of pinning reserved stock
+    forever. Nothing is filled in when the TTL is 0.
+    """
+    if not settings.RESERVATION_TTL_HOURS:
+        return
+    Reservation = apps.get_model('sales', 'Reservation')
+    Reservation.objects.filter(status='RESERVED', expires_at__isnull=True).update(
+        expires_at=F('created_at') + timedelta(hours=settings.RESERVATION_TTL_HOURS)
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales', '0009_idempotencykey_user_key'),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_expires_at, migrations.RunPython.noop),
+    ]
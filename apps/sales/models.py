@@ -1,12 +1,11 @@
 """
 Sales and Sale Items Models
 """
-from django.db import models
+from django.db import models, transaction
 from django.core.validators import MinValueValidator
 from django.conf import settings
+from django.utils import timezone
 from datetime import datetime
-import random
-import string
 
 
 class Sale(models.Model):
@@ -90,6 +89,30 @@ class Sale(models.Model):
         verbose_name='Estado'
     )
     
+    cost = models.DecimalField(
+        max_digits=12,
+        decimal_places=2,
+        default=0,
+        editable=False,
+        verbose_name='Costo',
+        help_text='Costo de los productos al momento de la venta'
+    )
+    
+    profit = models.DecimalField(
+        max_digits=12,
+        decimal_places=2,
+        default=0,
+        editable=False,
+        verbose_name='Ganancia',
+        help_text='Subtotal de las líneas menos su costo'
+    )
+    
+    item_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Número de líneas'
+    )
+    
     notes = models.TextField(
         blank=True,
         verbose_name='Notas'
@@ -100,6 +123,13 @@ class Sale(models.Model):
         verbose_name='Fecha de venta'
     )
     
+    business_date = models.DateField(
+        default=timezone.localdate,
+        editable=False,
+        verbose_name='Fecha contable',
+        help_text='Día local (TIME_ZONE) de la venta; filtrar reportes por este campo'
+    )
+    
     updated_at = models.DateTimeField(
         auto_now=True,
         verbose_name='Última actualización'
@@ -109,6 +139,10 @@ class Sale(models.Model):
         verbose_name = 'Venta'
         verbose_name_plural = 'Ventas'
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['business_date'], name='sale_business_date'),
+            models.Index(fields=['status', 'business_date'], name='sale_status_business_date'),
+        ]
     
     def __str__(self):
         return f"{self.code} - S/ {self.total}"
@@ -121,25 +155,24 @@ class Sale(models.Model):
     @staticmethod
     def generate_code():
         """Generate unique sale code: V-YYYYMMDD-XXXX"""
+        return Sale.generate_codes(1)[0]
+    
+    @staticmethod
+    def generate_codes(count):
+        """Reserve `count` sequential sale codes for today"""
+        from apps.products.sequences import allocate
         date_str = datetime.now().strftime('%Y%m%d')
-        while True:
-            random_str = ''.join(random.choices(string.digits, k=4))
-            code = f'V-{date_str}-{random_str}'
-            if not Sale.objects.filter(code=code).exists():
-                return code
+        return [f'V-{date_str}-{n:04d}' for n in allocate('V', date_str, count)]
     
     @property
     def items_count(self):
         """Total items in sale"""
-        return self.items.count()
+        return self.item_count
     
     @property
     def total_profit(self):
-        """Calculate total profit from sale"""
-        profit = 0
-        for item in self.items.all():
-            profit += (item.unit_price - item.product.purchase_price) * item.quantity
-        return profit
+        """Profit at the costs of the day of the sale"""
+        return self.profit
 
 
 class SaleItem(models.Model):
@@ -178,15 +211,47 @@ class SaleItem(models.Model):
         verbose_name='Subtotal'
     )
     
+    # Snapshot of the product when sold: receipts and margin reports read
+    # these instead of the product's current name and purchase price
+    product_code = models.CharField(
+        max_length=20,
+        blank=True,
+        editable=False,
+        verbose_name='Código del producto'
+    )
+    
+    product_name = models.CharField(
+        max_length=200,
+        blank=True,
+        editable=False,
+        verbose_name='Nombre del producto'
+    )
+    
+    unit_cost = models.DecimalField(
+        max_digits=14,
+        decimal_places=4,
+        default=0,
+        editable=False,
+        verbose_name='Costo unitario'
+    )
+    
     class Meta:
         verbose_name = 'Item de venta'
         verbose_name_plural = 'Items de venta'
     
     def __str__(self):
-        return f"{self.product.name} x {self.quantity}"
+        return f"{self.product_name} x {self.quantity}"
+    
+    @property
+    def profit(self):
+        return self.subtotal - self.unit_cost * self.quantity
     
     def save(self, *args, **kwargs):
         self.subtotal = self.quantity * self.unit_price
+        if not self.pk and not self.product_name:
+            self.product_code = self.product.code
+            self.product_name = self.product.name
+            self.unit_cost = self.product.average_cost
         super().save(*args, **kwargs)
 
 
@@ -195,6 +260,7 @@ class Reservation(models.Model):
         RESERVED = 'RESERVED', 'Reservado'
         FULFILLED = 'FULFILLED', 'Cumplido'
         CANCELED = 'CANCELED', 'Cancelado'
+        EXPIRED = 'EXPIRED', 'Vencido'
 
     product = models.ForeignKey(
         'products.Product',
@@ -244,29 +310,145 @@ class Reservation(models.Model):
         verbose_name = 'Reserva'
         verbose_name_plural = 'Reservas'
         ordering = ['-created_at']
+        indexes = [
+            # Expiry sweeper: open holds past their expires_at (apps.sales.reservations)
+            models.Index(fields=['status', 'expires_at'], name='reservation_status_expires'),
+        ]
 
     def __str__(self):
         return f"{self.product.code} x {self.quantity} ({self.get_status_display()})"
 
     def save(self, *args, **kwargs):
+        from apps.products.stock import reserve_stock, release_reserved_stock
+        from apps.customers import stats
         delta = 0
+        new_reserved = self.quantity if self.status == Reservation.Status.RESERVED else 0
+        held = {self.customer_id: new_reserved}
         if self.pk:
             old = Reservation.objects.get(pk=self.pk)
             old_reserved = old.quantity if old.status == Reservation.Status.RESERVED else 0
-            new_reserved = self.quantity if self.status == Reservation.Status.RESERVED else 0
             delta = new_reserved - old_reserved
+            held[old.customer_id] = held.get(old.customer_id, 0) - old_reserved
         else:
-            if self.status == Reservation.Status.RESERVED:
-                delta = self.quantity
-        super().save(*args, **kwargs)
-        if delta != 0:
-            p = self.product
-            p.reserved_stock = max(0, p.reserved_stock + delta)
-            p.save()
+            delta = new_reserved
+        with transaction.atomic():
+            if delta > 0:
+                reserve_stock(self.product_id, delta)
+            elif delta < 0:
+                release_reserved_stock(self.product_id, -delta)
+            super().save(*args, **kwargs)
+            stats.reservations_changed(held)
+            if new_reserved and self.expires_at:
+                from .reservations import start_in_process_sweeper
+                transaction.on_commit(start_in_process_sweeper)
 
     def delete(self, using=None, keep_parents=False):
-        if self.status == Reservation.Status.RESERVED:
-            p = self.product
-            p.reserved_stock = max(0, p.reserved_stock - self.quantity)
-            p.save()
-        return super().delete(using=using, keep_parents=keep_parents)
+        from apps.products.stock import release_reserved_stock
+        from apps.customers import stats
+        with transaction.atomic():
+            held = self.quantity if self.status == Reservation.Status.RESERVED else 0
+            if held:
+                release_reserved_stock(self.product_id, held)
+            deleted = super().delete(using=using, keep_parents=keep_parents)
+            stats.reservations_changed({self.customer_id: -held})
+            return deleted
+
+
+class InvoiceJob(models.Model):
+    """Queued receipt rendering (PDF and PNG) for a sale"""
+
+    MAX_ATTEMPTS = 3
+
+    class Status(models.TextChoices):
+        PENDING = 'PENDING', 'Pendiente'
+        RUNNING = 'RUNNING', 'Procesando'
+        DONE = 'DONE', 'Listo'
+        FAILED = 'FAILED', 'Fallido'
+
+    sale = models.OneToOneField(
+        Sale,
+        on_delete=models.CASCADE,
+        related_name='invoice_job',
+        verbose_name='Venta'
+    )
+
+    status = models.CharField(
+        max_length=10,
+        choices=Status.choices,
+        default=Status.PENDING,
+        verbose_name='Estado'
+    )
+
+    attempts = models.PositiveSmallIntegerField(default=0, verbose_name='Intentos')
+    invoice_pdf_url = models.CharField(max_length=255, blank=True, verbose_name='PDF')
+    invoice_png_url = models.CharField(max_length=255, blank=True, verbose_name='PNG')
+    pdf_ms = models.PositiveIntegerField(null=True, blank=True, verbose_name='Tiempo PDF (ms)')
+    png_ms = models.PositiveIntegerField(null=True, blank=True, verbose_name='Tiempo PNG (ms)')
+    render_ms = models.PositiveIntegerField(null=True, blank=True, verbose_name='Tiempo total (ms)')
+    error = models.TextField(blank=True, verbose_name='Error')
+
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='Encolado')
+    started_at = models.DateTimeField(null=True, blank=True, verbose_name='Iniciado')
+    finished_at = models.DateTimeField(null=True, blank=True, verbose_name='Terminado')
+
+    class Meta:
+        verbose_name = 'Comprobante en cola'
+        verbose_name_plural = 'Comprobantes en cola'
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'created_at'], name='invoicejob_status_created'),
+        ]
+
+    def __str__(self):
+        return f"{self.sale.code} ({self.get_status_display()})"
+
+
+class IdempotencyKey(models.Model):
+    """Stored outcome of a sale submission, replayed when the client retries"""
+
+    key = models.CharField(
+        max_length=64,
+        verbose_name='Clave'
+    )
+
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Usuario'
+    )
+
+    request_hash = models.CharField(
+        max_length=64,
+        verbose_name='Huella de la solicitud'
+    )
+
+    sale = models.ForeignKey(
+        Sale,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='+',
+        verbose_name='Venta'
+    )
+
+    status_code = models.PositiveSmallIntegerField(default=200, verbose_name='Código HTTP')
+    response = models.JSONField(default=dict, verbose_name='Respuesta')
+
+    created_at = models.DateTimeField(
+        auto_now_add=True,
+        db_index=True,
+        verbose_name='Creado'
+    )
+
+    class Meta:
+        verbose_name = 'Clave de idempotencia'
+        verbose_name_plural = 'Claves de idempotencia'
+        constraints = [
+            # Each seller's keys are their own: another seller's retry of
+            # the same key must not replay someone else's sale
+            models.UniqueConstraint(fields=['user', 'key'], name='idempotencykey_user_key'),
+        ]
+
+    def __str__(self):
+        return self.key
@@ -0,0 +1,156 @@
+"""
+Reservation expiry
+
+Open reservations past their expires_at are found through the
+(status, expires_at) index and expired in batches. Each batch is one
+transaction: the products are locked in primary key order before the
+reservations, like checkout does, the reservations are marked EXPIRED with
+one UPDATE and reserved_stock is released with one CASE UPDATE over the
+batch's products. Nothing goes through Reservation.save().
+
+New reservations expire RESERVATION_TTL_HOURS after they are made unless
+the POS sends its own expiry (see `expiry`).
+
+`expire_reservations` is run by the expire_reservations command or, with
+RESERVATION_SWEEPER_IN_PROCESS, by a daemon thread started with the web
+process (config/wsgi.py, config/asgi.py) and again when a reservation with
+an expiry commits; the thread sleeps until the next expiry and stops once
+no open reservation can expire.
+"""
+from django.conf import settings
+from django.db import connection, models, transaction
+from django.db.models import Case, When, F
+from django.db.models.functions import Greatest
+from django.utils import timezone
+from datetime import timedelta
+import logging
+import threading
+import time
+from .models import Reservation
+from apps.products.models import Product
+from apps.products.stock import lock_products
+from apps.customers import stats as customer_stats
+from apps.reports import kpis
+
+logger = logging.getLogger(__name__)
+
+
+def expiry(hours=None, now=None):
+    """
+    When a reservation made `now` expires: after `hours`, or
+    RESERVATION_TTL_HOURS when not given; None (never) for 0 hours.
+    """
+    hours = settings.RESERVATION_TTL_HOURS if hours is None else hours
+    if hours < 0:
+        raise ValueError('hours must not be negative')
+    if not hours:
+        return None
+    return (now or timezone.now()) + timedelta(hours=hours)
+
+
+def _expire_batch(now, batch_size):
+    """Expire up to `batch_size` due reservations; returns (due, expired, units released)"""
+    with transaction.atomic():
+        due = list(Reservation.objects.filter(
+            status=Reservation.Status.RESERVED, expires_at__lte=now
+        ).order_by('expires_at', 'id').values_list('id', 'product_id')[:batch_size])
+        if not due:
+            return 0, 0, 0
+
+        products = lock_products({product_id for _, product_id in due})
+        # Re-read under lock: a checkout may have consumed some meanwhile
+        rows = list(Reservation.objects.select_for_update().filter(
+            pk__in=[pk for pk, _ in due], status=Reservation.Status.RESERVED, expires_at__lte=now
+        ).values_list('id', 'product_id', 'customer_id', 'quantity'))
+        if not rows:
+            return len(due), 0, 0
+
+        released, held = {}, {}
+        for _, product_id, customer_id, quantity in rows:
+            released[product_id] = released.get(product_id, 0) + quantity
+            held[customer_id] = held.get(customer_id, 0) - quantity
+        Reservation.objects.filter(pk__in=[row[0] for row in rows]).update(
+            status=Reservation.Status.EXPIRED, updated_at=timezone.now()
+        )
+        Product.objects.filter(pk__in=list(released)).update(
+            reserved_stock=Case(
+                *[When(pk=pk, then=Greatest(F('reserved_stock') - qty, 0)) for pk, qty in released.items()],
+                default=F('reserved_stock'),
+                output_field=models.IntegerField(),
+            ),
+            updated_at=timezone.now(),
+        )
+        customer_stats.reservations_changed(held)
+        kpis.bump(kpis.RESERVATIONS)
+        kpis.stock_changed(
+            (products[pk].available_stock, products[pk].available_stock + min(qty, products[pk].reserved_stock),
+             products[pk].min_stock)
+            for pk, qty in released.items() if pk in products
+        )
+    return len(due), len(rows), sum(released.values())
+
+
+def expire_reservations(now=None, batch_size=500):
+    """Expire every open reservation past its expires_at; returns (reservations expired, units released)"""
+    now = now or timezone.now()
+    expired = units = 0
+    while True:
+        due, batch_expired, batch_units = _expire_batch(now, batch_size)
+        expired += batch_expired
+        units += batch_units
+        if due < batch_size:
+            return expired, units
+
+
+def next_expiry():
+    """When the next open reservation expires, or None"""
+    return Reservation.objects.filter(
+        status=Reservation.Status.RESERVED, expires_at__isnull=False
+    ).order_by('expires_at').values_list('expires_at', flat=True).first()
+
+
+def start_in_process_sweeper():
+    """Start the sweeper when the web process starts, if it runs in-process"""
+    if settings.RESERVATION_SWEEPER_IN_PROCESS:
+        start_background_sweeper()
+
+
+_sweeper_lock = threading.Lock()
+_sweeper_thread = None
+_sweeper_pending = False
+
+
+def start_background_sweeper():
+    """Expire reservations from a daemon thread of the current process"""
+    global _sweeper_thread, _sweeper_pending
+    with _sweeper_lock:
+        if _sweeper_thread is not None:
+            _sweeper_pending = True
+            return
+        _sweeper_thread = threading.Thread(target=_background_sweeper, name='reservation-sweeper', daemon=True)
+        _sweeper_thread.start()
+
+
+def _background_sweeper():
+    global _sweeper_thread, _sweeper_pending
+    try:
+        while True:
+            with _sweeper_lock:
+                _sweeper_pending = False
+            expire_reservations()
+            upcoming = next_expiry()
+            if upcoming is None:
+                with _sweeper_lock:
+                    if not _sweeper_pending:
+                        _sweeper_thread = None
+                        break
+                continue
+            connection.close()
+            wait = (upcoming - timezone.now()).total_seconds()
+            time.sleep(min(max(wait, 0), settings.RESERVATION_SWEEP_INTERVAL_SECONDS))
+    except Exception:
+        logger.exception('Reservation sweeper stopped')
+        with _sweeper_lock:
+            _sweeper_thread = None
+    finally:
+        connection.close()
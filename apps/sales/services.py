@@ -0,0 +1,302 @@
+"""
+Checkout Engine - set-based sale processing
+"""
+from django.db import transaction, models
+from django.urls import reverse
+from django.db.models import Case, When, F
+from django.utils import timezone
+from decimal import Decimal
+from .models import Sale, SaleItem, Reservation
+from .documents import SaleDocument
+from .invoices import enqueue_invoice, generate_whatsapp_text_url
+from . import idempotency
+from apps.products.models import Product
+from apps.products.stock import lock_products, take_stock
+from apps.customers.models import Customer
+from apps.customers import stats as customer_stats
+from apps.purchases.models import StockMovement
+from apps.reports import kpis, rollups, valuation, velocity
+
+
+class CheckoutError(Exception):
+    """Cart cannot be sold; the whole checkout is rolled back"""
+
+
+def resolve_customer(data):
+    """Return the customer id for a POS payload, creating the customer if needed"""
+    customer_id = data.get('customer_id') if data.get('customer_id') else None
+    new_customer = data.get('new_customer')
+    if not customer_id and new_customer:
+        dni = (new_customer.get('dni') or '').strip()
+        name = (new_customer.get('name') or '').strip()
+        phone = (new_customer.get('phone') or '').strip()
+        email = (new_customer.get('email') or '').strip()
+        address = (new_customer.get('address') or '').strip()
+        if dni:
+            customer, _ = Customer.objects.get_or_create(dni=dni, defaults={
+                'name': name or dni,
+                'phone': phone,
+                'email': email,
+                'address': address,
+                'is_active': True,
+            })
+        else:
+            customer, _ = Customer.objects.get_or_create(name=name, defaults={
+                'dni': '',
+                'phone': phone,
+                'email': email,
+                'address': address,
+                'is_active': True,
+            })
+        customer_id = customer.id
+    return customer_id
+
+
+def parse_cart(items):
+    """
+    Normalize cart lines into {product_id: (quantity, unit_price)}; repeated
+    products are merged, so their lines must carry the same price.
+    """
+    lines = {}
+    for item in items:
+        product_id = int(item['product_id'])
+        qty = int(item['quantity'])
+        if qty <= 0:
+            raise CheckoutError('Cantidad inválida')
+        price = Decimal(str(item['price']))
+        if product_id in lines:
+            if price != lines[product_id][1]:
+                raise CheckoutError('El mismo producto figura con precios distintos')
+            qty += lines[product_id][0]
+        lines[product_id] = (qty, price)
+    if not lines:
+        raise CheckoutError('El carrito está vacío')
+    return lines
+
+
+def _case(mapping, field, output_field):
+    """CASE WHEN pk=... THEN <value> expression over a {pk: value} mapping"""
+    return Case(
+        *[When(pk=pk, then=value) for pk, value in mapping.items()],
+        default=F(field),
+        output_field=output_field,
+    )
+
+
+def process_sale(seller, data):
+    """
+    Register a sale from a POS payload.
+
+    Products and the customer's open reservations are loaded with one query
+    each, sale lines and kardex rows are bulk inserted and stock (with the
+    sales counters) is updated with a single UPDATE joined to the cart's
+    quantities, so the number of queries does not depend on the cart size.
+    Product rows are locked in primary key order and the UPDATE only
+    matches rows that still have enough stock, so two terminals selling the
+    last units cannot both succeed.
+    """
+    lines = parse_cart(data['items'])
+    with transaction.atomic():
+        customer_id = resolve_customer(data)
+
+        products = lock_products(lines)
+        missing = set(lines) - set(products)
+        if missing:
+            raise CheckoutError(f"Producto no encontrado: {', '.join(str(pk) for pk in sorted(missing))}")
+
+        reservations = {}
+        if customer_id:
+            open_reservations = Reservation.objects.select_for_update().filter(
+                product_id__in=list(lines),
+                customer_id=customer_id,
+                status=Reservation.Status.RESERVED
+            ).order_by('created_at')
+            for r in open_reservations:
+                reservations.setdefault(r.product_id, []).append(r)
+
+        for product_id, (qty, _) in lines.items():
+            product = products[product_id]
+            reserved_for_customer = sum(r.quantity for r in reservations.get(product_id, []))
+            allowed = product.stock - product.reserved_stock + reserved_for_customer
+            if qty > allowed:
+                raise CheckoutError(f"Stock insuficiente (disponible: {allowed}) para {product.name}")
+
+        # Units leave at their average cost (apps.reports.valuation)
+        unit_costs = {pk: products[pk].average_cost for pk in lines}
+        cost = sum((qty * unit_costs[pk] for pk, (qty, _) in lines.items()), Decimal(0))
+        sale = Sale.objects.create(
+            customer_id=customer_id,
+            seller=seller,
+            subtotal=Decimal(str(data['subtotal'])),
+            discount=Decimal(0),
+            tax=Decimal(0),
+            total=Decimal(str(data['total'])),
+            cost=cost,
+            profit=sum((qty * price for qty, price in lines.values()), Decimal(0)) - cost,
+            item_count=len(lines),
+            payment_method=data['payment_method'],
+            status=Sale.Status.COMPLETED
+        )
+
+        SaleItem.objects.bulk_create([
+            SaleItem(
+                sale=sale,
+                product_id=product_id,
+                quantity=qty,
+                unit_price=price,
+                subtotal=qty * price,
+                product_code=products[product_id].code,
+                product_name=products[product_id].name,
+                unit_cost=unit_costs[product_id],
+            )
+            for product_id, (qty, price) in lines.items()
+        ])
+
+        # Consume reservations (oldest first)
+        now = timezone.now()
+        consumed = {}
+        touched = []
+        for product_id, (qty, _) in lines.items():
+            remaining = qty
+            for r in reservations.get(product_id, []):
+                if remaining <= 0:
+                    break
+                use = min(remaining, r.quantity)
+                r.quantity -= use
+                if r.quantity == 0:
+                    r.status = Reservation.Status.FULFILLED
+                r.updated_at = now
+                remaining -= use
+                consumed[product_id] = consumed.get(product_id, 0) + use
+                touched.append(r)
+        if touched:
+            Reservation.objects.bulk_update(touched, ['quantity', 'status', 'updated_at'])
+
+        # Update stock (and the sales counters); only rows that still have
+        # enough available stock are updated
+        updated = take_stock(
+            {pk: qty for pk, (qty, _) in lines.items()}, consumed, now,
+            add_to=list(velocity.WINDOWS), set_values={'last_sold_at': now},
+        )
+        if updated != len(lines):
+            raise CheckoutError('Stock insuficiente: el stock cambió durante la venta, intente nuevamente')
+
+        # Stock movements (Kardex)
+        StockMovement.objects.bulk_create([
+            StockMovement(
+                product_id=product_id,
+                movement_type=StockMovement.MovementType.SALE,
+                quantity=-qty,
+                previous_stock=products[product_id].stock,
+                new_stock=products[product_id].stock - qty,
+                reference_id=sale.id,
+                created_by=seller
+            )
+            for product_id, (qty, _) in lines.items()
+        ])
+
+        valuation.issued(products, {pk: qty for pk, (qty, _) in lines.items()})
+        rollups.record_sale(sale, [
+            (product_id, qty, qty * price, qty * unit_costs[product_id])
+            for product_id, (qty, price) in lines.items()
+        ])
+        customer_stats.sale_completed(sale, sum(consumed.values()))
+        kpis.bump(kpis.SALES, *([kpis.RESERVATIONS] if touched else []))
+        kpis.stock_changed(
+            (products[pk].available_stock, products[pk].available_stock - qty + consumed.get(pk, 0), products[pk].min_stock)
+            for pk, (qty, _) in lines.items()
+        )
+    return sale
+
+
+def cancel_sale(sale_id, user):
+    """
+    Cancel a completed sale: return its units to stock, write the kardex
+    entries and take it out of the report rollups and the products' sales
+    counters, all in one transaction.
+    """
+    with transaction.atomic():
+        sale = Sale.objects.select_for_update().filter(pk=sale_id).first()
+        if sale is None:
+            raise CheckoutError('Venta no encontrada')
+        if sale.status != Sale.Status.COMPLETED:
+            raise CheckoutError('Solo se pueden anular ventas completadas')
+
+        lines = {}
+        for item in SaleItem.objects.filter(sale=sale).values('product_id', 'quantity', 'subtotal', 'unit_cost'):
+            qty, subtotal, cost = lines.get(item['product_id'], (0, Decimal(0), Decimal(0)))
+            lines[item['product_id']] = (
+                qty + item['quantity'], subtotal + item['subtotal'], cost + item['quantity'] * item['unit_cost']
+            )
+        products = lock_products(lines)
+        now = timezone.now()
+
+        Sale.objects.filter(pk=sale.pk).update(status=Sale.Status.CANCELLED, updated_at=now)
+        if lines:
+            Product.objects.filter(pk__in=list(lines)).update(
+                stock=_case({pk: F('stock') + qty for pk, (qty, _, _) in lines.items()}, 'stock', models.IntegerField()),
+                updated_at=now,
+                **velocity.cancel_update({pk: qty for pk, (qty, _, _) in lines.items()}, sale.business_date),
+                # The units come back at the cost they left with
+                **valuation.received(products, {pk: (qty, cost) for pk, (qty, _, cost) in lines.items()}),
+            )
+            StockMovement.objects.bulk_create([
+                StockMovement(
+                    product_id=product_id,
+                    movement_type=StockMovement.MovementType.ADJUSTMENT,
+                    quantity=qty,
+                    previous_stock=products[product_id].stock,
+                    new_stock=products[product_id].stock + qty,
+                    reference_id=sale.id,
+                    notes=f'Anulación de venta {sale.code}',
+                    created_by=user
+                )
+                for product_id, (qty, _, _) in lines.items()
+            ])
+
+        # Take back the cost booked at sale time, not today's purchase price
+        rollups.record_sale(sale, [
+            (product_id, qty, subtotal, cost)
+            for product_id, (qty, subtotal, cost) in lines.items()
+        ], sign=-1)
+        customer_stats.sale_cancelled(sale)
+        kpis.bump(kpis.SALES)
+        kpis.stock_changed(
+            (products[pk].available_stock, products[pk].available_stock + qty, products[pk].min_stock)
+            for pk, (qty, _, _) in lines.items()
+        )
+        sale.status = Sale.Status.CANCELLED
+    return sale
+
+
+def submit_sale(seller, data, key='', include_whatsapp=True):
+    """
+    Idempotent checkout used by the POS and the offline sync endpoint.
+
+    Returns (payload, status_code, replayed). With a key, a retry of a sale
+    that already committed returns the stored payload without running the
+    checkout again.
+    """
+    with transaction.atomic():
+        record = None
+        if key:
+            fingerprint = idempotency.request_fingerprint(data)
+            record, previous = idempotency.claim(key, seller, fingerprint)
+            if previous is not None:
+                payload, status_code = idempotency.replay(previous, fingerprint)
+                return payload, status_code, True
+        sale = process_sale(seller, data)
+        job = enqueue_invoice(sale)
+        payload = {
+            'success': True,
+            'sale_id': sale.id,
+            'sale_code': sale.code,
+            'message': 'Venta registrada exitosamente',
+            'invoice_status': job.status,
+            'invoice_status_url': reverse('sales:invoice_status', kwargs={'pk': sale.pk}),
+        }
+        if include_whatsapp:
+            payload['whatsapp_text_url'] = generate_whatsapp_text_url(SaleDocument.load(sale.id))
+        if record is not None:
+            idempotency.store(record, sale, payload)
+    return payload, 200, False
@@ -0,0 +1,257 @@
+"""
+Sales tests: checkout and cancellation keep stock and the figures consistent
+"""
+from django.contrib.auth import get_user_model
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
+from apps.customers.models import Customer, CustomerStats
+from apps.products.models import Category, Product
+from apps.products.stock import InsufficientStock, lock_products, release_reserved_stock, reserve_stock, take_stock
+from apps.purchases.models import StockMovement
+from apps.reports.models import DailyCustomerSales, DailyProductSales, DailySales
+from apps.suppliers.models import Supplier
+from . import reservations
+from .invoices import enqueue_invoice
+from .models import InvoiceJob, Reservation, Sale, SaleItem
+from .services import CheckoutError, cancel_sale, process_sale, submit_sale
+
+
+class SalesTestCase(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.seller = get_user_model().objects.create_user('vendedor', password='x')
+        cls.other_seller = get_user_model().objects.create_user('vendedor2', password='x')
+        category = Category.objects.create(name='Filtros')
+        supplier = Supplier.objects.create(name='Proveedor', ruc='20123456789', phone='999999999', address='-')
+        cls.customer = Customer.objects.create(dni='12345678', name='Cliente', phone='987654321')
+        cls.product = Product.objects.create(
+            name='Filtro de aceite', category=category, supplier=supplier, presentation='Unidad',
+            purchase_price=Decimal('5.00'), sale_price=Decimal('8.00'), stock=10,
+        )
+
+    def cart(self, quantity, price='8.00', **extra):
+        total = str(Decimal(price) * quantity)
+        return {
+            'items': [{'product_id': self.product.pk, 'quantity': quantity, 'price': price}],
+            'subtotal': total,
+            'total': total,
+            'payment_method': Sale.PaymentMethod.CASH,
+            'customer_id': self.customer.pk,
+            **extra,
+        }
+
+    def assertStock(self, stock, reserved_stock=0):
+        self.product.refresh_from_db()
+        self.assertEqual((self.product.stock, self.product.reserved_stock), (stock, reserved_stock))
+
+
+class CheckoutTests(SalesTestCase):
+
+    def test_sale_takes_stock(self):
+        sale = process_sale(self.seller, self.cart(3))
+        self.assertStock(7)
+        self.assertEqual(self.product.units_30d, 3)
+        self.assertEqual(StockMovement.objects.get(reference_id=sale.pk).new_stock, 7)
+
+    def test_oversell_is_rejected(self):
+        with self.assertRaises(CheckoutError):
+            process_sale(self.seller, self.cart(11))
+        self.assertStock(10)
+        self.assertFalse(Sale.objects.exists())
+
+    def test_reserved_units_cannot_be_sold_to_someone_else(self):
+        Reservation.objects.create(product=self.product, customer=self.customer, quantity=8, created_by=self.seller)
+        with self.assertRaises(CheckoutError):
+            process_sale(self.seller, self.cart(3, customer_id=None))
+        process_sale(self.seller, self.cart(10))
+        self.assertStock(0)
+        self.assertEqual(Reservation.objects.get().status, Reservation.Status.FULFILLED)
+
+    def test_stock_guard_rejects_a_sale_read_before_a_concurrent_one(self):
+        # The rows were read before another terminal took 8 units: the
+        # Python check passes and only the guarded UPDATE can catch it
+        stale = lock_products([self.product.pk])
+        process_sale(self.other_seller, self.cart(8))
+        with mock.patch('apps.sales.services.lock_products', return_value=stale):
+            with self.assertRaisesMessage(CheckoutError, 'el stock cambió'):
+                process_sale(self.seller, self.cart(5))
+        self.assertStock(2)
+        self.assertEqual(Sale.objects.count(), 1)
+
+    def test_take_stock_only_updates_products_with_enough_stock(self):
+        self.assertEqual(take_stock({self.product.pk: 11}, {}, self.product.updated_at), 0)
+        self.assertStock(10)
+        self.assertEqual(take_stock({self.product.pk: 10}, {}, self.product.updated_at), 1)
+        self.assertStock(0)
+
+    def test_same_product_at_two_prices_is_rejected(self):
+        data = self.cart(1)
+        data['items'].append({'product_id': self.product.pk, 'quantity': 1, 'price': '7.00'})
+        with self.assertRaises(CheckoutError):
+            process_sale(self.seller, data)
+
+
+class StockConstraintTests(SalesTestCase):
+
+    def test_stock_cannot_go_negative(self):
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Product.objects.filter(pk=self.product.pk).update(stock=F('stock') - 11)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Product.objects.filter(pk=self.product.pk).update(reserved_stock=-1)
+        self.assertStock(10)
+
+    def test_reservations_stay_within_stock(self):
+        reserve_stock(self.product.pk, 6)
+        with self.assertRaises(InsufficientStock) as raised:
+            reserve_stock(self.product.pk, 5)
+        self.assertEqual(raised.exception.available, 4)
+        release_reserved_stock(self.product.pk, 9)
+        self.assertStock(10, 0)
+
+
+class CancelSaleTests(SalesTestCase):
+
+    def test_cancel_reverses_stock_rollups_counters_and_customer_stats(self):
+        earlier = process_sale(self.seller, self.cart(2))
+        sale = process_sale(self.seller, self.cart(3))
+
+        cancel_sale(sale.pk, self.seller)
+
+        self.assertStock(8)
+        self.assertEqual((self.product.units_7d, self.product.units_30d, self.product.units_90d), (2, 2, 2))
+        self.assertEqual(Sale.objects.get(pk=sale.pk).status, Sale.Status.CANCELLED)
+        movement = StockMovement.objects.get(reference_id=sale.pk, movement_type=StockMovement.MovementType.ADJUSTMENT)
+        self.assertEqual((movement.quantity, movement.new_stock), (3, 8))
+
+        daily = DailySales.objects.get()
+        self.assertEqual((daily.sale_count, daily.units, daily.revenue), (1, 2, earlier.total))
+        product_daily = DailyProductSales.objects.get()
+        self.assertEqual((product_daily.units, product_daily.revenue), (2, Decimal('16.00')))
+        self.assertEqual(DailyCustomerSales.objects.get().revenue, earlier.total)
+
+        stats = CustomerStats.objects.get(customer=self.customer)
+        self.assertEqual((stats.sale_count, stats.revenue), (1, earlier.total))
+        self.assertEqual(stats.last_purchase_at, earlier.created_at)
+
+    def test_cancelled_sale_cannot_be_cancelled_again(self):
+        sale = process_sale(self.seller, self.cart(3))
+        cancel_sale(sale.pk, self.seller)
+        with self.assertRaises(CheckoutError):
+            cancel_sale(sale.pk, self.seller)
+        self.assertStock(10)
+        self.assertEqual(SaleItem.objects.filter(sale=sale).count(), 1)
+
+
+@override_settings(INVOICE_WORKER_IN_PROCESS=False)
+class IdempotencyTests(SalesTestCase):
+
+    def test_retry_replays_the_sale_without_touching_stock(self):
+        payload, status, replayed = submit_sale(self.seller, self.cart(3), 'clave-1')
+        self.assertEqual((status, replayed), (200, False))
+        retried, status, replayed = submit_sale(self.seller, self.cart(3, queued_at='2024-01-01T10:00'), 'clave-1')
+        self.assertEqual((retried, status, replayed), (payload, 200, True))
+        self.assertStock(7)
+        self.assertEqual(Sale.objects.count(), 1)
+
+    def test_key_reused_for_another_cart_is_rejected(self):
+        submit_sale(self.seller, self.cart(3), 'clave-1')
+        payload, status, replayed = submit_sale(self.seller, self.cart(4), 'clave-1')
+        self.assertEqual((status, replayed, payload['success']), (422, True, False))
+        self.assertStock(7)
+
+    def test_keys_are_scoped_to_the_seller(self):
+        first, _, _ = submit_sale(self.seller, self.cart(3), 'clave-1')
+        second, status, replayed = submit_sale(self.other_seller, self.cart(3), 'clave-1')
+        self.assertEqual((status, replayed), (200, False))
+        self.assertNotEqual(second['sale_id'], first['sale_id'])
+        self.assertStock(4)
+
+    def test_failed_checkout_does_not_keep_the_key(self):
+        with self.assertRaises(CheckoutError):
+            submit_sale(self.seller, self.cart(11), 'clave-1')
+        Product.objects.filter(pk=self.product.pk).update(stock=20)
+        payload, status, replayed = submit_sale(self.seller, self.cart(11), 'clave-1')
+        self.assertEqual((status, replayed), (200, False))
+        self.assertStock(9)
+
+
+@override_settings(INVOICE_WORKER_IN_PROCESS=False)
+class InvoiceQueueTests(SalesTestCase):
+
+    def test_job_left_running_by_a_dead_worker_is_queued_again(self):
+        sale = process_sale(self.seller, self.cart(1))
+        InvoiceJob.objects.create(
+            sale=sale, status=InvoiceJob.Status.RUNNING, started_at=timezone.now() - timedelta(minutes=10)
+        )
+        self.assertEqual(enqueue_invoice(sale).status, InvoiceJob.Status.PENDING)
+
+    def test_job_being_rendered_is_left_alone(self):
+        sale = process_sale(self.seller, self.cart(1))
+        InvoiceJob.objects.create(sale=sale, status=InvoiceJob.Status.RUNNING, started_at=timezone.now())
+        self.assertEqual(enqueue_invoice(sale).status, InvoiceJob.Status.RUNNING)
+
+    def test_status_view_does_not_start_a_worker_when_disabled(self):
+        sale = process_sale(self.seller, self.cart(1))
+        self.client.force_login(self.seller)
+        with mock.patch('apps.sales.invoices.start_background_worker') as start:
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.get(reverse('sales:invoice_status', kwargs={'pk': sale.pk}))
+        self.assertEqual(response.json()['status'], InvoiceJob.Status.PENDING)
+        start.assert_not_called()
+
+
+class ReservationExpiryTests(SalesTestCase):
+
+    def reserve(self, **data):
+        self.client.force_login(self.seller)
+        return self.client.post(
+            reverse('sales:create_reservation'),
+            {'product_id': self.product.pk, 'quantity': 4, 'customer_id': self.customer.pk, **data},
+            content_type='application/json',
+        )
+
+    @override_settings(RESERVATION_TTL_HOURS=48)
+    def test_new_reservation_expires_after_the_ttl(self):
+        before = timezone.now()
+        self.assertEqual(self.reserve().status_code, 200)
+        expires_at = Reservation.objects.get().expires_at
+        self.assertTrue(before + timedelta(hours=48) <= expires_at <= timezone.now() + timedelta(hours=48))
+
+    def test_pos_can_choose_the_expiry_or_none(self):
+        self.reserve(expires_in_hours=2)
+        self.reserve(expires_in_hours=0)
+        first, second = Reservation.objects.order_by('pk')
+        self.assertLess(first.expires_at, timezone.now() + timedelta(hours=2, minutes=1))
+        self.assertIsNone(second.expires_at)
+
+    def test_invalid_expiry_is_rejected(self):
+        for hours in (-1, 'mañana'):
+            with self.subTest(hours):
+                self.assertEqual(self.reserve(expires_in_hours=hours).status_code, 400)
+        self.assertFalse(Reservation.objects.exists())
+        self.assertStock(10, 0)
+
+    def test_expired_holds_release_their_stock(self):
+        self.reserve(expires_in_hours=1)
+        self.reserve(expires_in_hours=0)
+        self.assertStock(10, 8)
+        expired, units = reservations.expire_reservations(timezone.now() + timedelta(hours=2))
+        self.assertEqual((expired, units), (1, 4))
+        self.assertStock(10, 4)
+        self.assertEqual(CustomerStats.objects.get(customer=self.customer).reserved_quantity, 4)
+
+    def test_sweeper_starts_only_in_process(self):
+        with mock.patch('apps.sales.reservations.start_background_sweeper') as start:
+            with override_settings(RESERVATION_SWEEPER_IN_PROCESS=False):
+                reservations.start_in_process_sweeper()
+            start.assert_not_called()
+            with override_settings(RESERVATION_SWEEPER_IN_PROCESS=True):
+                reservations.start_in_process_sweeper()
+            start.assert_called_once()
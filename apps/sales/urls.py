@@ -10,7 +10,10 @@ urlpatterns = [
     path('', views.SaleListView.as_view(), name='sale_list'),
     path('pos/', views.POSView.as_view(), name='pos'),
     path('process/', views.ProcessSaleView.as_view(), name='process_sale'),
+    path('sync/', views.SyncSalesView.as_view(), name='sync_sales'),
     path('<int:pk>/', views.SaleDetailView.as_view(), name='sale_detail'),
+    path('<int:pk>/invoice/', views.InvoiceStatusView.as_view(), name='invoice_status'),
+    path('<int:pk>/cancel/', views.CancelSaleView.as_view(), name='cancel_sale'),
     path('reservations/create/', views.CreateReservationView.as_view(), name='create_reservation'),
     path('reservations/list/', views.ListReservationsView.as_view(), name='list_reservations'),
 ]
@@ -6,20 +6,18 @@ from django.views.generic import ListView, DetailView, TemplateView
 from django.views import View
 from django.http import JsonResponse, HttpResponse
 from django.shortcuts import render, redirect, get_object_or_404
-from django.db import transaction, models
+from django.db import transaction, DatabaseError
 from django.utils import timezone
-from decimal import Decimal
-from .models import Sale, SaleItem
+from .models import Sale
 from apps.products.models import Product
+from apps.products.stock import InsufficientStock
 from apps.customers.models import Customer
-from apps.purchases.models import StockMovement
-from .models import Reservation
-from django.conf import settings
-from reportlab.lib.pagesizes import A4
-from reportlab.pdfgen import canvas
-from reportlab.lib.units import mm
-from PIL import Image, ImageDraw, ImageFont
-import os
+from .models import Reservation, InvoiceJob
+from .services import submit_sale, cancel_sale, CheckoutError
+from . import idempotency, reservations
+from .documents import SaleDocument
+from .invoices import enqueue_invoice, generate_whatsapp_text_url
+import time
 
 
 class POSView(LoginRequiredMixin, TemplateView):
@@ -28,9 +26,6 @@ class POSView(LoginRequiredMixin, TemplateView):
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['products'] = Product.objects.annotate(
-            available=models.F('stock') - models.F('reserved_stock')
-        ).filter(is_active=True, available__gt=0).select_related('category')
         context['customers'] = Customer.objects.filter(is_active=True)
         return context
 
@@ -38,112 +33,15 @@ class POSView(LoginRequiredMixin, TemplateView):
 class ProcessSaleView(LoginRequiredMixin, View):
     """Process sale and update stock"""
     
-    @transaction.atomic
     def post(self, request):
         try:
             import json
             data = json.loads(request.body)
-            
-            # Customer handling
-            customer_id = data.get('customer_id') if data.get('customer_id') else None
-            new_customer = data.get('new_customer')
-            if not customer_id and new_customer:
-                dni = (new_customer.get('dni') or '').strip()
-                name = (new_customer.get('name') or '').strip()
-                phone = (new_customer.get('phone') or '').strip()
-                email = (new_customer.get('email') or '').strip()
-                address = (new_customer.get('address') or '').strip()
-                if dni:
-                    customer, _ = Customer.objects.get_or_create(dni=dni, defaults={
-                        'name': name or dni,
-                        'phone': phone,
-                        'email': email,
-                        'address': address,
-                        'is_active': True,
-                    })
-                else:
-                    customer, _ = Customer.objects.get_or_create(name=name, defaults={
-                        'dni': '',
-                        'phone': phone,
-                        'email': email,
-                        'address': address,
-                        'is_active': True,
-                    })
-                customer_id = customer.id
-
-            # Create sale
-            sale = Sale.objects.create(
-                customer_id=customer_id if customer_id else None,
-                seller=request.user,
-                subtotal=Decimal(data['subtotal']),
-                discount=Decimal(0),
-                tax=Decimal(0),
-                total=Decimal(data['total']),
-                payment_method=data['payment_method'],
-                status='COMPLETED'
-            )
-            
-            # Create sale items and update stock
-            for item in data['items']:
-                product = Product.objects.get(id=item['product_id'])
-                qty = int(item['quantity'])
-                if qty <= 0:
-                    return JsonResponse({'success': False, 'error': 'Cantidad inválida'}, status=400)
-                available = product.stock - getattr(product, 'reserved_stock', 0)
-                reserved_for_customer = 0
-                if customer_id:
-                    reserved_for_customer = Reservation.objects.filter(product=product, customer_id=customer_id, status=Reservation.Status.RESERVED).aggregate(total_qty=models.Sum('quantity'))['total_qty'] or 0
-                allowed = available + reserved_for_customer
-                if qty > allowed:
-                    return JsonResponse({'success': False, 'error': f"Stock insuficiente (disponible: {allowed}) para {product.name}"}, status=400)
-                
-                # Create sale item
-                SaleItem.objects.create(
-                    sale=sale,
-                    product=product,
-                    quantity=qty,
-                    unit_price=Decimal(item['price']),
-                    subtotal=Decimal(item['subtotal'])
-                )
-                
-                # Consume reservations
-                if customer_id and reserved_for_customer > 0:
-                    remaining = qty
-                    reservations = Reservation.objects.filter(product=product, customer_id=customer_id, status=Reservation.Status.RESERVED).order_by('created_at')
-                    for r in reservations:
-                        if remaining <= 0:
-                            break
-                        use = min(remaining, r.quantity)
-                        r.quantity -= use
-                        if r.quantity == 0:
-                            r.status = Reservation.Status.FULFILLED
-                        r.save()
-                        remaining -= use
-                # Update stock
-                previous_stock = product.stock
-                product.stock -= qty
-                product.save()
-                
-                # Create stock movement (Kardex)
-                StockMovement.objects.create(
-                    product=product,
-                    movement_type='SALE',
-                    quantity=-qty,
-                    previous_stock=previous_stock,
-                    new_stock=product.stock,
-                    reference_id=sale.id,
-                    created_by=request.user
-                )
-            
-            return JsonResponse({
-                'success': True,
-                'sale_id': sale.id,
-                'sale_code': sale.code,
-                'message': 'Venta registrada exitosamente',
-                'invoice_pdf_url': generate_invoice_pdf(sale),
-                'invoice_png_url': generate_invoice_png(sale),
-                'whatsapp_text_url': generate_whatsapp_text_url(sale)
-            })
+            payload, status, replayed = submit_sale(request.user, data, idempotency.request_key(request, data))
+            response = JsonResponse(payload, status=status)
+            if replayed:
+                response['Idempotent-Replayed'] = 'true'
+            return response
             
         except Exception as e:
             return JsonResponse({
@@ -152,6 +50,74 @@ class ProcessSaleView(LoginRequiredMixin, View):
             }, status=400)
 
 
+class SyncSalesView(LoginRequiredMixin, View):
+    """Process a batch of sales queued offline by the POS, one result per sale"""
+    max_batch = 500
+
+    def post(self, request):
+        import json
+        try:
+            entries = json.loads(request.body).get('sales') or []
+        except (ValueError, AttributeError):
+            return JsonResponse({'success': False, 'error': 'Datos inválidos'}, status=400)
+        if len(entries) > self.max_batch:
+            return JsonResponse({'success': False, 'error': f'Máximo {self.max_batch} ventas por envío'}, status=400)
+
+        results = []
+        for entry in entries:
+            key = str(entry.get('idempotency_key') or '').strip()[:64]
+            if not key:
+                results.append({'idempotency_key': None, 'success': False, 'retry': False, 'error': 'Falta idempotency_key'})
+                continue
+            try:
+                payload, status, replayed = submit_sale(request.user, entry, key, include_whatsapp=False)
+                results.append({
+                    'idempotency_key': key,
+                    'retry': False,
+                    'replayed': replayed,
+                    **payload,
+                })
+            except DatabaseError as e:
+                # Lock timeouts and the like: keep the sale queued and try again later
+                results.append({'idempotency_key': key, 'success': False, 'retry': True, 'error': str(e)})
+            except Exception as e:
+                results.append({'idempotency_key': key, 'success': False, 'retry': False, 'error': str(e)})
+        return JsonResponse({
+            'success': True,
+            'accepted': sum(1 for r in results if r['success']),
+            'results': results,
+        })
+
+
+class InvoiceStatusView(LoginRequiredMixin, View):
+    """Receipt rendering status; `?wait=N` holds the request up to N seconds until ready"""
+    max_wait = 10
+
+    def get(self, request, pk):
+        sale = get_object_or_404(Sale, pk=pk)
+        job = enqueue_invoice(sale)
+        try:
+            wait = min(float(request.GET.get('wait', 0)), self.max_wait)
+        except ValueError:
+            wait = 0
+        deadline = time.monotonic() + wait
+        while job.status in (InvoiceJob.Status.PENDING, InvoiceJob.Status.RUNNING) and time.monotonic() < deadline:
+            time.sleep(0.25)
+            job.refresh_from_db()
+        ready = job.status == InvoiceJob.Status.DONE
+        return JsonResponse({
+            'success': True,
+            'sale_id': sale.id,
+            'sale_code': sale.code,
+            'status': job.status,
+            'ready': ready,
+            'invoice_pdf_url': job.invoice_pdf_url if ready else None,
+            'invoice_png_url': job.invoice_png_url if ready else None,
+            'render_ms': job.render_ms,
+            'error': job.error if job.status == InvoiceJob.Status.FAILED else None,
+        })
+
+
 class CreateReservationView(LoginRequiredMixin, View):
     @transaction.atomic
     def post(self, request):
@@ -162,18 +128,29 @@ class CreateReservationView(LoginRequiredMixin, View):
         customer_id = data.get('customer_id')
         if not product_id or quantity <= 0:
             return JsonResponse({'success': False, 'error': 'Datos inválidos'}, status=400)
+        # Hours the hold lasts: RESERVATION_TTL_HOURS by default, 0 for no expiry
+        try:
+            hours = data.get('expires_in_hours')
+            expires_at = reservations.expiry(None if hours in (None, '') else float(hours))
+        except (TypeError, ValueError, OverflowError):
+            return JsonResponse({'success': False, 'error': 'Vencimiento inválido'}, status=400)
         product = get_object_or_404(Product, pk=product_id)
-        available = product.stock - product.reserved_stock
-        if quantity > available:
-            return JsonResponse({'success': False, 'error': f'Disponible: {available}'}, status=400)
-        reservation = Reservation.objects.create(
-            product=product,
-            customer_id=customer_id if customer_id else None,
-            quantity=quantity,
-            status=Reservation.Status.RESERVED,
-            created_by=request.user
-        )
-        return JsonResponse({'success': True, 'reservation_id': reservation.id})
+        try:
+            reservation = Reservation.objects.create(
+                product=product,
+                customer_id=customer_id if customer_id else None,
+                quantity=quantity,
+                status=Reservation.Status.RESERVED,
+                expires_at=expires_at,
+                created_by=request.user
+            )
+        except InsufficientStock as e:
+            return JsonResponse({'success': False, 'error': str(e)}, status=400)
+        return JsonResponse({
+            'success': True,
+            'reservation_id': reservation.id,
+            'expires_at': reservation.expires_at.isoformat() if reservation.expires_at else None,
+        })
 
 
 class ListReservationsView(LoginRequiredMixin, View):
@@ -192,153 +169,11 @@ class ListReservationsView(LoginRequiredMixin, View):
                 'name': p.name,
                 'quantity': r.quantity,
                 'sale_price': float(p.sale_price),
-                'available_stock': p.stock - p.reserved_stock
+                'available_stock': p.stock - p.reserved_stock,
+                'expires_at': r.expires_at.isoformat() if r.expires_at else None,
             })
         return JsonResponse({'success': True, 'reservations': data})
 
-def generate_invoice_pdf(sale):
-    media_dir = os.path.join(settings.MEDIA_ROOT, 'invoices')
-    os.makedirs(media_dir, exist_ok=True)
-    pdf_path = os.path.join(media_dir, f"{sale.code}.pdf")
-    c = canvas.Canvas(pdf_path, pagesize=A4)
-    w, h = A4
-    header_h = 22*mm
-    c.setFillColorRGB(43/255, 76/255, 126/255)
-    c.rect(0, h-header_h, w, header_h, fill=1, stroke=0)
-    c.setFillColorRGB(1, 1, 1)
-    # Logo ruedita (blanco) en header
-    cx = 12*mm; cy = h - header_h/2; r = 6*mm
-    c.setLineWidth(2)
-    c.setStrokeColorRGB(1,1,1)
-    c.circle(cx, cy, r)
-    for i in range(8):
-        import math
-        ang = i * (math.pi/4)
-        x1 = cx + (r-3) * math.cos(ang)
-        y1 = cy + (r-3) * math.sin(ang)
-        x2 = cx + (r) * math.cos(ang)
-        y2 = cy + (r) * math.sin(ang)
-        c.line(x1, y1, x2, y2)
-    # Marca y contacto
-    c.setFont("Helvetica-Bold", 18)
-    c.drawString(22*mm, h-header_h+7*mm, "Kelvin Repuestos")
-    c.setFont("Helvetica", 10)
-    c.drawString(22*mm, h-header_h-1*mm, "Teléfono: 987654321 | Dirección: Av. Principal 123")
-    c.setFillColorRGB(0, 0, 0)
-    y = h - header_h - 12*mm
-    c.setFont("Helvetica", 11)
-    c.drawString(20*mm, y, f"Fecha: {sale.created_at.strftime('%d/%m/%Y %H:%M')}")
-    y -= 6*mm
-    c.drawString(20*mm, y, f"Cliente: {sale.customer.name if sale.customer else 'Cliente General'}")
-    y -= 6*mm
-    c.drawString(20*mm, y, f"Venta: {sale.code}")
-    y -= 10*mm
-    c.setFont("Helvetica-Bold", 13)
-    c.setFillColorRGB(60/255, 106/255, 163/255)
-    c.drawString(20*mm, y, "Productos")
-    c.setFillColorRGB(0, 0, 0)
-    y -= 8*mm
-    c.setFont("Helvetica", 11)
-    for item in sale.items.all():
-        left_text = f"{item.product.name}"
-        right_text = f"{item.quantity} x S/ {item.unit_price:.2f} = S/ {item.subtotal:.2f}"
-        c.drawString(20*mm, y, left_text)
-        c.drawRightString(w-20*mm, y, right_text)
-        y -= 6*mm
-        if y < 30*mm:
-            c.showPage();
-            c.setFillColorRGB(43/255, 76/255, 126/255)
-            c.rect(0, h-header_h, w, header_h, fill=1, stroke=0)
-            c.setFillColorRGB(1, 1, 1)
-            c.setFont("Helvetica-Bold", 18)
-            c.drawString(20*mm, h-header_h+7*mm, "Kelvin Repuestos")
-            c.setFillColorRGB(0, 0, 0)
-            y = h - header_h - 12*mm
-            c.setFont("Helvetica-Bold", 13)
-            c.setFillColorRGB(60/255, 106/255, 163/255)
-            c.drawString(20*mm, y, "Productos")
-            c.setFillColorRGB(0, 0, 0)
-            y -= 8*mm
-            c.setFont("Helvetica", 11)
-    y -= 10*mm
-    c.setFont("Helvetica-Bold", 14)
-    c.setFillColorRGB(43/255, 76/255, 126/255)
-    c.drawRightString(w-20*mm, y, f"TOTAL: S/ {sale.total:.2f}")
-    c.save()
-    return os.path.join(settings.MEDIA_URL, 'invoices', f"{sale.code}.pdf")
-
-def generate_invoice_png(sale):
-    media_dir = os.path.join(settings.MEDIA_ROOT, 'invoices')
-    os.makedirs(media_dir, exist_ok=True)
-    img_path = os.path.join(media_dir, f"{sale.code}.png")
-    img = Image.new('RGB', (800, 1100), color=(245, 247, 248))
-    draw = ImageDraw.Draw(img)
-    try:
-        font_title = ImageFont.truetype("arial.ttf", 30)
-        font_text = ImageFont.truetype("arial.ttf", 20)
-        font_bold = ImageFont.truetype("arialbd.ttf", 22)
-    except Exception:
-        font_title = ImageFont.load_default()
-        font_text = ImageFont.load_default()
-        font_bold = ImageFont.load_default()
-    draw.rectangle([0,0,800,100], fill=(43,76,126))
-    # Logo ruedita
-    cx, cy, r = 40, 50, 20
-    draw.ellipse([cx-r, cy-r, cx+r, cy+r], outline=(255,255,255), width=3)
-    import math
-    for i in range(8):
-        ang = i * (math.pi/4)
-        x1 = cx + int((r-6) * math.cos(ang))
-        y1 = cy + int((r-6) * math.sin(ang))
-        x2 = cx + int(r * math.cos(ang))
-        y2 = cy + int(r * math.sin(ang))
-        draw.line([x1,y1,x2,y2], fill=(255,255,255), width=3)
-    # Marca
-    draw.text((80, 30), "Kelvin Repuestos", fill=(255,255,255), font=font_title)
-    # Contacto
-    draw.text((80, 68), "Teléfono: 987654321 | Dirección: Av. Principal 123", fill=(255,255,255), font=font_text)
-    y = 130
-    draw.text((40, y), f"Fecha: {sale.created_at.strftime('%d/%m/%Y %H:%M')}", fill=(28,28,28), font=font_text)
-    y += 26
-    draw.text((40, y), f"Cliente: {sale.customer.name if sale.customer else 'Cliente General'}", fill=(28,28,28), font=font_text)
-    y += 26
-    draw.text((40, y), f"Venta: {sale.code}", fill=(28,28,28), font=font_text)
-    y += 34
-    draw.text((40, y), "Productos", fill=(60,106,163), font=font_bold)
-    y += 28
-    for item in sale.items.all():
-        left = f"{item.product.name}"
-        right = f"{item.quantity} x S/ {item.unit_price:.2f} = S/ {item.subtotal:.2f}"
-        draw.text((40, y), left, fill=(28,28,28), font=font_text)
-        draw.text((520, y), right, fill=(28,28,28), font=font_text)
-        y += 26
-    y += 22
-    draw.text((520, y), f"TOTAL: S/ {sale.total:.2f}", fill=(43,76,126), font=font_bold)
-    img.save(img_path)
-    return os.path.join(settings.MEDIA_URL, 'invoices', f"{sale.code}.png")
-
-def generate_whatsapp_text_url(sale):
-        from urllib.parse import quote
-        from apps.accounts.models import WhatsAppTemplate
-        customer_name = sale.customer.name if sale.customer else 'Cliente General'
-        items_text = '\n'.join([
-            f"- {item.product.name} x {item.quantity} = S/ {item.subtotal}" for item in sale.items.all()
-        ])
-        template = WhatsAppTemplate.get_content('SALE_MESSAGE',
-            'Gracias por su compra\nVenta: {{code}}\nCliente: {{customer}}\nProductos:\n{{items}}\nTOTAL: S/ {{total}}'
-        )
-        text_raw = template.replace('{{code}}', sale.code)
-        text_raw = text_raw.replace('{{customer}}', customer_name)
-        text_raw = text_raw.replace('{{items}}', items_text)
-        text_raw = text_raw.replace('{{total}}', str(sale.total))
-        text = quote(text_raw)
-        phone = sale.customer.phone if sale.customer and sale.customer.phone else ''
-        phone = ''.join(ch for ch in phone if ch.isdigit())
-        if phone:
-            return f"https://wa.me/{phone}?text={text}"
-        return f"https://wa.me/?text={text}"
-
-
 class SaleListView(LoginRequiredMixin, ListView):
     model = Sale
     template_name = 'sales/sale_list.html'
@@ -346,13 +181,41 @@ class SaleListView(LoginRequiredMixin, ListView):
     paginate_by = 20
     ordering = ['-created_at']
 
+    def get_queryset(self):
+        return super().get_queryset().select_related('customer')
+
 
 class SaleDetailView(LoginRequiredMixin, DetailView):
     model = Sale
     template_name = 'sales/sale_detail.html'
     context_object_name = 'sale'
 
+    def get_object(self, queryset=None):
+        self.document = SaleDocument.load(self.kwargs['pk'])
+        return self.document.sale
+
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['whatsapp_text_url'] = generate_whatsapp_text_url(self.object)
+        context['document'] = self.document
+        context['whatsapp_text_url'] = generate_whatsapp_text_url(self.document)
+        context['can_cancel'] = (
+            self.object.status == Sale.Status.COMPLETED
+            and (self.request.user.is_superuser or self.request.user.is_admin)
+        )
         return context
+
+
+class CancelSaleView(LoginRequiredMixin, View):
+    """Cancel a completed sale and return its stock (administrators only)"""
+
+    def post(self, request, pk):
+        from django.contrib import messages
+        if not (request.user.is_superuser or request.user.is_admin):
+            messages.error(request, 'Solo un administrador puede anular ventas')
+        else:
+            try:
+                sale = cancel_sale(pk, request.user)
+                messages.success(request, f'Venta {sale.code} anulada y stock devuelto')
+            except CheckoutError as e:
+                messages.error(request, str(e))
+        return redirect('sales:sale_detail', pk=pk)
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.1 on 2026-10-18 03:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('suppliers', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='supplier',
+            name='lead_time_days',
+            field=models.PositiveIntegerField(default=7, help_text='Días entre el pedido y la recepción; usado para calcular el stock de seguridad', verbose_name='Tiempo de entrega (días)'),
+        ),
+    ]
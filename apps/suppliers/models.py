@@ -39,6 +39,12 @@ class Supplier(models.Model):
         verbose_name='Dirección'
     )
     
+    lead_time_days = models.PositiveIntegerField(
+        default=7,
+        verbose_name='Tiempo de entrega (días)',
+        help_text='Días entre el pedido y la recepción; usado para calcular el stock de seguridad'
+    )
+    
     is_active = models.BooleanField(
         default=True,
         verbose_name='Activo'
@@ -20,14 +20,14 @@ class SupplierListView(LoginRequiredMixin, ListView):
 class SupplierCreateView(LoginRequiredMixin, CreateView):
     model = Supplier
     template_name = 'suppliers/supplier_form.html'
-    fields = ['name', 'ruc', 'phone', 'email', 'address']
+    fields = ['name', 'ruc', 'phone', 'email', 'address', 'lead_time_days']
     success_url = reverse_lazy('suppliers:supplier_list')
 
 
 class SupplierUpdateView(LoginRequiredMixin, UpdateView):
     model = Supplier
     template_name = 'suppliers/supplier_edit.html'
-    fields = ['name', 'ruc', 'phone', 'email', 'address']
+    fields = ['name', 'ruc', 'phone', 'email', 'address', 'lead_time_days']
     success_url = reverse_lazy('suppliers:supplier_list')
 
 
@@ -14,3 +14,8 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
 
 application = get_asgi_application()
+
+# Release reservations that expired while the process was down
+from apps.sales.reservations import start_in_process_sweeper  # noqa: E402
+
+start_in_process_sweeper()
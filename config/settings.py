@@ -215,6 +215,57 @@ DATA_UPLOAD_MAX_MEMORY_SIZE = 5242880  # 5MB
 # Allowed image extensions
 ALLOWED_IMAGE_EXTENSIONS = ['jpg', 'jpeg', 'png', 'webp']
 
+# Invoice rendering queue: render in a background thread of the web process
+# after each sale commits. Disable when running `manage.py run_invoice_worker`.
+INVOICE_WORKER_IN_PROCESS = config('INVOICE_WORKER_IN_PROCESS', default=True, cast=bool)
+
+# Stored sale responses for idempotent retries (purge_idempotency_keys)
+IDEMPOTENCY_KEY_TTL_HOURS = config('IDEMPOTENCY_KEY_TTL_HOURS', default=48, cast=int)
+
+# Reservations hold stock for RESERVATION_TTL_HOURS unless the POS asks for
+# another expiry (0: never expire). Expired holds are released by a
+# background thread of the web process, started with it and sleeping until
+# the next expiry; disable it when running `manage.py expire_reservations`
+RESERVATION_TTL_HOURS = config('RESERVATION_TTL_HOURS', default=48, cast=int)
+RESERVATION_SWEEPER_IN_PROCESS = config('RESERVATION_SWEEPER_IN_PROCESS', default=True, cast=bool)
+RESERVATION_SWEEP_INTERVAL_SECONDS = config('RESERVATION_SWEEP_INTERVAL_SECONDS', default=300, cast=int)
+
+# POS catalog sync (api/catalog/sync/): rows per page and how far each final
+# cursor steps back to catch updates from transactions that committed late
+CATALOG_SYNC_PAGE_SIZE = config('CATALOG_SYNC_PAGE_SIZE', default=1000, cast=int)
+CATALOG_SYNC_OVERLAP_SECONDS = config('CATALOG_SYNC_OVERLAP_SECONDS', default=30, cast=int)
+
+# Shared cache: a database table (created after every migrate) so all
+# workers see the same dashboard KPI blocks and version counters
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'kelvin_cache',
+        'OPTIONS': {'MAX_ENTRIES': 5000},
+    },
+    # Per-process copies of values whose keys never go stale (versioned
+    # dashboard blocks), read before the shared database cache
+    'local': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'kelvin-local',
+        'OPTIONS': {'MAX_ENTRIES': 500},
+    },
+}
+
+# Dashboard KPI blocks are invalidated by events (apps.reports.kpis); the
+# timeout only bounds how long an unversioned change can stay stale
+DASHBOARD_CACHE_TIMEOUT = config('DASHBOARD_CACHE_TIMEOUT', default=600, cast=int)
+
+# Demand forecast behind the suggested orders (apps.reports.forecast): days of
+# sales history, safety factor z (1.65 ≈ 95% service level) and days of demand
+# each order should cover beyond the reorder point
+FORECAST_HISTORY_DAYS = config('FORECAST_HISTORY_DAYS', default=730, cast=int)
+FORECAST_SERVICE_LEVEL_Z = config('FORECAST_SERVICE_LEVEL_Z', default=1.65, cast=float)
+FORECAST_COVER_DAYS = config('FORECAST_COVER_DAYS', default=14, cast=int)
+
+# RFM customer segments (apps.customers.segments): days of sales history scored
+SEGMENT_HISTORY_DAYS = config('SEGMENT_HISTORY_DAYS', default=730, cast=int)
+
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
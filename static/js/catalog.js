@@ -0,0 +1,274 @@
+/**
+ * Local Product Catalog
+ * Keeps a copy of the catalog in IndexedDB and refreshes it with deltas
+ * from the catalog sync API instead of re-downloading every product.
+ * Starts from the versioned catalog bundle, whose prefix index lets the
+ * POS search without a request per keystroke.
+ */
+
+const Catalog = {
+  DB_NAME: 'kelvin-catalog',
+  syncUrl: null,
+  bundleUrl: null,
+  products: new Map(),
+  categories: {},
+  cursor: null,
+  version: null,
+  prefixLength: 3,
+  index: new Map(),
+  prefixes: new Map(),
+  syncing: false,
+  onChange: null,
+
+  async init({ syncUrl, bundleUrl, onChange, interval = 60000 }) {
+    this.syncUrl = syncUrl;
+    this.bundleUrl = bundleUrl;
+    this.onChange = onChange || null;
+    try {
+      await this.load();
+    } catch (e) {
+      console.error(e);
+    }
+    if (!(await this.loadBundle())) this.buildIndex();
+    if (this.products.size && this.onChange) this.onChange(this);
+
+    await this.sync();
+    window.addEventListener('online', () => this.sync());
+    setInterval(() => this.sync(), interval);
+  },
+
+  open() {
+    return new Promise((resolve, reject) => {
+      const request = indexedDB.open(this.DB_NAME, 1);
+      request.onupgradeneeded = () => {
+        request.result.createObjectStore('products', { keyPath: 'id' });
+        request.result.createObjectStore('meta');
+      };
+      request.onsuccess = () => resolve(request.result);
+      request.onerror = () => reject(request.error);
+    });
+  },
+
+  async load() {
+    const db = await this.open();
+    await new Promise((resolve, reject) => {
+      const tx = db.transaction(['products', 'meta'], 'readonly');
+      tx.objectStore('products').getAll().onsuccess = (e) => {
+        this.products = new Map(e.target.result.map(p => [p.id, p]));
+      };
+      tx.objectStore('meta').get('state').onsuccess = (e) => {
+        const state = e.target.result || {};
+        this.cursor = state.cursor || null;
+        this.categories = state.categories || {};
+        this.version = state.version || null;
+      };
+      tx.oncomplete = resolve;
+      tx.onerror = () => reject(tx.error);
+    });
+    db.close();
+  },
+
+  async save(page, reset) {
+    const db = await this.open();
+    await new Promise((resolve, reject) => {
+      const tx = db.transaction(['products', 'meta'], 'readwrite');
+      const products = tx.objectStore('products');
+      if (reset) products.clear();
+      page.products.forEach(p => products.put(p));
+      page.removed.forEach(id => products.delete(id));
+      tx.objectStore('meta').put({
+        cursor: this.cursor, categories: this.categories, version: this.version,
+      }, 'state');
+      tx.oncomplete = resolve;
+      tx.onerror = () => reject(tx.error);
+    });
+    db.close();
+  },
+
+  // Replace the local copy with the bundle when its version changed.
+  // The bundle is revalidated with its ETag, so an unchanged catalog is a 304.
+  async loadBundle() {
+    if (!navigator.onLine || !this.bundleUrl) return false;
+    try {
+      const res = await fetch(this.bundleUrl, { credentials: 'same-origin' });
+      if (!res.ok) return false;
+      const data = await res.json();
+      if (data.version === this.version && this.products.size) return false;
+
+      const page = this.decode({ ...data, removed: [] });
+      this.products = new Map(page.products.map(p => [p.id, p]));
+      this.categories = data.categories;
+      this.cursor = data.cursor;
+      this.version = data.version;
+      this.prefixLength = data.prefix_length;
+
+      this.index = new Map();
+      this.prefixes = new Map();
+      Object.entries(data.index).forEach(([prefix, positions]) => {
+        this.index.set(prefix, new Set(positions.map(i => page.products[i].id)));
+      });
+      await this.save(page, true);
+      return true;
+    } catch (e) {
+      console.error(e);
+      return false;
+    }
+  },
+
+  // Must match apps.products.search.normalize / tokenize
+  normalize(text) {
+    return (text || '').normalize('NFD').replace(/[\u0300-\u036f]/g, '').toLowerCase();
+  },
+
+  tokenize(text) {
+    return this.normalize(text).split(/[^0-9a-z]+/).filter(Boolean);
+  },
+
+  productTokens(p) {
+    return this.tokenize(`${p.name} ${p.code} ${this.categoryName(p)}`);
+  },
+
+  indexProduct(p) {
+    this.unindexProduct(p.id);
+    const prefixes = new Set(this.productTokens(p).map(t => t.slice(0, this.prefixLength)));
+    prefixes.forEach(prefix => {
+      if (!this.index.has(prefix)) this.index.set(prefix, new Set());
+      this.index.get(prefix).add(p.id);
+    });
+    this.prefixes.set(p.id, prefixes);
+  },
+
+  unindexProduct(id) {
+    // Products indexed by the bundle have no reverse entry; scan only for those
+    const prefixes = this.prefixes.get(id) || this.index.keys();
+    for (const prefix of prefixes) {
+      const ids = this.index.get(prefix);
+      if (ids) ids.delete(id);
+    }
+    this.prefixes.delete(id);
+  },
+
+  // Offline fallback when the bundle could not be fetched
+  buildIndex() {
+    this.index = new Map();
+    this.prefixes = new Map();
+    this.products.forEach(p => this.indexProduct(p));
+  },
+
+  candidates(token) {
+    if (token.length >= this.prefixLength) {
+      return this.index.get(token.slice(0, this.prefixLength)) || new Set();
+    }
+    const ids = new Set();
+    this.index.forEach((set, prefix) => {
+      if (prefix.startsWith(token)) set.forEach(id => ids.add(id));
+    });
+    return ids;
+  },
+
+  // Local search over name, code and category; an exact code match comes first
+  search(query, limit = 10) {
+    const tokens = this.tokenize(query);
+    if (!tokens.length) return [];
+    const sets = tokens.map(t => this.candidates(t)).sort((a, b) => a.size - b.size);
+    const q = this.normalize(query.trim());
+
+    const results = [];
+    for (const id of sets[0]) {
+      if (!sets.every(set => set.has(id))) continue;
+      const p = this.products.get(id);
+      if (!p) continue;
+      const words = this.productTokens(p);
+      if (!tokens.every(t => words.some(w => w.startsWith(t)))) continue;
+      const name = this.normalize(p.name);
+      const rank = this.normalize(p.code) === q ? 0 : name.startsWith(q) ? 1 : 2;
+      results.push({ p, rank, name });
+    }
+    results.sort((a, b) => a.rank - b.rank || a.name.localeCompare(b.name));
+    return results.slice(0, limit).map(r => r.p);
+  },
+
+  // Turn the compact [values] rows into objects keyed by the response fields
+  decode(data) {
+    return {
+      products: data.products.map(row => {
+        const p = {};
+        data.fields.forEach((field, i) => { p[field] = row[i]; });
+        p.price = Number(p.price);
+        p.available = p.stock - p.reserved;
+        return p;
+      }),
+      removed: data.removed,
+    };
+  },
+
+  async sync() {
+    if (this.syncing || !navigator.onLine) return;
+    this.syncing = true;
+    let changed = false;
+    try {
+      let cursor = this.cursor;
+      let hasMore = true;
+      while (hasMore) {
+        const url = cursor ? `${this.syncUrl}?cursor=${encodeURIComponent(cursor)}` : this.syncUrl;
+        const res = await fetch(url, { credentials: 'same-origin' });
+        if (res.status === 400 && cursor) {
+          // Unknown cursor: start over with a fresh snapshot
+          cursor = null;
+          this.cursor = null;
+          continue;
+        }
+        if (!res.ok) return;
+        const data = await res.json();
+        const page = this.decode(data);
+        const reset = data.snapshot;
+
+        if (reset) {
+          this.products.clear();
+          this.index = new Map();
+          this.prefixes = new Map();
+        }
+        this.categories = data.categories;
+        page.products.forEach(p => {
+          this.products.set(p.id, p);
+          this.indexProduct(p);
+        });
+        page.removed.forEach(id => {
+          this.products.delete(id);
+          this.unindexProduct(id);
+        });
+        this.cursor = cursor = data.cursor;
+        hasMore = data.has_more;
+        changed = changed || reset || page.products.length > 0 || page.removed.length > 0;
+
+        try {
+          await this.save(page, reset);
+        } catch (e) {
+          console.error(e);
+        }
+      }
+    } catch (e) {
+      console.error(e);
+    } finally {
+      this.syncing = false;
+    }
+    if (changed && this.onChange) this.onChange(this);
+  },
+
+  categoryName(product) {
+    return this.categories[product.category] || '';
+  },
+
+  // Products that can be sold right now, newest first
+  available() {
+    return [...this.products.values()]
+      .filter(p => p.available > 0)
+      .sort((a, b) => b.id - a.id);
+  },
+
+  get(id) {
+    return this.products.get(id);
+  },
+};
+
+window.Catalog = Catalog;
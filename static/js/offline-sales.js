@@ -0,0 +1,189 @@
+/**
+ * Offline Sale Queue
+ * Keeps carts that could not reach the server in IndexedDB and
+ * sends them in batches to the sync endpoint when the network is back.
+ * Sales the server rejects move to a separate store until the seller
+ * retries or discards them: they already happened at the counter.
+ */
+
+const OfflineSales = {
+  DB_NAME: 'kelvin-offline',
+  STORE: 'pending-sales',
+  REJECTED_STORE: 'rejected-sales',
+  // SyncSalesView.max_batch
+  BATCH_SIZE: 500,
+  syncUrl: null,
+  csrfToken: null,
+  seller: null,
+  flushing: false,
+  onChange: null,
+
+  onRejected: null,
+
+  init({ syncUrl, csrfToken, seller, onChange, onRejected }) {
+    this.syncUrl = syncUrl;
+    this.csrfToken = csrfToken;
+    this.seller = String(seller);
+    this.onChange = onChange || null;
+    this.onRejected = onRejected || null;
+
+    window.addEventListener('online', () => this.flush());
+    // Background Sync from the service worker asks open pages to flush
+    if ('serviceWorker' in navigator) {
+      navigator.serviceWorker.addEventListener('message', (e) => {
+        if (e.data && e.data.type === 'flush-sales') this.flush();
+      });
+    }
+    this.notify();
+    if (navigator.onLine) this.flush();
+  },
+
+  open() {
+    return new Promise((resolve, reject) => {
+      const request = indexedDB.open(this.DB_NAME, 2);
+      request.onupgradeneeded = () => {
+        const db = request.result;
+        if (!db.objectStoreNames.contains(this.STORE)) db.createObjectStore(this.STORE, { keyPath: 'key' });
+        if (!db.objectStoreNames.contains(this.REJECTED_STORE)) db.createObjectStore(this.REJECTED_STORE, { keyPath: 'key' });
+      };
+      request.onsuccess = () => resolve(request.result);
+      request.onerror = () => reject(request.error);
+    });
+  },
+
+  async tx(mode, fn, storeName = this.STORE) {
+    const db = await this.open();
+    return new Promise((resolve, reject) => {
+      const tx = db.transaction(storeName, mode);
+      const result = fn(tx.objectStore(storeName));
+      tx.oncomplete = () => { db.close(); resolve(result && result.result); };
+      tx.onerror = () => { db.close(); reject(tx.error); };
+    });
+  },
+
+  // Queue a sale under its idempotency key; re-queueing the same key is a no-op
+  async enqueue(key, sale) {
+    await this.tx('readwrite', store => store.put({
+      key,
+      seller: this.seller,
+      sale: { ...sale, idempotency_key: key, queued_at: new Date().toISOString() },
+    }));
+    this.requestBackgroundSync();
+    this.notify();
+  },
+
+  async pending() {
+    const all = await this.tx('readonly', store => store.getAll());
+    // Only the seller who queued a sale may submit it
+    return (all || []).filter(entry => entry.seller === this.seller);
+  },
+
+  async remove(keys) {
+    if (!keys.length) return;
+    await this.tx('readwrite', store => keys.forEach(key => store.delete(key)));
+  },
+
+  // Move rejected sales out of the queue, keeping the server's reason
+  async reject(entries, results) {
+    if (!results.length) return;
+    const byKey = new Map(entries.map(entry => [entry.key, entry]));
+    const db = await this.open();
+    await new Promise((resolve, reject) => {
+      const tx = db.transaction([this.STORE, this.REJECTED_STORE], 'readwrite');
+      const pending = tx.objectStore(this.STORE);
+      const rejected = tx.objectStore(this.REJECTED_STORE);
+      results.forEach(r => {
+        const entry = byKey.get(r.idempotency_key);
+        if (!entry) return;
+        rejected.put({ ...entry, error: r.error, rejected_at: new Date().toISOString() });
+        pending.delete(entry.key);
+      });
+      tx.oncomplete = () => { db.close(); resolve(); };
+      tx.onerror = () => { db.close(); reject(tx.error); };
+    });
+  },
+
+  async rejected() {
+    const all = await this.tx('readonly', store => store.getAll(), this.REJECTED_STORE);
+    return (all || []).filter(entry => entry.seller === this.seller);
+  },
+
+  // Send a rejected sale again (e.g. once stock was corrected)
+  async retryRejected(key) {
+    const entry = (await this.rejected()).find(e => e.key === key);
+    if (!entry) return;
+    const { error, rejected_at, ...queued } = entry;
+    await this.tx('readwrite', store => store.put(queued));
+    await this.tx('readwrite', store => store.delete(key), this.REJECTED_STORE);
+    this.notify();
+    this.flush();
+  },
+
+  // Drop a rejected sale once the seller has dealt with it by hand
+  async discardRejected(key) {
+    await this.tx('readwrite', store => store.delete(key), this.REJECTED_STORE);
+    this.notify();
+  },
+
+  async count() {
+    return (await this.pending()).length;
+  },
+
+  async notify() {
+    if (this.onChange) this.onChange(await this.count());
+    if (this.onRejected) this.onRejected(await this.rejected());
+  },
+
+  async requestBackgroundSync() {
+    try {
+      const registration = await navigator.serviceWorker.ready;
+      if (registration.sync) await registration.sync.register('sync-sales');
+    } catch (e) { }
+  },
+
+  // Send the queued sales in batches of BATCH_SIZE; drop accepted ones,
+  // set rejected ones aside and keep those worth retrying
+  async flush() {
+    if (this.flushing || !navigator.onLine) return;
+    this.flushing = true;
+    try {
+      const entries = await this.pending();
+      let accepted = 0;
+      let rejected = 0;
+      for (let start = 0; start < entries.length; start += this.BATCH_SIZE) {
+        const batch = entries.slice(start, start + this.BATCH_SIZE);
+        const response = await fetch(this.syncUrl, {
+          method: 'POST',
+          headers: {
+            'Content-Type': 'application/json',
+            'X-CSRFToken': this.csrfToken,
+          },
+          body: JSON.stringify({ sales: batch.map(entry => entry.sale) }),
+        });
+        if (!response.ok) break;
+        const data = await response.json();
+
+        const done = data.results.filter(r => r.success);
+        const failed = data.results.filter(r => !r.success && !r.retry);
+        await this.remove(done.map(r => r.idempotency_key));
+        await this.reject(batch, failed);
+        accepted += done.length;
+        rejected += failed.length;
+      }
+
+      if (window.App && accepted) {
+        App.showToast(`${accepted} venta(s) sin conexión sincronizadas`, 'success');
+      }
+      if (window.App && rejected) {
+        App.showToast(`${rejected} venta(s) sin conexión rechazadas: revíselas en el punto de venta`, 'error', 6000);
+      }
+    } catch (e) {
+      console.error(e);
+    } finally {
+      this.flushing = false;
+      this.notify();
+    }
+  },
+};
+
+window.OfflineSales = OfflineSales;
@@ -3,7 +3,7 @@
  * Provides offline support and caching
  */
 
-const CACHE_NAME = 'kelvin-v1';
+const CACHE_NAME = 'kelvin-v3';
 const urlsToCache = [
     '/',
     '/static/css/base.css',
@@ -11,6 +11,8 @@ const urlsToCache = [
     '/static/css/dark-mode.css',
     '/static/js/app.js',
     '/static/js/pwa.js',
+    '/static/js/catalog.js',
+    '/static/js/offline-sales.js',
     '/static/manifest.json',
     '/offline.html'
 ];
@@ -46,6 +48,11 @@ self.addEventListener('activate', event => {
 
 // Fetch Event - Network First, then Cache
 self.addEventListener('fetch', event => {
+    // Writes go straight to the network; offline sales are queued by the page
+    if (event.request.method !== 'GET') {
+        return;
+    }
+
     event.respondWith(
         fetch(event.request)
             .then(response => {
@@ -78,3 +85,14 @@ self.addEventListener('fetch', event => {
             })
     );
 });
+
+// Background Sync - ask open pages to send their queued sales
+self.addEventListener('sync', event => {
+    if (event.tag === 'sync-sales') {
+        event.waitUntil(
+            self.clients.matchAll({ type: 'window' }).then(clients => {
+                clients.forEach(client => client.postMessage({ type: 'flush-sales' }));
+            })
+        );
+    }
+});